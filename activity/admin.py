@@ -0,0 +1,21 @@
+# activity/admin.py
+from django.contrib import admin
+
+from cars.pagination import EstimatedCountAdminMixin
+
+from .models import ActivityEvent, ActivityRollup
+
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'kind', 'user_id', 'car_id', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['=user_id', '=car_id']
+    ordering = ['-id']
+
+
+@admin.register(ActivityRollup)
+class ActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ['period', 'kind', 'start', 'count']
+    list_filter = ['period', 'kind']
+    ordering = ['-start', 'kind']
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ActivityConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'activity'
+
+    def ready(self):
+        from . import events  # noqa: F401 — сброс буфера просмотров после запросов
@@ -0,0 +1,108 @@
+# activity/events.py
+"""
+Запись событий активности (ActivityEvent) из потоков авторизации, избранного и каталога.
+
+Регистрации, входы и добавления в избранное редки — по строке на событие после коммита (как
+cars.changes.record). Просмотры карточек частые, а сама карточка отдаётся из кеша (cars/detail.py):
+INSERT на каждый просмотр стоил бы дороже ответа. Поэтому просмотры копятся в памяти процесса
+(ViewBuffer) и пишутся одной вставкой после ответа (request_finished), когда накопилось
+VIEW_BATCH штук или старейшему исполнилось VIEW_FLUSH_INTERVAL секунд; остаток — при выходе
+процесса. При аварийном падении теряется только этот хвост — для статистики допустимо.
+Если вставка не прошла (БД недоступна), события возвращаются в буфер, ошибка пишется в лог, а ответ
+не ломается; следующая попытка — не раньше чем через VIEW_FLUSH_INTERVAL.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import ActivityEvent
+
+logger = logging.getLogger(__name__)
+
+VIEW_BATCH = 200
+VIEW_FLUSH_INTERVAL = 5.0
+# Предел буфера, если вставки не проходят (БД недоступна): дальше просмотры не копим
+VIEW_BUFFER_LIMIT = 20 * VIEW_BATCH
+
+
+def record(kind, user_id=None, car_id=None):
+    """Пишет событие после коммита текущей транзакции (или сразу вне транзакции)."""
+    event = ActivityEvent(kind=kind, user_id=user_id, car_id=car_id)
+    transaction.on_commit(lambda: ActivityEvent.objects.bulk_create([event]))
+
+
+class ViewBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._oldest = 0.0
+        self._retry_at = 0.0
+
+    def add(self, car_id, user_id=None):
+        event = ActivityEvent(kind=ActivityEvent.CAR_VIEW, car_id=car_id, user_id=user_id,
+                              created_at=timezone.now())
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            if len(self._events) < VIEW_BUFFER_LIMIT:
+                self._events.append(event)
+
+    def due(self):
+        events = self._events
+        now = time.monotonic()
+        return (bool(events) and now >= self._retry_at
+                and (len(events) >= VIEW_BATCH or now - self._oldest >= VIEW_FLUSH_INTERVAL))
+
+    def drain(self):
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def flush(self):
+        """Пишет накопленное одной вставкой. Возвращает число записанных событий."""
+        events = self.drain()
+        if events:
+            try:
+                ActivityEvent.objects.bulk_create(events, batch_size=VIEW_BATCH)
+            except Exception:
+                # Вернём в буфер; следующая попытка — через интервал, а не на каждом запросе
+                with self._lock:
+                    self._events[:0] = events[:VIEW_BUFFER_LIMIT - len(self._events)]
+                    self._oldest = time.monotonic()
+                    self._retry_at = self._oldest + VIEW_FLUSH_INTERVAL
+                raise
+        return len(events)
+
+
+views = ViewBuffer()
+
+
+def record_view(car_id, user_id=None):
+    views.add(car_id, user_id)
+
+
+def _flush_views(**kwargs):
+    # Проверка без блокировки: в большинстве запросов сбрасывать нечего
+    if views.due():
+        try:
+            views.flush()
+        except DatabaseError:
+            # Ошибка из request_finished сломала бы close() ответа — просмотры подождут в буфере
+            logger.exception('Не удалось записать просмотры карточек')
+
+
+request_finished.connect(_flush_views, dispatch_uid='activity_flush_views')
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        views.flush()
+    except Exception:
+        # На выходе БД может быть уже недоступна (или тестовая база удалена) — теряем только хвост
+        pass
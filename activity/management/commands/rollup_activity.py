@@ -0,0 +1,25 @@
+# activity/management/commands/rollup_activity.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from activity import rollups
+
+
+class Command(BaseCommand):
+    help = ('Добавляет новые события активности в почасовые и суточные сводки и удаляет старые '
+            'учтённые события (запускать по cron, например раз в минуту).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=rollups.ROLLUP_BATCH)
+        parser.add_argument('--retention-days', type=int, default=rollups.RETENTION.days,
+                            help='Сколько дней хранить сырые события (0 — не удалять)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        done = rollups.roll_up(options['batch_size'])
+        removed = rollups.prune(timedelta(days=options['retention_days'])) if options['retention_days'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: учтено событий {done}, удалено старых {removed} за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('signup', 'Регистрация'), ('login', 'Вход'), ('favorite', 'Добавление в избранное'), ('car_view', 'Просмотр машины')], max_length=16)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('car_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Событие',
+                'verbose_name_plural': 'События',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('position', models.BigIntegerField(default=0)),
+                ('horizon', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'Сутки')], max_length=4)),
+                ('kind', models.CharField(choices=[('signup', 'Регистрация'), ('login', 'Вход'), ('favorite', 'Добавление в избранное'), ('car_view', 'Просмотр машины')], max_length=16)),
+                ('start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Сводка активности',
+                'verbose_name_plural': 'Сводки активности',
+                'unique_together': {('period', 'kind', 'start')},
+            },
+        ),
+    ]
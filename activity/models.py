@@ -0,0 +1,61 @@
+# activity/models.py
+from django.db import models
+from django.utils import timezone
+
+
+class ActivityEvent(models.Model):
+    """
+    Событие для статистики активности (activity/events.py). user_id/car_id без FK: событие
+    переживает удаление пользователя или машины, а запись не ждёт проверок внешних ключей.
+    """
+    SIGNUP = 'signup'
+    LOGIN = 'login'
+    FAVORITE = 'favorite'
+    CAR_VIEW = 'car_view'
+    KINDS = [(SIGNUP, 'Регистрация'), (LOGIN, 'Вход'), (FAVORITE, 'Добавление в избранное'),
+             (CAR_VIEW, 'Просмотр машины')]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=16, choices=KINDS)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    car_id = models.BigIntegerField(null=True, blank=True)
+    # Время события, а не вставки: просмотры пишутся пачками (activity/events.py). Без индекса:
+    # события читаются диапазоном id после курсора сводок, а индекс по времени планировщик
+    # предпочёл бы ему и просматривал бы весь запрошенный период
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Событие'
+        verbose_name_plural = 'События'
+
+    def __str__(self):
+        return f'#{self.id} {self.kind}'
+
+
+class ActivityRollup(models.Model):
+    """Число событий вида kind за час или сутки, начинающиеся в start (activity/rollups.py)."""
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIODS = [(HOUR, 'Час'), (DAY, 'Сутки')]
+
+    period = models.CharField(max_length=4, choices=PERIODS)
+    kind = models.CharField(max_length=16, choices=ActivityEvent.KINDS)
+    start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Сводка активности'
+        verbose_name_plural = 'Сводки активности'
+        # Он же индекс для выборки ряда: period, kind, диапазон start
+        unique_together = ['period', 'kind', 'start']
+
+
+class RollupCursor(models.Model):
+    """
+    position — последнее событие, уже учтённое в сводках; horizon — последнее событие на момент
+    прошлого запуска агрегации, дальше него следующий запуск не идёт.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    horizon = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,112 @@
+# activity/rollups.py
+"""
+Почасовые и суточные сводки событий (ActivityRollup) и ряды для админского дашборда.
+
+roll_up() — инкрементальная агрегация, rollup_activity по cron: события после RollupCursor.position
+читаются пачками по первичному ключу, прибавляются к строкам своего часа и суток, курсор сдвигается
+в той же транзакции — каждое событие учитывается ровно один раз. Запуск идёт только до horizon —
+последнего id на момент прошлого запуска: строки с меньшим id, вставка которых ещё не закоммичена,
+к этому времени уже видны. Рассчитано на один запущенный rollup_activity одновременно.
+
+series() не читает сырые события за прошлое: история — из сводок, а ActivityEvent — только после
+курсора (хвост с предпоследнего запуска, диапазон по первичному ключу). prune() удаляет учтённые
+события старше RETENTION — история остаётся в сводках.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ActivityEvent, ActivityRollup, RollupCursor
+
+CURSOR_NAME = 'rollup'
+ROLLUP_BATCH = 5000
+RETENTION = timedelta(days=90)
+PERIODS = {ActivityRollup.HOUR: timedelta(hours=1), ActivityRollup.DAY: timedelta(days=1)}
+KINDS = [kind for kind, _ in ActivityEvent.KINDS]
+
+
+def bucket(moment, period):
+    """Начало часа или суток (в текущем часовом поясе), в которые попадает moment."""
+    moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if period == ActivityRollup.DAY else moment
+
+
+def _count(rows, periods=tuple(PERIODS)):
+    counts = Counter()
+    for kind, created_at in rows:
+        for period in periods:
+            counts[period, kind, bucket(created_at, period)] += 1
+    return counts
+
+
+def _add(counts):
+    """Прибавляет counts к сводкам: одно чтение затронутого диапазона, bulk_update и bulk_create."""
+    if not counts:
+        return
+    starts = [start for _, _, start in counts]
+    existing = ActivityRollup.objects.filter(period__in={period for period, _, _ in counts},
+                                             kind__in={kind for _, kind, _ in counts},
+                                             start__gte=min(starts), start__lte=max(starts))
+    rows = {(row.period, row.kind, row.start): row for row in existing}
+    changed, created = [], []
+    for key, count in counts.items():
+        row = rows.get(key)
+        if row is None:
+            period, kind, start = key
+            created.append(ActivityRollup(period=period, kind=kind, start=start, count=count))
+        else:
+            row.count += count
+            changed.append(row)
+    ActivityRollup.objects.bulk_update(changed, ['count'], batch_size=500)
+    ActivityRollup.objects.bulk_create(created, batch_size=500)
+
+
+def roll_up(batch_size=ROLLUP_BATCH):
+    """Учитывает в сводках события до горизонта прошлого запуска. Возвращает их число."""
+    cursor, _ = RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    horizon = ActivityEvent.objects.aggregate(horizon=Max('id'))['horizon'] or 0
+    done = 0
+    while cursor.position < cursor.horizon:
+        rows = list(
+            ActivityEvent.objects.filter(id__gt=cursor.position, id__lte=cursor.horizon)
+            .order_by('id').values_list('id', 'kind', 'created_at')[:batch_size]
+        )
+        with transaction.atomic():
+            _add(_count((kind, created_at) for _, kind, created_at in rows))
+            # Пусто — события до горизонта удалены (prune), просто догоняем
+            cursor.position = rows[-1][0] if rows else cursor.horizon
+            cursor.save(update_fields=['position', 'updated_at'])
+        done += len(rows)
+    cursor.horizon = max(horizon, cursor.position)
+    cursor.save(update_fields=['horizon', 'updated_at'])
+    return done
+
+
+def position():
+    return RollupCursor.objects.filter(name=CURSOR_NAME).values_list('position', flat=True).first() or 0
+
+
+def series(period, since, until, kinds=KINDS):
+    """
+    {kind: {начало периода: число}} для периодов, начинающихся в [since, until). since и until
+    выровнены по границам периода (bucket).
+    """
+    result = {kind: Counter() for kind in kinds}
+    rows = ActivityRollup.objects.filter(period=period, kind__in=kinds, start__gte=since, start__lt=until)
+    for kind, start, count in rows.values_list('kind', 'start', 'count'):
+        result[kind][start] += count
+    # Хвост после курсора: id по первичному ключу, события — только в запрошенном диапазоне
+    tail = ActivityEvent.objects.filter(id__gt=position(), kind__in=kinds, created_at__gte=since,
+                                        created_at__lt=until)
+    for (_, kind, start), count in _count(tail.values_list('kind', 'created_at').iterator(), [period]).items():
+        result[kind][start] += count
+    return result
+
+
+def prune(older_than=RETENTION):
+    """Удаляет уже учтённые в сводках события старше older_than. Возвращает их число."""
+    return ActivityEvent.objects.filter(id__lte=position(),
+                                        created_at__lt=timezone.now() - older_than).delete()[0]
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.models import User
+from cars.models import Car
+from . import events, rollups
+from .models import ActivityEvent, ActivityRollup
+
+# Сводки режутся по часам и суткам текущего часового пояса
+NOON = timezone.make_aware(datetime(2026, 3, 10, 12, 30))
+
+
+def make_event(kind, created_at, **kwargs):
+    return ActivityEvent.objects.create(kind=kind, created_at=created_at, **kwargs)
+
+
+class ActivityRecordingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        events.views.drain()  # просмотры из других тестов
+
+    def test_flows_record_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/auth/register/', {
+                'name': 'New', 'email': 'new@example.com', 'password': 'Secret123!', 'password2': 'Secret123!',
+            })
+        self.assertEqual(response.status_code, 201, response.content)
+        user = User.objects.get(email='new@example.com')
+        user.is_active = True
+        user.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/auth/login/', {'email': 'new@example.com', 'password': 'Secret123!'})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        car = Car.objects.create(brand='Toyota', model='Camry', year=2018, price=Decimal('20000'), car_type='sedan',
+                                 fuel_type='petrol', transmission='automatic', phone='+996555000000')
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/v1/favorites/', {'car_id': car.id}).status_code, 201)
+        self.client.get(f'/api/v1/cars/cars/{car.id}/')
+        self.client.get(f'/api/v1/cars/cars/{car.id}/')
+
+        # Просмотры копятся в памяти до VIEW_BATCH или VIEW_FLUSH_INTERVAL
+        self.assertFalse(ActivityEvent.objects.filter(kind=ActivityEvent.CAR_VIEW).exists())
+        self.assertEqual(events.views.flush(), 2)
+        recorded = list(ActivityEvent.objects.order_by('id').values_list('kind', 'user_id', 'car_id'))
+        self.assertEqual(recorded, [
+            (ActivityEvent.SIGNUP, user.id, None),
+            (ActivityEvent.LOGIN, user.id, None),
+            (ActivityEvent.FAVORITE, user.id, car.id),
+            (ActivityEvent.CAR_VIEW, user.id, car.id),
+            (ActivityEvent.CAR_VIEW, user.id, car.id),
+        ])
+
+    def test_view_flush_failure_keeps_views_and_waits(self):
+        buffer = events.ViewBuffer()
+        with mock.patch.object(events, 'views', buffer), mock.patch.object(events, 'VIEW_BATCH', 1), \
+                mock.patch.object(ActivityEvent.objects, 'bulk_create', side_effect=OperationalError) as insert, \
+                self.assertLogs('activity.events', 'ERROR'):
+            buffer.add(car_id=1)
+            events._flush_views()  # ошибка БД не уходит в close() ответа
+            self.assertEqual(len(buffer._events), 1)
+            # Повтор — через VIEW_FLUSH_INTERVAL, а не на каждом следующем запросе
+            self.assertFalse(buffer.due())
+            events._flush_views()
+            insert.assert_called_once()
+        buffer._retry_at = 0.0
+        self.assertEqual(buffer.flush(), 1)
+        self.assertTrue(ActivityEvent.objects.filter(kind=ActivityEvent.CAR_VIEW, car_id=1).exists())
+
+
+class RollupTests(APITestCase):
+    url = '/api/v1/activity/stats/'
+
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def test_roll_up_counts_each_event_once(self):
+        make_event(ActivityEvent.LOGIN, NOON)
+        make_event(ActivityEvent.LOGIN, NOON + timedelta(minutes=20))
+        make_event(ActivityEvent.SIGNUP, NOON + timedelta(hours=3))
+        # Первый запуск только запоминает горизонт
+        self.assertEqual(rollups.roll_up(), 0)
+        make_event(ActivityEvent.LOGIN, NOON + timedelta(days=1))
+        self.assertEqual(rollups.roll_up(batch_size=2), 3)
+        self.assertEqual(rollups.roll_up(), 1)
+        self.assertEqual(rollups.roll_up(), 0)
+
+        rows = set(ActivityRollup.objects.values_list('period', 'kind', 'start', 'count'))
+        hour = NOON.replace(minute=0)
+        day = NOON.replace(hour=0, minute=0)
+        self.assertEqual(rows, {
+            ('hour', 'login', hour, 2), ('hour', 'signup', hour + timedelta(hours=3), 1),
+            ('hour', 'login', hour + timedelta(days=1), 1),
+            ('day', 'login', day, 2), ('day', 'signup', day, 1), ('day', 'login', day + timedelta(days=1), 1),
+        })
+
+    def test_stats_merge_rollups_with_tail(self):
+        make_event(ActivityEvent.LOGIN, NOON)
+        make_event(ActivityEvent.FAVORITE, NOON)
+        rollups.roll_up()
+        rollups.roll_up()
+        # Учтённые события удалены — история остаётся в сводках
+        self.assertEqual(rollups.prune(timedelta(0)), 2)
+        make_event(ActivityEvent.LOGIN, NOON + timedelta(days=1))
+
+        response = self.client.get(self.url, {'since': '2026-03-09', 'until': '2026-03-12', 'kind': 'login,favorite'})
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(len(data['buckets']), 3)
+        self.assertEqual(data['series'], {'login': [0, 1, 1], 'favorite': [0, 1, 0]})
+        self.assertEqual(data['totals'], {'login': 2, 'favorite': 1})
+
+        hourly = self.client.get(self.url, {'period': 'hour', 'since': '2026-03-10T11:00', 'until': '2026-03-10T13:15'})
+        self.assertEqual(len(hourly.json()['buckets']), 3)
+        self.assertEqual(hourly.json()['series']['login'], [0, 1, 0])
+
+    def test_stats_validation_and_access(self):
+        for params, field in [({'period': 'week'}, 'period'), ({'kind': 'logout'}, 'kind'),
+                              ({'since': 'yesterday'}, 'since'), ({'since': '2026-03-10', 'until': '2026-03-01'}, 'since'),
+                              ({'period': 'hour', 'since': '2020-01-01'}, 'since')]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(field, response.json())
+        self.client.force_authenticate(User.objects.create_user(email='u@example.com', password='x'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from . import views
+
+router = DefaultRouter()
+router.register(r'stats', views.ActivityStatsViewSet, basename='activity-stats')  # /api/v1/activity/stats/
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
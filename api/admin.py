@@ -1,8 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from cars.pagination import EstimatedCountAdminMixin
 from .models import User
 
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(EstimatedCountAdminMixin, BaseUserAdmin):
     model = User
     list_display = ('email', 'first_name', 'last_name', 'role', 'is_staff', 'is_superuser', 'is_active')
     list_filter = ('role', 'is_staff', 'is_superuser', 'is_active')
@@ -17,7 +18,9 @@ class UserAdmin(BaseUserAdmin):
             'fields': ('email', 'password1', 'password2', 'role', 'is_staff', 'is_superuser', 'is_active')}
          ),
     )
-    search_fields = ('email',)
+    # Поиск по началу адреса без учёта регистра: UPPER(email) LIKE 'X%' вместо LIKE '%X%' по всей
+    # таблице. По домену или середине адреса не ищет
+    search_fields = ('^email',)
     ordering = ('email',)
 
 admin.site.register(User, UserAdmin)
\ No newline at end of file
@@ -0,0 +1,28 @@
+# api/management/commands/build_openapi.py
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.openapi import schema_generator
+
+
+class Command(BaseCommand):
+    help = 'Собирает OpenAPI-схему в файл — для API_DOCS=static (запускать при сборке образа).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', default=None, help='Файл схемы (по умолчанию OPENAPI_SCHEMA_FILE)')
+        parser.add_argument('--url', default=None, help='Базовый URL API в схеме, например https://api.example.com')
+
+    def handle(self, *args, **options):
+        from drf_yasg.codecs import OpenAPICodecJson
+
+        output = options['output'] or settings.OPENAPI_SCHEMA_FILE
+        schema = schema_generator(options['url']).get_schema(request=None, public=True)
+        data = OpenAPICodecJson(validators=[]).encode(schema)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'wb') as f:
+            f.write(data)
+        paths = len(json.loads(data)['paths'])
+        self.stdout.write(self.style.SUCCESS(f'Схема: {output} ({paths} путей, {len(data) // 1024} КБ)'))
@@ -0,0 +1,17 @@
+# api/management/commands/send_outbox.py
+from django.core.management.base import BaseCommand
+
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди OutboxEmail (запускать по cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.FLUSH_BATCH)
+        parser.add_argument('--limit', type=int, default=None, help='Не больше N писем за запуск')
+
+    def handle(self, *args, **options):
+        sent, failed = outbox.flush(batch_size=options['batch_size'], limit=options['limit'])
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f'Отправлено: {sent}, ошибок: {failed}'))
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 class CustomUserManager(BaseUserManager):
@@ -42,4 +43,24 @@ class User(AbstractBaseUser, PermissionsMixin):
     REQUIRED_FIELDS = []       # не нужен username
 
     def str(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+    class Meta:
+        # Поиск по email в админке без учёта регистра: iexact даёт UPPER(email) = UPPER(...)
+        indexes = [models.Index(Upper('email'), name='user_email_upper_idx')]
+
+
+class OutboxEmail(models.Model):
+    """Письмо в очереди на отправку (api/outbox.py): запрос не ждёт SMTP, отправка — пачкой."""
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], name='outbox_pending_idx', condition=models.Q(sent_at__isnull=True)),
+        ]
@@ -0,0 +1,61 @@
+# api/outbox.py
+"""
+Исходящая почта через таблицу OutboxEmail.
+
+enqueue() только пишет строку (в той же транзакции, что и событие, которое породило письмо);
+flush() отправляет накопившееся пачками через одно SMTP-соединение — send_outbox по cron.
+Неудачная отправка увеличивает attempts; после MAX_ATTEMPTS письмо больше не берётся.
+Рассчитано на один запущенный send_outbox одновременно.
+"""
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+FLUSH_BATCH = 200
+MAX_ATTEMPTS = 5
+
+
+def enqueue(to, subject, body):
+    return OutboxEmail.objects.create(to=to, subject=subject, body=body)
+
+
+def enqueue_many(messages):
+    """messages — [(to, subject, body), ...]."""
+    return OutboxEmail.objects.bulk_create(
+        [OutboxEmail(to=to, subject=subject, body=body) for to, subject, body in messages], batch_size=500,
+    )
+
+
+def flush(batch_size=FLUSH_BATCH, limit=None):
+    """Отправляет письма из очереди. Возвращает (отправлено, ошибок)."""
+    sent = failed = 0
+    last_id = 0
+    pending = OutboxEmail.objects.filter(sent_at__isnull=True, attempts__lt=MAX_ATTEMPTS).order_by('id')
+    if not pending.exists():
+        return 0, 0  # не открываем SMTP-соединение впустую
+    with get_connection() as connection:
+        while limit is None or sent + failed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - sent - failed)
+            rows = list(pending.filter(id__gt=last_id)[:size])
+            if not rows:
+                break
+            last_id = rows[-1].id
+            delivered = []
+            for row in rows:
+                message = EmailMessage(row.subject, row.body, settings.DEFAULT_FROM_EMAIL, [row.to],
+                                       connection=connection)
+                try:
+                    message.send()
+                except Exception as exc:
+                    # Письмо остаётся в очереди до MAX_ATTEMPTS, остальные из пачки уходят
+                    row.attempts += 1
+                    row.last_error = str(exc)[:1000]
+                    row.save(update_fields=['attempts', 'last_error'])
+                    failed += 1
+                else:
+                    delivered.append(row.id)
+            OutboxEmail.objects.filter(id__in=delivered).update(sent_at=timezone.now())
+            sent += len(delivered)
+    return sent, failed
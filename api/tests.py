@@ -1,3 +1,194 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.core.management import call_command
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+
+from core import openapi as docs
+
+
+class ApiDocsTests(TestCase):
+    def test_deferred_openapi_objects(self):
+        from drf_yasg import openapi
+        parameter = docs.resolve(docs.openapi.Parameter('limit', docs.openapi.IN_QUERY, type=docs.openapi.TYPE_INTEGER))
+        self.assertIsInstance(parameter, openapi.Parameter)
+        self.assertEqual((parameter.name, parameter.in_, parameter.type), ('limit', 'query', 'integer'))
+
+    def test_dynamic_schema_has_view_descriptions(self):
+        response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        schema = json.loads(response.content)
+        self.assertEqual(schema['paths']['/cars/cars/']['get']['summary'], 'Список машин')
+        self.assertEqual(schema['paths']['/cars/admin/cars/']['post']['tags'], ['Админ Машины'])
+
+    def test_build_openapi_and_serve_static_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'openapi.json')
+            call_command('build_openapi', output=output, stdout=open(os.devnull, 'w'))
+            with override_settings(OPENAPI_SCHEMA_FILE=output):
+                response = docs.static_schema(RequestFactory().get('/swagger.json'))
+                schema = json.loads(b''.join(response.streaming_content))
+                response.close()
+        self.assertIn('/cars/cars/{id}/similar/', schema['paths'])
+
+        with override_settings(OPENAPI_SCHEMA_FILE='/nonexistent/openapi.json'):
+            with self.assertRaises(Http404):
+                docs.static_schema(RequestFactory().get('/swagger.json'))
+
+
+class UserAdminTests(TestCase):
+    def test_search_by_email_prefix(self):
+        from api.models import User
+        admin = User.objects.create_superuser('root@example.com', 'pass')
+        anna = User.objects.create_user(email='Anna.Smith@mail.example', password='x')
+        User.objects.create_user(email='bob@anna.example', password='x')
+        self.client.force_login(admin)
+
+        def search(query):
+            response = self.client.get('/admin/api/user/', {'q': query})
+            self.assertEqual(response.status_code, 200)
+            return list(response.context['cl'].result_list)
+
+        self.assertEqual(search('anna'), [anna])
+        self.assertEqual(search('ANNA.SMITH@MAIL.EXAMPLE'), [anna])
+        self.assertEqual(search('mail.example'), [])
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from core.throttling import limiter
+        cache.clear()
+        limiter.clear()
+
+    def test_sliding_window_counts_previous_window(self):
+        from core.throttling import SlidingWindowLimiter
+        limiter = SlidingWindowLimiter()
+        results = [limiter.hit('k', 10, 60, now=60.0 + i)[0] for i in range(12)]
+        self.assertEqual(results, [True] * 10 + [False] * 2)
+        # Полокна спустя предыдущее окно весит половину: 12 * 0.5 + новый запрос > 10 ещё нет
+        allowed, wait = limiter.hit('k', 10, 60, now=150.0)
+        self.assertTrue(allowed)
+        self.assertEqual(wait, 0)
+
+    def test_prefilter_batches_cache_round_trips(self):
+        from unittest import mock
+        from core.throttling import SlidingWindowLimiter
+        limiter = SlidingWindowLimiter()
+        with mock.patch.object(limiter, '_incr', wraps=limiter._incr) as incr:
+            for i in range(200):
+                self.assertTrue(limiter.hit('k', 1000, 60, now=60.0 + i * 0.1)[0])
+        # 1000 / FLUSH_DIVISOR = 50 запросов на один incr
+        self.assertLessEqual(incr.call_count, 6)
+
+    def test_local_windows_are_bounded(self):
+        from unittest import mock
+        from core.throttling import SlidingWindowLimiter
+        limiter = SlidingWindowLimiter()
+        with mock.patch('core.throttling.LOCAL_KEYS', 3):
+            for n in range(10):
+                self.assertTrue(limiter.hit(f'ip{n}', 2, 60, now=60.0)[0])
+            self.assertEqual(set(limiter._windows), {'ip0', 'ip1', 'ip2'})
+            # Живые окна не истекут до 180 с — до тех пор полная таблица не перебирается
+            self.assertEqual(limiter._prune_at, 180)
+            # Ключ вне таблицы всё равно ограничен — через счётчик в кеше
+            self.assertEqual([limiter.hit('ip9', 2, 60, now=61.0)[0] for _ in range(2)], [True, False])
+            # Окна истекли — место освобождается
+            limiter.hit('new', 2, 60, now=200.0)
+            self.assertEqual(set(limiter._windows), {'new'})
+
+    @override_settings(REST_FRAMEWORK={
+        'DEFAULT_THROTTLE_CLASSES': ('core.throttling.AnonBucketThrottle', 'core.throttling.ScopedBucketThrottle'),
+        'DEFAULT_THROTTLE_RATES': {'anon': '100/min', 'catalog': '3/min'},
+    })
+    def test_scoped_limit_returns_429_per_client(self):
+        url = '/api/v1/cars/cars/'
+        statuses = [self.client.get(url, REMOTE_ADDR='203.0.113.1').status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        response = self.client.get(url, REMOTE_ADDR='203.0.113.1')
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.2').status_code, 200)
+        with override_settings(THROTTLING=False):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.1').status_code, 200)
+
+
+class AdmissionTests(TestCase):
+    def middleware(self, get_response=None):
+        from django.http import HttpResponse
+        from core.admission import AdmissionMiddleware
+        return AdmissionMiddleware(get_response or (lambda request: HttpResponse('ok')))
+
+    def test_sheds_requests_that_waited_in_queue(self):
+        import time
+        middleware = self.middleware()
+        factory = RequestFactory()
+        with override_settings(ADMISSION_MAX_QUEUE_MS=500):
+            stale = factory.get('/api/v1/cars/cars/', HTTP_X_REQUEST_START=f't={time.time() - 3:.3f}')
+            self.assertEqual(middleware(stale).status_code, 503)
+            fresh = factory.get('/api/v1/cars/cars/', HTTP_X_REQUEST_START=f't={time.time():.3f}')
+            self.assertEqual(middleware(fresh).status_code, 200)
+            self.assertEqual(middleware(factory.get('/api/v1/cars/cars/')).status_code, 200)
+
+    def test_sheds_anonymous_before_authenticated_when_busy(self):
+        factory = RequestFactory()
+        middleware = self.middleware()
+        with override_settings(ADMISSION_MAX_INFLIGHT=2):
+            middleware.inflight = 2
+            response = middleware(factory.get('/api/v1/cars/cars/'))
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '2')
+            self.assertEqual(middleware(factory.get('/api/v1/cars/cars/', HTTP_AUTHORIZATION='Bearer x')).status_code, 200)
+            self.assertEqual(middleware(factory.get('/admin/')).status_code, 200)
+        self.assertEqual(middleware.inflight, 2)
+
+
+class CompressionTests(TestCase):
+    def respond(self, body, content_type='application/json', path='/api/v1/cars/cars/', **headers):
+        from django.http import HttpResponse
+        from core.compression import CompressionMiddleware
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type=content_type))
+        return middleware(RequestFactory().get(path, **headers))
+
+    def test_prefers_brotli_and_falls_back_to_gzip(self):
+        import gzip
+        import brotli
+        body = json.dumps([{'brand': 'Toyota', 'model': 'Camry', 'n': n} for n in range(200)]).encode()
+        response = self.respond(body, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), body)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        response = self.respond(body, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertFalse(self.respond(body).has_header('Content-Encoding'))
+
+    def test_skips_small_binary_and_exempt_responses(self):
+        body = b'{"a": 1}' * 500
+        with override_settings(COMPRESSION_MIN_SIZE=10_000):
+            self.assertFalse(self.respond(body, HTTP_ACCEPT_ENCODING='br').has_header('Content-Encoding'))
+        self.assertFalse(self.respond(body, 'image/jpeg', HTTP_ACCEPT_ENCODING='br').has_header('Content-Encoding'))
+        self.assertFalse(self.respond(body, path='/api/v1/auth/login/',
+                                      HTTP_ACCEPT_ENCODING='br').has_header('Content-Encoding'))
+        self.assertTrue(self.respond(body, 'application/msgpack', HTTP_ACCEPT_ENCODING='br').has_header('Content-Encoding'))
+
+
+class RendererTests(TestCase):
+    def test_columnar_round_trip_and_passthrough(self):
+        from core.renderers import ColumnarJSONRenderer, from_columns
+        items = [{'id': 1, 'brand': 'BMW', 'images': [{'id': 5}]}, {'id': 2, 'brand': 'Kia', 'extra': True}]
+        page = json.loads(ColumnarJSONRenderer().render({'count': 2, 'next': None, 'results': items}))
+        self.assertEqual(page['results']['columns'], ['id', 'brand', 'images', 'extra'])
+        self.assertEqual(page['results']['rows'][0], [1, 'BMW', [{'id': 5}], None])
+        self.assertEqual(from_columns(page['results'])[1], {'id': 2, 'brand': 'Kia', 'images': None, 'extra': True})
+        self.assertEqual(json.loads(ColumnarJSONRenderer().render({'detail': 'x'})), {'detail': 'x'})
+
+    def test_msgpack_encodes_decimals_and_dates(self):
+        import datetime
+        import decimal
+        import msgpack
+        from core.renderers import MessagePackRenderer
+        data = {'price': decimal.Decimal('10.50'), 'at': datetime.datetime(2024, 1, 2, 3, 4, 5)}
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data)),
+                         {'price': 10.5, 'at': '2024-01-02T03:04:05'})
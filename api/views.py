@@ -3,8 +3,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+from core.openapi import openapi, swagger_auto_schema
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
@@ -12,6 +11,8 @@ from django.contrib.auth import authenticate
 import random
 from datetime import timedelta
 
+from activity import events
+from activity.models import ActivityEvent
 from api.models import User
 from .serializers import RegisterSerializer
 from .tokens import CustomAccessToken
@@ -19,6 +20,7 @@ from .tokens import CustomAccessToken
 
 class AuthViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
+    throttle_scope = 'auth'
 
     # === Регистрация ===
     @swagger_auto_schema(
@@ -40,6 +42,7 @@ class AuthViewSet(viewsets.ViewSet):
             user.activation_key = ''.join([str(random.randint(0, 9)) for _ in range(4)])
             user.activation_key_expires = timezone.now() + timedelta(hours=48)
             user.save()
+            events.record(ActivityEvent.SIGNUP, user_id=user.id)
             self.send_activation_email(user)
             return Response({'message': 'Регистрация успешна. Проверьте email.'}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -83,6 +86,7 @@ class AuthViewSet(viewsets.ViewSet):
         # ✅ Генерация кастомного токена с ролью
         access = str(CustomAccessToken.for_user(user))
         role = "admin" if user.is_staff or user.is_superuser else "user"
+        events.record(ActivityEvent.LOGIN, user_id=user.id)
 
         return Response({'access': access, 'role': role}, status=status.HTTP_200_OK)
 
@@ -1,6 +1,98 @@
-from django.contrib import admin
-from .models import Car
+# cars/admin.py
+"""
+Админка каталога, рассчитанная на таблицу в миллион машин:
+- количество — CarCountPaginator (кеш по версии каталога, оценка планировщика), без второго COUNT
+  по всей таблице (show_full_result_count = False);
+- фильтры только по полям с choices и булевым — им не нужен SELECT DISTINCT по таблице;
+- поиск — точные совпадения по индексам (id, телефон, марка/модель без учёта регистра), а не LIKE '%…%';
+- сортировка по id — обходится индексом первичного ключа;
+- включение/снятие с продажи — cars/bulk.py, UPDATE на пачку вместо save() на каждую машину.
+"""
+from django.contrib import admin, messages
+from django.db.models import Q
+from django.utils.html import format_html
+
+from core.media import rendition_url
+
+from . import bulk, gallery
+from .models import Car, CarImage, MarketStat, PriceHistory
+from .pagination import CarCountPaginator, EstimatedCountAdminMixin
+
+THUMBNAIL_WIDTH = 320
+
+
+def thumbnail(field_file):
+    url = rendition_url(field_file, THUMBNAIL_WIDTH)
+    return format_html('<img src="{}" width="80" loading="lazy">', url) if url else '—'
+
+
+class CarImageInline(admin.TabularInline):
+    model = CarImage
+    extra = 0
+    fields = ['preview', 'image']
+    readonly_fields = ['preview']
+
+    @admin.display(description='Превью')
+    def preview(self, obj):
+        return thumbnail(obj.image)
+
 
 @admin.register(Car)
-class CarAdmin(admin.ModelAdmin):
-    list_display = ['brand', 'model', 'year', 'price', 'car_type']
\ No newline at end of file
+class CarAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    paginator = CarCountPaginator
+    list_display = ['id', 'preview', 'brand', 'model', 'year', 'price', 'car_type', 'is_active', 'created_at']
+    list_display_links = ['id', 'brand']
+    list_filter = ['is_active', 'car_type', 'fuel_type', 'transmission', 'condition']
+    search_fields = ['=brand', '=model', '=phone']
+    search_help_text = 'id, телефон, марка, модель или "марка модель" — точное совпадение'
+    ordering = ['-id']
+    inlines = [CarImageInline]
+    actions = ['activate', 'deactivate']
+
+    @admin.display(description='Фото')
+    def preview(self, obj):
+        return thumbnail(obj.image)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(Q(id=int(term)) | Q(phone=term)), False
+        if term.startswith('+'):
+            return queryset.filter(phone=term), False
+        brand, _, model = term.partition(' ')
+        query = Q(brand__iexact=term) | Q(model__iexact=term)
+        if model:
+            query |= Q(brand__iexact=brand, model__iexact=model.strip())
+        return queryset.filter(query), False
+
+    @admin.action(description='Включить выбранные объявления')
+    def activate(self, request, queryset):
+        updated = bulk.set_active(queryset, True)
+        self.message_user(request, f'Включено объявлений: {updated}', messages.SUCCESS)
+
+    @admin.action(description='Снять выбранные объявления с продажи')
+    def deactivate(self, request, queryset):
+        updated = bulk.set_active(queryset, False)
+        self.message_user(request, f'Снято с продажи: {updated}', messages.SUCCESS)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Фото из инлайна сохраняются после машины — сводку галереи считаем в конце
+        gallery.refresh([form.instance.pk])
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    list_display = ['car_id', 'price', 'changed_at']
+    raw_id_fields = ['car']
+    search_fields = ['=car__id']
+    ordering = ['-id']
+
+
+@admin.register(MarketStat)
+class MarketStatAdmin(admin.ModelAdmin):
+    list_display = ['brand', 'model', 'year_from', 'count', 'price_median', 'dirty', 'refreshed_at']
+    list_filter = ['dirty']
+    search_fields = ['=brand', '=model']
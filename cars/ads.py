@@ -0,0 +1,157 @@
+# cars/ads.py
+"""
+Выдача баннеров без обращения к БД на каждый запрос.
+
+Снимок: активные Ad, заранее сериализованные в JSON-байты, и их веса. Живёт в памяти процесса
+и пересобирается, когда меняется штамп (max(updated_at), count) всех баннеров. Штамп проверяется
+не чаще раза в SNAPSHOT_CHECK_INTERVAL секунд, а изменения через ORM в этом же процессе
+(сигналы) сбрасывают снимок сразу.
+
+Снимок собирается без запроса, поэтому ссылки на картинки в нём относительные. Схему и хост
+(core.media.public_base_url) подставляет serve; байты держатся для последнего base_url — с
+PUBLIC_BASE_URL он один на все запросы, а подставной Host не раздувает память.
+
+Показы копятся в счётчике процесса и пишутся пачкой F()-апдейтами — раз в FLUSH_INTERVAL секунд
+или после FLUSH_EVERY показов. update() не трогает updated_at, поэтому снимок от этого не сбрасывается.
+"""
+import atexit
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+from django.db import DatabaseError
+from django.db.models import Count, F, Max
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.media import absolutize
+from .models import Ad
+from .serializers import MEDIA_URL_FIELDS, PublicAdSerializer
+
+SNAPSHOT_CHECK_INTERVAL = 2.0
+FLUSH_INTERVAL = 10.0
+FLUSH_EVERY = 1000
+
+
+class AdSnapshot:
+    def __init__(self, stamp, ads):
+        self.stamp = stamp
+        self.ids = [ad['id'] for ad in ads]
+        self.weights = [max(ad.pop('weight'), 1) for ad in ads]
+        self.ads = ads
+        self._rendered = (None, [])  # (base_url, JSON-байты баннеров)
+
+    def pick(self, limit, rng=random):
+        """
+        Индексы limit баннеров: взвешенная выборка без возвращения (ключ u^(1/w), Efraimidis–Spirakis).
+        Первый в ответе — главный баннер, его шанс пропорционален весу.
+        """
+        n = len(self.ids)
+        if n <= 1:
+            return list(range(n))[:limit]
+        keys = [rng.random() ** (1.0 / w) for w in self.weights]
+        return sorted(range(n), key=keys.__getitem__, reverse=True)[:limit]
+
+    def payloads(self, base_url):
+        rendered_for, payloads = self._rendered
+        if rendered_for != base_url:
+            payloads = [json.dumps(absolutize(ad, base_url, MEDIA_URL_FIELDS), cls=JSONEncoder,
+                                   ensure_ascii=False).encode() for ad in self.ads]
+            self._rendered = (base_url, payloads)
+        return payloads
+
+    def render(self, indexes, base_url):
+        payloads = self.payloads(base_url)
+        return b'[' + b','.join(payloads[i] for i in indexes) + b']'
+
+
+def _stamp():
+    row = Ad.objects.aggregate(updated=Max('updated_at'), total=Count('id'))
+    return row['updated'], row['total']
+
+
+def _build(stamp):
+    ads = Ad.objects.filter(is_active=True).order_by('id')
+    data = PublicAdSerializer(ads, many=True).data
+    for item, ad in zip(data, ads):
+        item['weight'] = ad.weight
+    return AdSnapshot(stamp, [dict(item) for item in data])
+
+
+class AdDelivery:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._impressions = Counter()
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+
+    def snapshot(self):
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return snapshot
+        with self._lock:
+            # Пока ждали блокировку, другой поток мог уже проверить штамп
+            if self._snapshot is not None and now - self._checked_at < SNAPSHOT_CHECK_INTERVAL:
+                return self._snapshot
+            stamp = _stamp()
+            if self._snapshot is None or self._snapshot.stamp != stamp:
+                self._snapshot = _build(stamp)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def serve(self, limit, base_url):
+        """JSON-массив баннеров со ссылками от base_url; показы засчитываются всем отданным."""
+        snapshot = self.snapshot()
+        indexes = snapshot.pick(limit)
+        self.count_impressions(snapshot.ids[i] for i in indexes)
+        return snapshot.render(indexes, base_url)
+
+    def count_impressions(self, ad_ids):
+        with self._lock:
+            for ad_id in ad_ids:
+                self._impressions[ad_id] += 1
+                self._pending += 1
+            due = self._pending >= FLUSH_EVERY or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._impressions = self._impressions, Counter()
+            self._pending = 0
+            self._flushed_at = time.monotonic()
+        # Одинаковые приросты — одним UPDATE на группу
+        by_count = {}
+        for ad_id, count in pending.items():
+            by_count.setdefault(count, []).append(ad_id)
+        try:
+            for count, ids in by_count.items():
+                Ad.objects.filter(id__in=ids).update(impressions=F('impressions') + count)
+                for ad_id in ids:
+                    del pending[ad_id]
+        except DatabaseError:
+            # Не записанное вернём в буфер — уйдёт со следующей пачкой, а баннер отдастся без ошибки
+            with self._lock:
+                self._impressions.update(pending)
+                self._pending += sum(pending.values())
+            return 0
+        return sum(count * len(ids) for count, ids in by_count.items())
+
+
+delivery = AdDelivery()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        delivery.flush()
+    except Exception:
+        # На выходе БД может быть уже недоступна — теряем не больше FLUSH_INTERVAL секунд показов
+        pass
@@ -0,0 +1,155 @@
+# cars/archive.py
+"""
+Архивация давно неактивных объявлений.
+
+archive_inactive переносит машины с is_active=False, не менявшиеся дольше ARCHIVE_AFTER, в ArchivedCar
+пачками по id: строка машины, её фото, избранное и история цен сериализуются в JSON, затем удаляются из рабочих
+таблиц. Удаление — _raw_delete без сигналов: ссылки на файлы переходят в архив (их учитывает
+cars/blobs.py), а версию каталога и журнал изменений (cars/changes.py) пишем сами, один раз на пачку.
+
+restore возвращает машину под тем же id вместе с фото, историей цен и избранным (если пользователь
+ещё существует). Рекомендации и совпадения сохранённых поисков — производные данные, их не храним:
+пересоберут build_recommendations и оповещения.
+"""
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.models import User
+from favorites.models import Favorite
+from . import changes, detail, gallery
+from .cache import bump_catalog_version
+from .models import ArchivedCar, Car, CarChange, CarImage, PriceHistory
+
+ARCHIVE_AFTER = timedelta(days=180)
+ARCHIVE_BATCH = 500
+
+
+def _raw_delete(queryset):
+    # QuerySet.delete() при подключённых сигналах грузит каждую строку и шлёт post_delete —
+    # для пачечного переноса это лишнее. Зависимые таблицы чистим явно (см. _delete_cars).
+    return queryset._raw_delete(queryset.db)
+
+
+def _delete_cars(ids):
+    """Удаляет машины и строки, которые ссылаются на них по FK, без сигналов (один уровень связей)."""
+    for relation in Car._meta.related_objects:
+        related = relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': ids})
+        if relation.on_delete is models.CASCADE:
+            _raw_delete(related)
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+        else:
+            raise NotImplementedError(f'{relation.related_model.__name__}.{relation.field.name}: '
+                                      f'архивация поддерживает только CASCADE и SET_NULL')
+    return _raw_delete(Car._base_manager.filter(id__in=ids))
+
+
+def _archive_rows(cars):
+    ids = [car['id'] for car in cars]
+    images, favorites, prices = {}, {}, {}
+    for car_id, name in CarImage.objects.filter(car_id__in=ids).order_by('id').values_list('car_id', 'image'):
+        images.setdefault(car_id, []).append(name)
+    for car_id, user_id, created_at in (Favorite.objects.filter(car_id__in=ids).order_by('id')
+                                        .values_list('car_id', 'user_id', 'created_at')):
+        favorites.setdefault(car_id, []).append([user_id, created_at.isoformat()])
+    for car_id, price, changed_at in (PriceHistory.objects.filter(car_id__in=ids).order_by('id')
+                                      .values_list('car_id', 'price', 'changed_at')):
+        prices.setdefault(car_id, []).append([str(price), changed_at.isoformat()])
+    rows = []
+    for car in cars:
+        rows.append(ArchivedCar(
+            id=car['id'], brand=car['brand'], model=car['model'], year=car['year'], price=car['price'],
+            phone=car['phone'], created_at=car['created_at'], deactivated_at=car['updated_at'],
+            data=_jsonable(car), images=images.get(car['id'], []), favorites=favorites.get(car['id'], []),
+            price_history=prices.get(car['id'], []),
+        ))
+    return rows
+
+
+def _jsonable(data):
+    result = {}
+    for key, value in data.items():
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif value is not None and not isinstance(value, (str, int, float, bool)):
+            value = str(value)  # Decimal
+        result[key] = value
+    return result
+
+
+def archive_batch(ids):
+    """Переносит машины из ids, которые всё ещё неактивны. Возвращает число перенесённых."""
+    with transaction.atomic():
+        cars = list(Car.objects.select_for_update().filter(id__in=ids, is_active=False).values())
+        if not cars:
+            return 0
+        ids = [car['id'] for car in cars]
+        ArchivedCar.objects.bulk_create(_archive_rows(cars))
+        _delete_cars(ids)
+        changes.record(ids, CarChange.DELETE)
+        detail.invalidate(ids)
+    bump_catalog_version()
+    return len(cars)
+
+
+def archive_inactive(older_than=ARCHIVE_AFTER, batch_size=ARCHIVE_BATCH, limit=None):
+    """Архивирует все подходящие машины пачками; каждая пачка — отдельная короткая транзакция."""
+    cutoff = timezone.now() - older_than
+    candidates = Car.objects.filter(is_active=False, updated_at__lt=cutoff).order_by('id')
+    archived = 0
+    last_id = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        archived += archive_batch(ids)
+    return archived
+
+
+def restore(archived):
+    """Возвращает машину из архива (неактивной — включает админ). Возвращает Car."""
+    # Поля, которых уже нет в модели, отбрасываем; новые получат значения по умолчанию
+    fields = {field.attname for field in Car._meta.concrete_fields}
+    data = {key: value for key, value in archived.data.items() if key in fields}
+    created_at = parse_datetime(data['created_at'])
+    with transaction.atomic():
+        # bulk_create: без сигналов, ссылки на файлы просто возвращаются из архива (cars/blobs.py)
+        car = Car(**data)
+        Car.objects.bulk_create([car])
+        # auto_now_add при вставке перезаписывает created_at — возвращаем исходную дату
+        Car.objects.filter(id=car.id).update(created_at=created_at)
+        CarImage.objects.bulk_create([CarImage(car_id=car.id, image=name) for name in archived.images])
+        # В старых архивах сводки галереи нет
+        gallery.refresh([car.id])
+        if archived.price_history:
+            history = PriceHistory.objects.bulk_create(
+                [PriceHistory(car_id=car.id, price=price) for price, _ in archived.price_history])
+            # auto_now_add при вставке перезаписывает changed_at — возвращаем исходные даты
+            PriceHistory.objects.filter(car_id=car.id).update(changed_at=Case(
+                *[When(id=row.id, then=Value(parse_datetime(changed_at)))
+                  for row, (_, changed_at) in zip(history, archived.price_history)],
+                default=F('changed_at'),
+            ))
+
+        known_users = set(User.objects.filter(id__in=[user_id for user_id, _ in archived.favorites])
+                          .values_list('id', flat=True))
+        favorites = [(user_id, parse_datetime(created)) for user_id, created in archived.favorites
+                     if user_id in known_users]
+        if favorites:
+            Favorite.objects.bulk_create([Favorite(user_id=user_id, car_id=car.id) for user_id, _ in favorites],
+                                         ignore_conflicts=True)
+            Favorite.objects.filter(car_id=car.id).update(created_at=Case(
+                *[When(user_id=user_id, then=Value(created)) for user_id, created in favorites],
+                default=F('created_at'),
+            ))
+        archived.delete()
+        changes.record([car.id])
+        detail.invalidate([car.id])
+    bump_catalog_version()
+    return Car.objects.get(id=car.id)
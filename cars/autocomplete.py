@@ -0,0 +1,201 @@
+# cars/autocomplete.py
+"""
+Подсказки марок и моделей для строки поиска (GET cars/cars/autocomplete/?q=) без запроса к БД.
+
+Снимок — марки и модели активных машин с числом объявлений (один GROUP BY по индексу
+car_active_brand_model_idx). Живёт в памяти процесса, как баннеры в cars/ads.py: версия каталога
+(cars/cache.py) проверяется не чаще раза в CHECK_INTERVAL секунд, пересборка — не чаще раза в
+REBUILD_INTERVAL, пока один поток пересобирает, остальные отвечают из старого снимка.
+
+Сравнение идёт по «сложенной» строке (fold): кириллица транслитерируется, похожие по звучанию
+латинские сочетания сводятся к одному (c/k, y/i, w/v, ch/sh, двойные буквы), поэтому «камри»,
+«kamry» и «Camry» совпадают. Запрос с кириллицей ищется ещё раз с заменой похожих букв на латинские.
+1. Префикс — бисекция по отсортированному списку ключей.
+2. Опечатка (одна вставка, пропуск, замена или перестановка соседних букв, запрос от FUZZY_MIN
+   символов) — только если префиксных совпадений нет. Индекс удалений (SymSpell): для префиксов
+   ключей до FUZZY_PREFIX символов заранее записаны они сами и все варианты без одной буквы;
+   кандидаты проверяются точным сравнением.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db.models import Count
+
+from .cache import catalog_version
+from .models import Car
+
+CHECK_INTERVAL = 2.0
+REBUILD_INTERVAL = 30.0
+FUZZY_MIN = 3
+FUZZY_PREFIX = 8
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'i', 'ь': '',
+    'э': 'e', 'ю': 'iu', 'я': 'ia', 'ң': 'n', 'ө': 'o', 'ү': 'u',
+}
+# Кириллические буквы, похожие на латинские: «х5», набранное в русской раскладке, — это X5
+HOMOGLYPHS = str.maketrans('авекмнорстух', 'abekmhopctyx')
+# Порядок важен: ch -> sh раньше, чем c -> k
+PHONETIC = [
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'ch'), 'sh'),
+    (re.compile(r'ck'), 'k'),
+    (re.compile(r'c(?=[eiy])'), 's'),
+    (re.compile(r'[cq]'), 'k'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'y'), 'i'),
+    (re.compile(r'([a-z])\1+'), r'\1'),
+]
+_NOT_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def fold(text):
+    """Ключ сравнения: латиница без регистра, пунктуации и различий в транслитерации."""
+    text = ''.join(TRANSLIT.get(ch, ch) for ch in text.lower())
+    text = _NOT_WORD.sub(' ', text).strip()
+    for pattern, replacement in PHONETIC:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one(a, b):
+    """Расстояние Дамерау–Левенштейна (без повторных правок одной буквы) между a и b не больше 1."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (a[i + 1:i + 2] == b[i:i + 1] and a[i:i + 1] == b[i + 1:i + 2]
+                                      and a[i + 2:] == b[i + 2:])
+
+
+class AutocompleteIndex:
+    def __init__(self, stamp, rows):
+        """rows — (марка, модель, число активных машин)."""
+        self.stamp = stamp
+        brands = defaultdict(int)
+        self.entries = []
+        keyed = []
+        for brand, model, count in rows:
+            brands[brand] += count
+            keyed.append((fold(model), len(self.entries)))
+            keyed.append((fold(f'{brand} {model}'), len(self.entries)))
+            self.entries.append({'type': 'model', 'brand': brand, 'model': model,
+                                 'label': f'{brand} {model}', 'count': count})
+        for brand, count in brands.items():
+            keyed.append((fold(brand), len(self.entries)))
+            self.entries.append({'type': 'brand', 'brand': brand, 'model': None, 'label': brand, 'count': count})
+        keyed = sorted({(key, entry) for key, entry in keyed if key})
+        self.keys = [key for key, _ in keyed]
+        self.owners = [entry for _, entry in keyed]
+
+        self.variants = defaultdict(set)
+        for position, key in enumerate(self.keys):
+            for length in range(FUZZY_MIN - 1, min(len(key), FUZZY_PREFIX) + 1):
+                prefix = key[:length]
+                self.variants[prefix].add(position)
+                for variant in _deletes(prefix):
+                    self.variants[variant].add(position)
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        seen = set()
+        found = self._suggest(fold(query), limit, seen)
+        lookalike = query.lower().translate(HOMOGLYPHS)
+        if len(found) < limit and lookalike != query.lower():
+            found += self._suggest(fold(lookalike), limit - len(found), seen)
+        return found
+
+    def _suggest(self, query, limit, seen):
+        if not query:
+            return []
+        found = []
+        start = bisect_left(self.keys, query)
+        for position in range(start, len(self.keys)):
+            if not self.keys[position].startswith(query):
+                break
+            self._collect(position, found, seen)
+        if found or len(query) < FUZZY_MIN:
+            found.sort(key=lambda entry: -entry['count'])
+            return found[:limit]
+
+        head = query if len(query) < FUZZY_PREFIX else query[:FUZZY_PREFIX - 1]
+        candidates = set(self.variants.get(head, ()))
+        for variant in _deletes(head):
+            candidates |= self.variants.get(variant, set())
+        for position in candidates:
+            key = self.keys[position]
+            if any(_within_one(query, key[:n]) for n in (len(query) - 1, len(query), len(query) + 1)):
+                self._collect(position, found, seen)
+        found.sort(key=lambda entry: -entry['count'])
+        return found[:limit]
+
+    def _collect(self, position, found, seen):
+        entry = self.owners[position]
+        if entry not in seen:
+            seen.add(entry)
+            found.append(self.entries[entry])
+
+
+def _build(stamp):
+    rows = (Car.objects.filter(is_active=True).order_by().values_list('brand', 'model')
+            .annotate(count=Count('id')))
+    return AutocompleteIndex(stamp, list(rows))
+
+
+class AutocompleteRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+
+    def snapshot(self):
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < CHECK_INTERVAL:
+            return snapshot
+        # Снимок уже есть — не ждём чужую пересборку, отвечаем из старого
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if self._snapshot is not None and now - self._checked_at < CHECK_INTERVAL:
+                return self._snapshot
+            stamp = catalog_version()
+            if self._snapshot is None or (self._snapshot.stamp != stamp
+                                          and now - self._built_at >= REBUILD_INTERVAL):
+                self._snapshot = _build(stamp)
+                self._built_at = time.monotonic()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """Следующий запрос пересоберёт снимок, не дожидаясь интервалов."""
+        self._checked_at = 0.0
+        self._built_at = 0.0
+
+
+registry = AutocompleteRegistry()
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    return registry.snapshot().suggest(query, limit)
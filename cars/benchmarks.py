@@ -0,0 +1,835 @@
+# cars/benchmarks.py
+"""
+Сценарии нагрузочного теста API. Запуск: manage.py bench (см. cars/management/commands/bench.py).
+
+Сценарий — функция, которая получает контекст и номер итерации и выполняет один запрос через
+ctx.client. Регистрируются декоратором @scenario; время каждого вызова меряет раннер.
+"""
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+SCENARIOS = {}
+CLIENT_POOL = 1000
+
+
+def scenario(name, setup=None, teardown=None):
+    """Регистрирует сценарий. setup(ctx) готовит данные до замера, teardown(ctx) убирает за собой."""
+    def decorator(func):
+        SCENARIOS[name] = {'run': func, 'setup': setup, 'teardown': teardown, 'doc': (func.__doc__ or '').strip()}
+        return func
+    return decorator
+
+
+class BenchResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class InProcessTransport:
+    """Запросы через тестовый клиент Django — без сети, меряет только стек приложения."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = Client()
+        return self._local.client
+
+    def client_addr(self):
+        """Адрес из пула CLIENT_POOL (198.18.0.0/15 — для тестов сети): нагрузка от многих клиентов,
+        а не от одного IP, который сразу упрётся в лимиты core/throttling.py."""
+        n = getattr(self._local, 'requests', 0)
+        self._local.requests = n + 1
+        n = (n * 7919 + threading.get_ident()) % CLIENT_POOL
+        return f'198.18.{n // 256}.{n % 256}'
+
+    def request(self, method, path, data=None, multipart=False, token=None, headers=None):
+        extra = dict(headers or {})
+        extra.setdefault('REMOTE_ADDR', self.client_addr())
+        if token:
+            extra['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        call = getattr(self.client, method.lower())
+        if method == 'GET':
+            response = call(path, data or {}, **extra)
+        elif multipart:
+            response = call(path, data or {}, **extra)
+        else:
+            response = call(path, json.dumps(data or {}), content_type='application/json', **extra)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return BenchResponse(response.status_code, body)
+
+    def request_file(self, method, path, body_file, content_type, token=None):
+        """Тело читается из файла потоком — тестовый клиент не держит его целиком в памяти."""
+        size = os.fstat(body_file.fileno()).st_size
+        body_file.seek(0)
+        overrides = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(size), 'wsgi.input': body_file, 'REMOTE_ADDR': self.client_addr(),
+        }
+        if token:
+            overrides['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        response = self.client.handler(self.client._base_environ(**overrides))
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return BenchResponse(response.status_code, body)
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу (runserver/gunicorn) по HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, data=None, multipart=False, token=None, headers=None):
+        url = self.base_url + path
+        body = None
+        request_headers = {}
+        for key, value in (headers or {}).items():
+            request_headers[key.removeprefix('HTTP_').replace('_', '-').title()] = value
+        if token:
+            request_headers['Authorization'] = f'Bearer {token}'
+        if method == 'GET':
+            if data:
+                url += '?' + urllib.parse.urlencode(data, doseq=True)
+        elif multipart:
+            body = encode_multipart(BOUNDARY, data or {})
+            request_headers['Content-Type'] = MULTIPART_CONTENT
+        else:
+            body = json.dumps(data or {}).encode()
+            request_headers['Content-Type'] = 'application/json'
+        return self._send(url, body, request_headers, method)
+
+    def request_file(self, method, path, body_file, content_type, token=None):
+        body_file.seek(0)
+        headers = {'Content-Type': content_type, 'Content-Length': str(os.fstat(body_file.fileno()).st_size)}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        return self._send(self.base_url + path, body_file, headers, method)
+
+    def _send(self, url, body, headers, method):
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return BenchResponse(response.status, response.read())
+        except urllib.error.HTTPError as exc:
+            return BenchResponse(exc.code, exc.read())
+
+
+class BenchContext:
+    """Общее состояние прогона: транспорт, выборки id, токены по потокам."""
+
+    def __init__(self, transport, seed=42):
+        self.client = transport
+        self.seed = seed
+        self.data = {}
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def rng(self):
+        if not hasattr(self._local, 'rng'):
+            self._local.rng = random.Random(f'{self.seed}-{threading.get_ident()}')
+        return self._local.rng
+
+    @property
+    def thread_state(self):
+        if not hasattr(self._local, 'state'):
+            self._local.state = {}
+        return self._local.state
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies, errors, wall_time):
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        'requests': len(ms),
+        'errors': errors,
+        'wall_time_s': round(wall_time, 4),
+        'throughput_rps': round(len(ms) / wall_time, 2) if wall_time else None,
+        'latency_ms': {
+            'mean': round(statistics.fmean(ms), 3) if ms else None,
+            'p50': round(percentile(ms, 50), 3) if ms else None,
+            'p90': round(percentile(ms, 90), 3) if ms else None,
+            'p95': round(percentile(ms, 95), 3) if ms else None,
+            'p99': round(percentile(ms, 99), 3) if ms else None,
+            'max': round(ms[-1], 3) if ms else None,
+        },
+    }
+
+
+def run_scenario(name, ctx, requests=200, concurrency=1, warmup=10):
+    spec = SCENARIOS[name]
+    if spec['setup']:
+        spec['setup'](ctx)
+    try:
+        for i in range(warmup):
+            spec['run'](ctx, i)
+        ctx.data.pop(f'{name}:extra', None)
+
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def worker(indexes):
+            nonlocal errors
+            local_latencies = []
+            local_errors = 0
+            for i in indexes:
+                started = time.perf_counter()
+                try:
+                    ok = spec['run'](ctx, i)
+                except Exception:
+                    ok = False
+                local_latencies.append(time.perf_counter() - started)
+                if ok is False:
+                    local_errors += 1
+            close_old_connections()
+            with lock:
+                latencies.extend(local_latencies)
+                errors += local_errors
+
+        chunks = [range(w, requests, concurrency) for w in range(concurrency)]
+        started = time.perf_counter()
+        if concurrency == 1:
+            worker(chunks[0])
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(worker, chunks))
+        wall_time = time.perf_counter() - started
+    finally:
+        if spec['teardown']:
+            spec['teardown'](ctx)
+
+    result = summarize(latencies, errors, wall_time)
+    result['concurrency'] = concurrency
+    result.update(ctx.data.pop(f'{name}:extra', {}))
+    return result
+
+
+def compare(current, baseline):
+    """Строки сравнения двух JSON-отчётов: p50/p95/rps и изменение в процентах."""
+    rows = []
+    for name, result in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base or 'latency_ms' not in result or 'latency_ms' not in base:
+            continue
+        for metric, new, old in (
+            ('p50', result['latency_ms']['p50'], base['latency_ms']['p50']),
+            ('p95', result['latency_ms']['p95'], base['latency_ms']['p95']),
+            ('rps', result['throughput_rps'], base['throughput_rps']),
+        ):
+            if new is None or not old:
+                continue
+            rows.append((name, metric, old, new, (new - old) / old * 100))
+    return rows
+
+
+# === Данные для сценариев ===
+
+def _active_car_ids(ctx):
+    from cars.models import Car
+    if 'car_ids' not in ctx.data:
+        ids = list(Car.objects.filter(is_active=True).values_list('id', flat=True)[:5000])
+        if not ids:
+            raise RuntimeError('В базе нет активных машин — сначала выполните manage.py seed_catalog')
+        ctx.data['car_ids'] = ids
+    return ctx.data['car_ids']
+
+
+def _login(ctx, email, password):
+    response = ctx.client.request('POST', '/api/v1/auth/login/', {'email': email, 'password': password})
+    if response.status != 200:
+        raise RuntimeError(f'Не удалось войти как {email}: {response.status} {response.body[:200]!r}')
+    return response.json()['access']
+
+
+def _user_token(ctx):
+    """Отдельный пользователь сидера на каждый поток — чтобы избранное не конфликтовало."""
+    state = ctx.thread_state
+    if 'token' not in state:
+        from cars.management.commands.seed_catalog import SEED_EMAIL_DOMAIN, SEED_PASSWORD
+        with ctx.lock:
+            index = ctx.data.setdefault('_next_user', 0)
+            ctx.data['_next_user'] = index + 1
+        state['token'] = _login(ctx, f'user{index}@{SEED_EMAIL_DOMAIN}', SEED_PASSWORD)
+    return state['token']
+
+
+def _admin_token(ctx):
+    if 'admin_token' not in ctx.data:
+        from cars.management.commands.seed_catalog import SEED_ADMIN_EMAIL, SEED_PASSWORD
+        ctx.data['admin_token'] = _login(ctx, SEED_ADMIN_EMAIL, SEED_PASSWORD)
+    return ctx.data['admin_token']
+
+
+# === Сценарии ===
+
+@scenario('browse', setup=_active_car_ids)
+def browse(ctx, i):
+    """Каталог: список машин и карточка машины."""
+    if i % 2:
+        car_id = ctx.rng.choice(ctx.data['car_ids'])
+        return ctx.client.request('GET', f'/api/v1/cars/cars/{car_id}/').status == 200
+    return ctx.client.request('GET', '/api/v1/cars/cars/', {'page': ctx.rng.randint(1, 20)}).status == 200
+
+
+def _hot_setup(ctx):
+    ctx.data['hot_ids'] = _active_car_ids(ctx)[:20]
+
+
+@scenario('car_detail_hot', setup=_hot_setup)
+def car_detail_hot(ctx, i):
+    """Карточки 20 «вирусных» машин — из двухуровневого кеша (cars/detail.py)."""
+    car_id = ctx.data['hot_ids'][i % len(ctx.data['hot_ids'])]
+    return ctx.client.request('GET', f'/api/v1/cars/cars/{car_id}/').status == 200
+
+
+@scenario('car_detail_uncached', setup=_hot_setup)
+def car_detail_uncached(ctx, i):
+    """Те же карточки с промахом: новая версия машины, и detail.cached_car проходит мимо LRU и общего кеша."""
+    from cars import detail
+    from cars.serializers import CarSerializer
+    car_id = ctx.data['hot_ids'][i % len(ctx.data['hot_ids'])]
+    # Вне транзакции on_commit выполняется сразу — версия меняется до запроса карточки
+    detail.invalidate([car_id])
+    return detail.cached_car(car_id, lambda car: CarSerializer(car).data) is not None
+
+
+@scenario('throttle_check')
+def throttle_check(ctx, i):
+    """Проверка лимита core/throttling.py: 1000 клиентов по 600/min, в основном без обращения к кешу."""
+    from core.throttling import limiter
+    return limiter.hit(f'bench:{ctx.rng.randrange(CLIENT_POOL)}', 600, 60)[0]
+
+
+@scenario('throttle_cache_incr')
+def throttle_cache_incr(ctx, i):
+    """Для сравнения: счётчик без предфильтра — add + incr в общем кеше на каждый запрос."""
+    from core.throttling import limiter
+    return limiter._incr(f'bench:incr:{ctx.rng.randrange(CLIENT_POOL)}:{int(time.time() // 60)}', 1, 60) <= 600
+
+
+def _search_setup(ctx):
+    from cars.management.commands.seed_catalog import CATALOG
+    ctx.data['search_terms'] = [brand for brand in CATALOG] + [
+        model for models_, _ in CATALOG.values() for model in models_]
+
+
+@scenario('search', setup=_search_setup)
+def search(ctx, i):
+    """Поиск по марке/модели с ценовым диапазоном."""
+    rng = ctx.rng
+    params = {'search': rng.choice(ctx.data['search_terms'])}
+    if rng.random() < 0.7:
+        low = rng.randrange(2000, 40000, 1000)
+        params.update(min_price=low, max_price=low + rng.randrange(5000, 30000, 1000))
+    return ctx.client.request('GET', '/api/v1/cars/cars/', params).status == 200
+
+
+def _autocomplete_setup(ctx):
+    from cars.management.commands.seed_catalog import CATALOG
+    labels = [brand for brand in CATALOG] + [f'{brand} {model}' for brand, (models_, _) in CATALOG.items()
+                                             for model in models_]
+    # Всё, что набирается по буквам, плюс кириллица и опечатки
+    queries = [label[:n] for label in labels for n in range(1, len(label) + 1)]
+    queries += ['тойота', 'камри', 'мерседес', 'бмв х5', 'хонда', 'фольксваген', 'toyta', 'mersedes', 'lexsus']
+    ctx.data['autocomplete_queries'] = queries
+
+
+@scenario('autocomplete', setup=_autocomplete_setup)
+def autocomplete(ctx, i):
+    """Подсказки строки поиска на каждое нажатие клавиши (cars/autocomplete.py)."""
+    params = {'q': ctx.rng.choice(ctx.data['autocomplete_queries'])}
+    return ctx.client.request('GET', '/api/v1/cars/cars/autocomplete/', params).status == 200
+
+
+@scenario('autocomplete_lookup', setup=_autocomplete_setup)
+def autocomplete_lookup(ctx, i):
+    """Только поиск по снимку в памяти, без HTTP."""
+    from cars import autocomplete
+    autocomplete.suggest(ctx.rng.choice(ctx.data['autocomplete_queries']))
+
+
+# === Форматы ответа списка (core/renderers.py, core/compression.py) ===
+
+FORMATS = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+    'columnar': 'application/vnd.columnar+json',
+}
+
+
+def _decode(fmt, body, encoding):
+    """То, что делает клиент: распаковка и разбор в список объектов."""
+    import gzip
+    import brotli
+    import msgpack
+    from core.renderers import from_columns
+    if encoding == 'br':
+        body = brotli.decompress(body)
+    elif encoding == 'gzip':
+        body = gzip.decompress(body)
+    data = msgpack.unpackb(body) if fmt == 'msgpack' else json.loads(body)
+    if fmt == 'columnar':
+        data['results'] = from_columns(data['results'])
+    return data
+
+
+def _format_scenario(fmt, encoding):
+    name = f'list_{fmt}_{encoding}'
+    headers = {'HTTP_ACCEPT': FORMATS[fmt]}
+    if encoding != 'identity':
+        headers['HTTP_ACCEPT_ENCODING'] = encoding
+
+    def run(ctx, i):
+        page = ctx.rng.randrange(1, 11)
+        response = ctx.client.request('GET', '/api/v1/cars/cars/', {'page': page, 'page_size': 100}, headers=headers)
+        started = time.perf_counter()
+        data = _decode(fmt, response.body, encoding)
+        decode_ms = (time.perf_counter() - started) * 1000
+        with ctx.lock:
+            extra = ctx.data.setdefault(f'{name}:extra', {'responses': 0, 'wire_bytes': 0, 'decode_ms': 0.0})
+            extra['responses'] += 1
+            extra['wire_bytes'] += len(response.body)
+            extra['decode_ms'] += decode_ms
+            extra['wire_bytes_avg'] = extra['wire_bytes'] // extra['responses']
+            extra['decode_ms_avg'] = round(extra['decode_ms'] / extra['responses'], 3)
+        return response.status == 200 and len(data['results']) == 100
+
+    run.__doc__ = f'Страница из 100 машин: {FORMATS[fmt]}, сжатие {encoding}; в extra — байты и время разбора клиентом.'
+    return run
+
+
+for _fmt in FORMATS:
+    for _encoding in ('identity', 'gzip', 'br'):
+        scenario(f'list_{_fmt}_{_encoding}')(_format_scenario(_fmt, _encoding))
+
+
+@scenario('favorite_toggle', setup=_active_car_ids)
+def favorite_toggle(ctx, i):
+    """Добавление машины в избранное и удаление обратно."""
+    token = _user_token(ctx)
+    car_id = ctx.rng.choice(ctx.data['car_ids'])
+    response = ctx.client.request('POST', '/api/v1/favorites/', {'car_id': car_id}, token=token)
+    if response.status != 201:
+        return response.status == 400  # уже в избранном — тоже валидный ответ
+    favorite_id = response.json()['data']['id']
+    return ctx.client.request('DELETE', f'/api/v1/favorites/{favorite_id}/', token=token).status == 204
+
+
+def _login_setup(ctx):
+    from cars.management.commands.seed_catalog import SEED_EMAIL_DOMAIN, SEED_PASSWORD
+    ctx.data['login_payload'] = {'email': f'user0@{SEED_EMAIL_DOMAIN}', 'password': SEED_PASSWORD}
+
+
+@scenario('login', setup=_login_setup)
+def login(ctx, i):
+    """Вход по email и паролю (PBKDF2 + выпуск JWT)."""
+    return ctx.client.request('POST', '/api/v1/auth/login/', ctx.data['login_payload']).status == 200
+
+
+def _upload_setup(ctx):
+    from cars.management.commands.seed_catalog import make_jpeg
+    _admin_token(ctx)
+    ctx.data['upload_images'] = [make_jpeg(seed=n) for n in range(3)]
+    ctx.data['uploaded_ids'] = []
+
+
+def _upload_teardown(ctx):
+    from cars import blobs
+    from cars.models import Car, MediaBlob
+    cars = Car.objects.filter(id__in=ctx.data.pop('uploaded_ids', []))
+    names = set()
+    for car in cars.prefetch_related('images'):
+        names.update(image.image.name for image in car.images.all())
+        if car.image:
+            names.add(car.image.name)
+    cars.delete()
+    # Одинаковые фото делят файл (cars/blobs.py) — удаляем только те, на которые ссылок не осталось
+    from django.core.files.storage import default_storage
+    for name in MediaBlob.objects.filter(name__in=names, refcount__lte=0).values_list('name', flat=True):
+        for path in [name] + blobs.derived_names(name):
+            default_storage.delete(path)
+    MediaBlob.objects.filter(name__in=names, refcount__lte=0).delete()
+
+
+@scenario('admin_upload', setup=_upload_setup, teardown=_upload_teardown)
+def admin_upload(ctx, i):
+    """Создание машины админом с тремя фото (multipart)."""
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    data = {
+        'brand': 'Toyota', 'model': 'Camry', 'year': 2020, 'price': '25000.00',
+        'car_type': 'sedan', 'fuel_type': 'petrol', 'transmission': 'automatic',
+        'phone': '+996555000000',
+        'images': [SimpleUploadedFile(f'bench_{i}_{n}.jpg', content, content_type='image/jpeg')
+                   for n, content in enumerate(ctx.data['upload_images'])],
+    }
+    response = ctx.client.request('POST', '/api/v1/cars/admin/cars/', data, multipart=True,
+                                  token=ctx.data['admin_token'])
+    if response.status != 201:
+        return False
+    ctx.data['uploaded_ids'].append(response.json()['id'])
+    return True
+
+
+def make_large_jpeg(size_mb, seed):
+    """JPEG из шума примерно size_mb МБ — шум почти не сжимается, размер предсказуем."""
+    import io
+    from PIL import Image
+    rng = random.Random(seed)
+    pixels = int(size_mb * 2**20 / 0.93)  # ~0.93 байта на пиксель при quality=92
+    width = int((pixels * 4 / 3) ** 0.5)
+    height = pixels // width
+    image = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=92)
+    return buf.getvalue()
+
+
+def _gallery_setup(ctx):
+    import tempfile
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    _upload_setup(ctx)
+    data = {
+        'brand': 'Toyota', 'model': 'Camry', 'year': 2020, 'price': '25000.00',
+        'car_type': 'sedan', 'fuel_type': 'petrol', 'transmission': 'automatic',
+        'phone': '+996555000000',
+        'images': [SimpleUploadedFile(f'gallery_{n}.jpg', make_large_jpeg(8, seed=n), content_type='image/jpeg')
+                   for n in range(10)],
+    }
+    # Тело кодируем один раз на диск: в замер попадает только обработка запроса сервером
+    body = tempfile.TemporaryFile()
+    body.write(encode_multipart(BOUNDARY, data))
+    ctx.data['gallery_body'] = body
+
+
+def _gallery_buffered_setup(ctx):
+    from django.test import override_settings
+    _gallery_setup(ctx)
+    ctx.data['upload_override'] = override_settings(CAR_UPLOAD_STREAMING=False)
+    ctx.data['upload_override'].enable()
+
+
+def _gallery_teardown(ctx):
+    ctx.data.pop('gallery_body').close()
+    _upload_teardown(ctx)
+
+
+def _gallery_buffered_teardown(ctx):
+    ctx.data.pop('upload_override').disable()
+    _gallery_teardown(ctx)
+
+
+def _proc_status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _upload_gallery(ctx, i, name):
+    """
+    Пик RSS за запрос: сбрасываем VmHWM через /proc/self/clear_refs (Linux) и берём прирост над RSS
+    до запроса. Имеет смысл in-process и при concurrency=1.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        before = _proc_status_mb('VmRSS')
+    except OSError:
+        before = None
+    response = ctx.client.request_file('POST', '/api/v1/cars/admin/cars/', ctx.data['gallery_body'],
+                                       MULTIPART_CONTENT, token=ctx.data['admin_token'])
+    if before is not None:
+        growth = _proc_status_mb('VmHWM') - before
+        with ctx.lock:
+            extra = ctx.data.setdefault(f'{name}:extra', {'peak_rss_growth_mb': 0.0})
+            extra['peak_rss_growth_mb'] = round(max(extra['peak_rss_growth_mb'], growth), 1)
+    if response.status != 201:
+        return False
+    ctx.data['uploaded_ids'].append(response.json()['id'])
+    return True
+
+
+@scenario('upload_gallery', setup=_gallery_setup, teardown=_gallery_teardown)
+def upload_gallery(ctx, i):
+    """Галерея 10 × 8 МБ через потоковый ImageUploadHandler (cars/uploads.py)."""
+    return _upload_gallery(ctx, i, 'upload_gallery')
+
+
+@scenario('upload_gallery_buffered', setup=_gallery_buffered_setup, teardown=_gallery_buffered_teardown)
+def upload_gallery_buffered(ctx, i):
+    """То же со стандартными обработчиками Django и проверкой Pillow (только in-process)."""
+    return _upload_gallery(ctx, i, 'upload_gallery_buffered')
+
+
+def _sync_setup(ctx):
+    ctx.data['sync_cursor'] = ctx.client.request('GET', '/api/v1/cars/cars/changes/').json()['cursor']
+
+
+@scenario('sync_changes', setup=_sync_setup)
+def sync_changes(ctx, i):
+    """Инкрементальная синхронизация с курсора (cars/changes.py); в extra — средний размер ответа."""
+    response = ctx.client.request('GET', '/api/v1/cars/cars/changes/', {'since': ctx.data['sync_cursor']})
+    with ctx.lock:
+        extra = ctx.data.setdefault('sync_changes:extra', {'bytes_total': 0, 'responses': 0})
+        extra['bytes_total'] += len(response.body)
+        extra['responses'] += 1
+    return response.status == 200
+
+
+def _ads_setup(ctx):
+    from cars.models import Ad
+    if not Ad.objects.filter(is_active=True).exists():
+        Ad.objects.bulk_create([
+            Ad(title=f'Bench banner {n}', description='Рассрочка 0%', weight=n + 1) for n in range(5)
+        ])
+
+
+@scenario('ads_active', setup=_ads_setup)
+def ads_active(ctx, i):
+    """Публичный /ads/active/ — снимок в памяти, без БД."""
+    return ctx.client.request('GET', '/api/v1/cars/ads/active/', {'limit': 3}).status == 200
+
+
+@scenario('ads_snapshot', setup=_ads_setup)
+def ads_snapshot(ctx, i):
+    """Только выборка и сборка JSON из снимка (cars/ads.py), без HTTP-стека."""
+    from cars.ads import delivery
+    delivery.serve(3, 'http://testserver')
+
+
+# === Подсчёт количества в списках (запускать на большой базе: seed_catalog --cars 1000000) ===
+
+COUNT_FILTERS = [
+    {},
+    {'fuel_type': 'petrol'},
+    {'min_price': 10000, 'max_price': 30000},
+    {'car_type': 'suv', 'min_price': 15000},
+    {'brand': 'Toyota'},
+    {'min_year': 2015, 'transmission': 'automatic,robot'},
+]
+
+
+def _count_extra(ctx, name, exact):
+    with ctx.lock:
+        stats = ctx.data.setdefault(f'{name}:extra', {'exact_counts': 0, 'estimated_counts': 0})
+        stats['exact_counts' if exact else 'estimated_counts'] += 1
+
+
+@scenario('count_star')
+def count_star(ctx, i):
+    """Базовая линия: полный COUNT(*) через ORM по тем же фильтрам, без кеша."""
+    from django.http import QueryDict
+    from cars.filters import CarFilter
+    from cars.models import Car
+
+    params = QueryDict(mutable=True)
+    params.update(COUNT_FILTERS[i % len(COUNT_FILTERS)])
+    CarFilter(params).filter_queryset(Car.objects.filter(is_active=True), order=False).count()
+
+
+@scenario('list_count_cold')
+def list_count_cold(ctx, i):
+    """Первая страница списка с промахом кеша счётчика (проба LIMIT / оценка планировщика)."""
+    # Безобидная верхняя граница цены делает подпись фильтра уникальной — кеш не срабатывает
+    params = dict(COUNT_FILTERS[i % len(COUNT_FILTERS)], max_price=100_000_000 + i)
+    response = ctx.client.request('GET', '/api/v1/cars/cars/', params)
+    if response.status != 200:
+        return False
+    _count_extra(ctx, 'list_count_cold', response.json()['count_exact'])
+
+
+@scenario('list_count_warm')
+def list_count_warm(ctx, i):
+    """Первая страница списка, счётчик из кеша."""
+    response = ctx.client.request('GET', '/api/v1/cars/cars/', COUNT_FILTERS[i % len(COUNT_FILTERS)])
+    if response.status != 200:
+        return False
+    _count_extra(ctx, 'list_count_warm', response.json()['count_exact'])
+
+
+# === Похожие машины (индекс: manage.py build_similar_index) ===
+
+def _similar_setup(ctx):
+    from cars import similar
+    index = similar.get_index()
+    if index is None:
+        raise RuntimeError('Нет индекса похожих машин — выполните manage.py build_similar_index')
+    ctx.data['similar_index'] = index
+    ctx.data['similar_ids'] = [int(x) for x in index.ids[:5000]]
+
+
+@scenario('similar_lookup', setup=_similar_setup)
+def similar_lookup(ctx, i):
+    """Поиск соседей в mmap-индексе, без HTTP и ORM."""
+    ctx.data['similar_index'].neighbours_for(ctx.rng.choice(ctx.data['similar_ids']), 10)
+
+
+@scenario('similar_api', setup=_similar_setup)
+def similar_api(ctx, i):
+    """Эндпоинт /cars/{id}/similar/ целиком."""
+    car_id = ctx.rng.choice(ctx.data['similar_ids'])
+    return ctx.client.request('GET', f'/api/v1/cars/cars/{car_id}/similar/').status == 200
+
+
+# === Поиск по расстоянию (cars/geo.py) ===
+
+def _geo_point(ctx):
+    from cars.management.commands.seed_catalog import CITIES
+    latitude, longitude, _ = ctx.rng.choice(list(CITIES.values()))
+    return latitude + ctx.rng.gauss(0, 0.05), longitude + ctx.rng.gauss(0, 0.05), ctx.rng.choice([5, 10, 25])
+
+
+@scenario('geo_nearby')
+def geo_nearby(ctx, i):
+    """Ближайшие машины в радиусе от точки у одного из городов seed_catalog (geohash-индекс)."""
+    lat, lon, radius = _geo_point(ctx)
+    params = {'lat': f'{lat:.5f}', 'lon': f'{lon:.5f}', 'radius': radius, 'ordering': 'distance'}
+    return ctx.client.request('GET', '/api/v1/cars/cars/', params).status == 200
+
+
+@scenario('geo_scan')
+def geo_scan(ctx, i):
+    """Тот же отбор без geohash: расстояние по всем активным машинам (база для сравнения с geo_nearby)."""
+    from django.db.models.lookups import LessThanOrEqual
+    from cars import geo
+    from cars.models import Car
+    lat, lon, radius = _geo_point(ctx)
+    distance_sq = geo.distance_sq_expression(lat, lon)
+    list(Car.objects.filter(LessThanOrEqual(distance_sq, radius ** 2), is_active=True)
+         .annotate(distance_sq=distance_sq).order_by('distance_sq', 'id').values_list('id', flat=True)[:20])
+
+
+# === Статистика активности (activity/rollups.py) ===
+
+ACTIVITY_EVENTS = 500_000
+ACTIVITY_DAYS = 90
+
+
+def _activity_setup(ctx):
+    """Синтетические события за ACTIVITY_DAYS дней (досеваются до ACTIVITY_EVENTS) и сводки по ним."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from activity import rollups
+    from activity.models import ActivityEvent
+    _admin_token(ctx)
+    missing = ACTIVITY_EVENTS - ActivityEvent.objects.count()
+    if missing > 0:
+        now = timezone.now()
+        kinds = [ActivityEvent.CAR_VIEW] * 20 + [ActivityEvent.LOGIN] * 4 + [ActivityEvent.FAVORITE] * 2 + [
+            ActivityEvent.SIGNUP]
+        ActivityEvent.objects.bulk_create(
+            [ActivityEvent(kind=ctx.rng.choice(kinds), user_id=ctx.rng.randrange(1, 1000),
+                           created_at=now - timedelta(seconds=ctx.rng.randrange(ACTIVITY_DAYS * 86400)))
+             for _ in range(missing)],
+            batch_size=5000,
+        )
+    rollups.roll_up()
+    rollups.roll_up()
+
+
+@scenario('activity_stats', setup=_activity_setup)
+def activity_stats(ctx, i):
+    """Дашборд активности за 30 дней по дням: сводки + хвост после курсора."""
+    return ctx.client.request('GET', '/api/v1/activity/stats/', token=ctx.data['admin_token']).status == 200
+
+
+@scenario('activity_scan', setup=_activity_setup)
+def activity_scan(ctx, i):
+    """Тот же ряд GROUP BY по сырым событиям (база для сравнения с activity_stats)."""
+    from datetime import timedelta
+    from django.db.models import Count
+    from django.db.models.functions import TruncDay
+    from django.utils import timezone
+    from activity.models import ActivityEvent
+    since = timezone.now() - timedelta(days=30)
+    list(ActivityEvent.objects.filter(created_at__gte=since).annotate(day=TruncDay('created_at'))
+         .values_list('kind', 'day').annotate(count=Count('id')).order_by())
+
+
+# === Старт процесса: импорт приложения в новом интерпретаторе (manage.py bench -s startup_... -n 10 --warmup 1) ===
+
+STARTUP_CODE = (
+    "import os, time; started = time.perf_counter(); import django; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings'); django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns; "
+    "print(round((time.perf_counter() - started) * 1000, 1))"
+)
+
+
+def _run_startup(api_docs, importtime=False):
+    from django.conf import settings
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP_CODE]
+    env = dict(os.environ, API_DOCS=api_docs)
+    return subprocess.run(args, capture_output=True, text=True, env=env, cwd=settings.BASE_DIR, check=True)
+
+
+def import_profile(api_docs, top=10):
+    """Самые дорогие пакеты при старте по python -X importtime: {пакет: мс}, по убыванию."""
+    packages = {}
+    for line in _run_startup(api_docs, importtime=True).stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.startswith('  '):
+            continue  # вложенный импорт — уже учтён в cumulative родителя
+        root = name.strip().split('.')[0]
+        packages[root] = packages.get(root, 0) + int(cumulative) / 1000
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {name: round(ms, 1) for name, ms in ranked}
+
+
+def _startup_setup(api_docs):
+    def setup(ctx):
+        ctx.data[f'startup:{api_docs}'] = {
+            'api_docs': api_docs,
+            'app_import_ms': float(_run_startup(api_docs).stdout),
+            'import_profile_ms': import_profile(api_docs),
+        }
+    return setup
+
+
+def _startup(ctx, name, api_docs):
+    _run_startup(api_docs)
+    ctx.data.setdefault(f'{name}:extra', ctx.data[f'startup:{api_docs}'])
+
+
+@scenario('startup_docs_dynamic', setup=_startup_setup('dynamic'))
+def startup_docs_dynamic(ctx, i):
+    """Холодный старт (django.setup + URLconf) с API_DOCS=dynamic — drf_yasg в INSTALLED_APPS."""
+    _startup(ctx, 'startup_docs_dynamic', 'dynamic')
+
+
+@scenario('startup_docs_static', setup=_startup_setup('static'))
+def startup_docs_static(ctx, i):
+    """Холодный старт с API_DOCS=static: схема из файла build_openapi, drf_yasg не импортируется."""
+    _startup(ctx, 'startup_docs_static', 'static')
@@ -0,0 +1,235 @@
+# cars/blobs.py
+"""
+Учёт ссылок на медиафайлы машин.
+
+Файлы кладёт ContentHashStorage (core/media.py): имя — хеш содержимого, поэтому повторная загрузка
+того же фото не создаёт новый файл. MediaBlob.refcount — сколько полей Car.image / CarImage.image
+(и архивных машин, cars/archive.py) указывают на файл; счётчик ведут сигналы (cars/signals.py)
+через F()-апдейты, архивация и восстановление его не меняют.
+
+Файл без ссылок удаляет gc_media, но не сразу, а спустя grace-период после released_at: загрузка
+сначала пишет файл и только потом сохраняет запись, и такой файл нельзя считать мусором.
+bulk_create/update сигналов не шлют — после них нужен reconcile() (gc_media --reconcile).
+"""
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db.models import Count, F
+from django.utils import timezone
+
+from core.media import RENDITION_WIDTHS, file_digest, is_hashed_name, rendition_name
+from . import changes, detail, gallery
+from .cache import bump_catalog_version
+from .models import ArchivedCar, Car, CarImage, MediaBlob
+
+# Поля, ссылки из которых считаем
+BLOB_FIELDS = ((Car, 'image'), (CarImage, 'image'))
+DEFAULT_GRACE = timedelta(hours=24)
+GC_BATCH = 500
+
+
+def _size(name):
+    try:
+        return default_storage.size(name)
+    except OSError:
+        return 0
+
+
+def acquire(name):
+    if not name:
+        return
+    MediaBlob.objects.get_or_create(name=name, defaults={'size': _size(name)})
+    MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, released_at=None)
+
+
+def release(name):
+    if not name:
+        return
+    MediaBlob.objects.filter(name=name).update(refcount=F('refcount') - 1, released_at=timezone.now())
+
+
+def _loaded_fields(instance):
+    deferred = instance.get_deferred_fields()
+    return [field for model, field in BLOB_FIELDS if isinstance(instance, model) and field not in deferred]
+
+
+def remember_names(instance):
+    """Запоминает имена файлов при загрузке из БД — чтобы при сохранении понять, что сменилось."""
+    instance._blob_names = {field: getattr(instance, field).name for field in _loaded_fields(instance)}
+
+
+def sync_names(instance, created):
+    previous = getattr(instance, '_blob_names', {})
+    for field in _loaded_fields(instance):
+        new = getattr(instance, field).name or ''
+        if created:
+            acquire(new)
+        elif field in previous and previous[field] != new:
+            # Поле, не загруженное при чтении (only/defer), не трогаем — поправит reconcile
+            acquire(new)
+            release(previous[field])
+    remember_names(instance)
+
+
+def release_names(instance):
+    for field in _loaded_fields(instance):
+        release(getattr(instance, field).name)
+
+
+def referenced_counts():
+    """{имя: число ссылок} по всем BLOB_FIELDS и архиву — источник истины для reconcile."""
+    counts = {}
+    for model, field in BLOB_FIELDS:
+        rows = (model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field).annotate(n=Count('pk')).order_by())
+        for name, n in rows:
+            counts[name] = counts.get(name, 0) + n
+    for name, n in archived_counts().items():
+        counts[name] = counts.get(name, 0) + n
+    return counts
+
+
+def archived_counts():
+    """Фото архивных машин (cars/archive.py) — их держим, пока машину можно восстановить."""
+    counts = {}
+    for data, images in ArchivedCar.objects.values_list('data', 'images').iterator(chunk_size=GC_BATCH):
+        for name in [data.get('image')] + images:
+            if name:
+                counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def reconcile(batch_size=GC_BATCH):
+    """Пересчитывает refcount по фактическим ссылкам. Возвращает (создано, исправлено)."""
+    counts = referenced_counts()
+    now = timezone.now()
+
+    missing = counts.keys() - set(MediaBlob.objects.values_list('name', flat=True))
+    new = [MediaBlob(name=name, size=_size(name), refcount=counts[name]) for name in missing]
+    MediaBlob.objects.bulk_create(new, batch_size=batch_size)
+    created = len(new)
+
+    wrong = []
+    for blob in MediaBlob.objects.only('name', 'size', 'refcount', 'released_at').iterator(chunk_size=batch_size):
+        actual = counts.get(blob.name, 0)
+        # size = 0 — запись создана раньше, чем файл появился в хранилище
+        size = blob.size or _size(blob.name)
+        if blob.refcount != actual or blob.size != size:
+            blob.refcount, blob.size = actual, size
+            blob.released_at = (blob.released_at or now) if actual == 0 else None
+            wrong.append(blob)
+    MediaBlob.objects.bulk_update(wrong, ['refcount', 'size', 'released_at'], batch_size=batch_size)
+    fixed = len(wrong)
+    return created, fixed
+
+
+def derived_names(name):
+    """Файлы, которые живут и умирают вместе с оригиналом: предсжатые версии и превью."""
+    return [name + '.gz', name + '.br'] + [rendition_name(name, width) for width in RENDITION_WIDTHS]
+
+
+def collect_garbage(grace=DEFAULT_GRACE, batch_size=GC_BATCH, dry_run=False):
+    """Удаляет файлы без ссылок пачками. Возвращает (файлов, байт)."""
+    cutoff = timezone.now() - grace
+    removed = freed = 0
+    last = ''
+    while True:
+        batch = list(
+            MediaBlob.objects.filter(refcount__lte=0, released_at__lt=cutoff, name__gt=last)
+            .order_by('name').values_list('name', 'size')[:batch_size]
+        )
+        if not batch:
+            break
+        last = batch[-1][0]
+        for name, size in batch:
+            if dry_run:
+                removed, freed = removed + 1, freed + size
+                continue
+            # Строку удаляем условно: если ссылка появилась после выборки, файл остаётся
+            if not MediaBlob.objects.filter(name=name, refcount__lte=0).delete()[0]:
+                continue
+            for path in [name] + derived_names(name):
+                try:
+                    default_storage.delete(path)
+                except OSError:
+                    pass
+            removed, freed = removed + 1, freed + size
+    return removed, freed
+
+
+def orphan_files(grace=DEFAULT_GRACE, prefixes=('cars/',)):
+    """Файлы на диске, о которых нет MediaBlob (брошенные загрузки, старые копии) и старше grace."""
+    # Ссылки тоже исключаем: файл мог ещё не попасть в MediaBlob (bulk_create без reconcile)
+    known = set(MediaBlob.objects.values_list('name', flat=True)) | referenced_counts().keys()
+    cutoff = (timezone.now() - grace).timestamp()
+    root = default_storage.location
+    for prefix in prefixes:
+        for directory, _, files in os.walk(os.path.join(root, prefix)):
+            for filename in files:
+                if filename.endswith(('.gz', '.br', '.tmp')):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name not in known and os.path.getmtime(path) < cutoff:
+                    yield name, os.path.getsize(path)
+
+
+def adopt_legacy(storage=None):
+    """
+    Переносит файлы со старыми именами (до ContentHashStorage) под хеш-имена: дубликаты сливаются
+    в один файл, ссылки переписываются UPDATE-ом. storage должен быть ContentHashStorage.
+    Возвращает (перенесено, освобождено байт).
+    """
+    storage = storage or default_storage
+    now = timezone.now()
+    moved = freed = 0
+    # Имена внутри JSON архива не переписываем — такие файлы оставляем как есть
+    archived = archived_counts()
+    for name in referenced_counts():
+        if is_hashed_name(name) or name in archived or not storage.exists(name):
+            continue
+        with storage.open(name, 'rb') as f:
+            merged = storage.exists(storage.hashed_name(name, file_digest(f)))
+            new_name = storage.save(name, f)
+        if new_name == name:
+            continue
+        size = storage.size(name)
+        for model, field in BLOB_FIELDS:
+            updates = {field: new_name}
+            if model is Car:
+                updates['updated_at'] = now
+            rows = model.objects.filter(**{field: name})
+            car_ids = list(rows.values_list('pk' if model is Car else 'car_id', flat=True).distinct())
+            changes.record(car_ids)
+            detail.invalidate(car_ids)
+            rows.update(**updates)
+            # Обложка — имя превью от переименованного файла
+            gallery.refresh(car_ids)
+        for path in [name] + derived_names(name):
+            storage.delete(path)
+        MediaBlob.objects.filter(name=name).delete()
+        moved, freed = moved + 1, freed + (size if merged else 0)
+    if moved:
+        # UPDATE сигналов не шлёт — счётчики и версию каталога поправляем сами
+        reconcile()
+        bump_catalog_version()
+    return moved, freed
+
+
+def savings_report():
+    """Сколько места заняли бы копии без дедупликации и сколько занимают реально."""
+    counts = referenced_counts()
+    sizes = dict(MediaBlob.objects.values_list('name', 'size').iterator(chunk_size=GC_BATCH))
+    logical = sum(sizes.get(name, 0) * n for name, n in counts.items())
+    physical = sum(sizes.get(name, 0) for name in counts)
+    unreferenced = MediaBlob.objects.filter(refcount__lte=0)
+    return {
+        'references': sum(counts.values()),
+        'blobs': len(counts),
+        'logical_bytes': logical,
+        'physical_bytes': physical,
+        'saved_bytes': logical - physical,
+        'unreferenced_blobs': unreferenced.count(),
+        'unreferenced_bytes': sum(unreferenced.values_list('size', flat=True)),
+    }
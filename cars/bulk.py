@@ -0,0 +1,84 @@
+# cars/bulk.py
+"""
+Пачечные изменения машин (действия админки, POST cars/admin/cars/bulk/): UPDATE на пачку id вместо
+save() на каждую машину.
+
+update() обходит сигналы Car, поэтому побочные эффекты выполняются здесь, один раз на операцию:
+одна смена версии каталога, записи в журнал изменений (cars/changes.py), новые версии карточек
+(cars/detail.py), пометка затронутых групп статистики рынка (cars/market.py), для цен — строки
+PriceHistory. Пачки по BATCH_SIZE id — чтобы не упираться в лимит параметров SQLite и не держать
+длинную блокировку на большой выборке.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from . import changes, detail, market
+from .cache import bump_catalog_version
+from .models import Car, PriceHistory
+
+BATCH_SIZE = 2000
+
+
+def _batches(queryset, fields):
+    """Строки выборки пачками по возрастанию id (keyset, без OFFSET)."""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def set_active(queryset, is_active):
+    """Включает/снимает с продажи машины выборки. Возвращает число изменённых машин."""
+    updated = 0
+    for rows in _batches(queryset.exclude(is_active=is_active), ('brand', 'model', 'year')):
+        with transaction.atomic():
+            updated += Car.objects.filter(id__in=[row[0] for row in rows]).update(
+                is_active=is_active, updated_at=timezone.now(),
+            )
+            changes.record(row[0] for row in rows)
+            detail.invalidate(row[0] for row in rows)
+            market.mark_dirty({(brand, model, market.year_bucket(year)) for _, brand, model, year in rows})
+    if updated:
+        bump_catalog_version()
+    return updated
+
+
+def set_price(queryset, price=None, percent=None):
+    """
+    Новая цена для машин выборки: price — одна для всех, percent — изменение в процентах
+    с округлением до копеек. Возвращает число машин, у которых цена изменилась.
+    """
+    if price is not None:
+        queryset = queryset.exclude(price=price)
+        new_price = Value(Decimal(price), output_field=DecimalField(max_digits=12, decimal_places=2))
+    elif percent:
+        factor = Value(1 + Decimal(percent) / 100, output_field=DecimalField(max_digits=12, decimal_places=6))
+        new_price = Round(F('price') * factor, 2, output_field=DecimalField(max_digits=12, decimal_places=2))
+    else:
+        return 0
+
+    updated = 0
+    for rows in _batches(queryset, ('brand', 'model', 'year', 'is_active', 'price')):
+        ids = [row[0] for row in rows]
+        old = {row[0]: row[5] for row in rows}
+        with transaction.atomic():
+            Car.objects.filter(id__in=ids).update(price=new_price, updated_at=timezone.now())
+            # Новые цены — одним SELECT: после округления цена могла и не измениться
+            changed = [(car_id, value) for car_id, value in Car.objects.filter(id__in=ids).values_list('id', 'price')
+                       if Decimal(value) != Decimal(old[car_id])]
+            PriceHistory.objects.bulk_create([PriceHistory(car_id=car_id, price=value) for car_id, value in changed])
+            changes.record(car_id for car_id, _ in changed)
+            detail.invalidate(car_id for car_id, _ in changed)
+            market.mark_dirty({(brand, model, market.year_bucket(year))
+                               for _, brand, model, year, is_active, _ in rows if is_active})
+        updated += len(changed)
+    if updated:
+        bump_catalog_version()
+    return updated
@@ -0,0 +1,37 @@
+# cars/cache.py
+"""
+Версия каталога — счётчик в общем кеше, который растёт при любом изменении машин или фото.
+Ключи производных кешей (счётчики списков и т.п.) включают версию, поэтому инвалидация —
+это один incr, а не перебор ключей.
+"""
+import time
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'cars:catalog_version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Стартуем со времени, а не с нуля: после очистки кеша старые ключи не оживут
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+        return version
+
+
+def catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
@@ -0,0 +1,78 @@
+# cars/changes.py
+"""
+Журнал изменений каталога для мобильной синхронизации.
+
+Сигналы Car/CarImage (cars/signals.py) и пачечные операции (архивация и т.п.) пишут CarChange:
+upsert — машину нужно перечитать, delete — убрать у клиента. Запись делается в on_commit, чтобы
+id (курсор) раздавались примерно в порядке видимости транзакций; дополнительно лента не отдаёт
+записи моложе SETTLE — курсор клиента не перепрыгнет через запись, которая ещё не закоммичена.
+
+Клиент: GET changes/ без since -> текущий курсор, затем полный список машин; дальше
+GET changes/?since=<курсор> -> upserts (карточки активных машин) и deletes (id) до нового курсора.
+Если курсор старше хранимого журнала (prune_car_changes) — 410, нужна полная синхронизация.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import Car, CarChange
+
+SETTLE = timedelta(seconds=1)
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+RETENTION = timedelta(days=30)
+
+
+class CursorExpired(Exception):
+    """Курсор клиента старше журнала — нужна полная синхронизация."""
+
+
+def record(car_ids, op=CarChange.UPSERT):
+    """Записывает изменения после коммита текущей транзакции (или сразу вне транзакции)."""
+    car_ids = list(car_ids)
+    if car_ids:
+        transaction.on_commit(
+            lambda: CarChange.objects.bulk_create([CarChange(car_id=car_id, op=op) for car_id in car_ids])
+        )
+
+
+def head():
+    """Курсор, с которого клиент начинает после полной загрузки каталога."""
+    return CarChange.objects.filter(created_at__lt=timezone.now() - SETTLE).aggregate(head=Max('id'))['head'] or 0
+
+
+def changes_since(since, limit=DEFAULT_LIMIT):
+    """
+    (cursor, has_more, upsert_ids, delete_ids) — изменения после since, не больше limit записей журнала.
+    Несколько записей об одной машине схлопываются в последнюю.
+    """
+    oldest = CarChange.objects.aggregate(oldest=Min('id'))['oldest']
+    # Курсор должен упираться в журнал: иначе часть записей после него уже удалена очисткой
+    if oldest is not None and since < oldest - 1:
+        raise CursorExpired
+    rows = list(
+        CarChange.objects.filter(id__gt=since, created_at__lt=timezone.now() - SETTLE)
+        .order_by('id').values_list('id', 'car_id', 'op')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return since, False, [], []
+
+    latest = {}
+    for _, car_id, op in rows:
+        latest[car_id] = op
+    candidates = [car_id for car_id, op in latest.items() if op == CarChange.UPSERT]
+    # Снятые с продажи и удалённые после записи машины для клиента — удаление
+    active = set(Car.objects.filter(id__in=candidates, is_active=True).values_list('id', flat=True))
+    upserts = [car_id for car_id in candidates if car_id in active]
+    deletes = [car_id for car_id, op in latest.items() if car_id not in active]
+    return rows[-1][0], has_more, upserts, deletes
+
+
+def prune(older_than=RETENTION):
+    # Последнюю запись не трогаем: по ней проверяется, что курсор клиента ещё в журнале
+    newest = CarChange.objects.aggregate(newest=Max('id'))['newest'] or 0
+    return CarChange.objects.filter(created_at__lt=timezone.now() - older_than, id__lt=newest).delete()[0]
@@ -0,0 +1,172 @@
+# cars/detail.py
+"""
+Кеш карточки машины (GET cars/cars/<id>/) в два уровня.
+
+Ключ — id машины и её версия: счётчик в общем кеше (cars:car_version:<id>), который меняется при
+любом изменении машины или её фото (сигналы, cars/bulk.py, архив, перенос файлов в cars/blobs.py).
+Версия машины, а не каталога: правка одной машины не сбрасывает карточки остальных.
+
+1. LRU в памяти процесса — популярная карточка отдаётся без сериализации и без запроса к общему кешу
+   за самой карточкой; остаётся один GET версии, он и делает LRU согласованным между процессами.
+2. Общий кеш (Redis) — карточка, собранная любым воркером.
+3. Промах — single-flight: внутри процесса остальные потоки ждут первый (threading.Event), между
+   процессами карточку собирает тот, кто взял cache.add-замок; остальные до FILL_WAIT секунд
+   опрашивают общий кеш и только потом собирают сами.
+
+is_favorite зависит от пользователя и в кеш не попадает — проставляется на каждый запрос.
+Котировки рассрочки зависят от планов, поэтому в ключе есть и штамп снимка планов.
+Карточка собирается без запроса — ссылки на фото относительные, хост к ним добавляет вьюха
+(core.media.absolutize): заголовок Host не размножает копии в кеше.
+
+Версия живёт VERSION_TIMEOUT, а для несуществующей машины удаляется сразу: перебор случайных id
+не оставляет в общем кеше вечных ключей. Потерянная версия безопасна — новая всегда свежая, карточки
+под старой просто не находятся.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import installments
+from .models import Car
+
+LOCAL_SIZE = 2000
+SHARED_TIMEOUT = 3600
+VERSION_TIMEOUT = 24 * SHARED_TIMEOUT
+FILL_LOCK_TIMEOUT = 10
+FILL_WAIT = 2.0
+FILL_POLL = 0.05
+
+
+def _version_key(car_id):
+    return f'cars:car_version:{car_id}'
+
+
+def car_version(car_id):
+    key = _version_key(car_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(car_ids):
+    """Новые версии машин — после коммита, чтобы промах не успел закешировать старые данные."""
+    keys = [_version_key(car_id) for car_id in car_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), VERSION_TIMEOUT))
+
+
+class LocalLRU:
+    def __init__(self, size=LOCAL_SIZE):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SingleFlight:
+    """Один вычисляющий поток на ключ в пределах процесса; остальные ждут его результат."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event(), 'value': None, 'error': None}
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['value']
+        try:
+            call['value'] = compute()
+            return call['value']
+        except Exception as exc:
+            call['error'] = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+
+
+local = LocalLRU()
+flight = SingleFlight()
+
+
+def _fill_shared(key, build):
+    """Промах общего кеша: собирает один воркер, остальные ждут его результат."""
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, FILL_LOCK_TIMEOUT):
+        try:
+            data = build()
+            if data is not None:
+                cache.set(key, data, SHARED_TIMEOUT)
+            return data
+        finally:
+            cache.delete(lock_key)
+    deadline = time.monotonic() + FILL_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(FILL_POLL)
+        data = cache.get(key)
+        if data is not None:
+            return data
+        if cache.get(lock_key) is None:
+            break
+    return build()
+
+
+def cached_car(car_id, build):
+    """
+    Карточка машины car_id: build(car) -> данные сериализатора собирается не чаще раза на версию.
+    None — машины нет или она неактивна (в кеш не попадает).
+    """
+    plans = hashlib.sha1(repr(installments.registry.snapshot().stamp).encode()).hexdigest()[:8]
+    key = f'cars:detail:{car_id}:{car_version(car_id)}:{plans}'
+    data = local.get(key)
+    if data is not None:
+        return data
+
+    def compute():
+        data = cache.get(key)
+        if data is None:
+            data = _fill_shared(key, lambda: _build(car_id, build))
+        if data is not None:
+            local.set(key, data)
+        return data
+
+    data = flight.do(key, compute)
+    if data is None:
+        cache.delete(_version_key(car_id))
+    return data
+
+
+def _build(car_id, build):
+    car = Car.objects.filter(id=car_id, is_active=True).prefetch_related('images').first()
+    return None if car is None else dict(build(car))
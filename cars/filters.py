@@ -0,0 +1,423 @@
+# cars/filters.py
+"""
+Декларативные фильтры каталога машин.
+
+CarFilter разбирает query-параметры в нормализованную спецификацию (spec), проверяет её целиком
+до обращения к БД (ошибка -> 400) и строит queryset. Та же spec умеет проверять объект в памяти
+(matches) и даёт стабильную подпись (signature) для ключей кеша.
+
+Параметры:
+    search=<строка>                      марка или модель содержит строку
+    min_<поле>=, max_<поле>=             диапазоны: price, year, mileage, power, engine_volume
+    <поле>=a,b  или  <поле>=a&<поле>=b   множественный выбор: brand, model, car_type, fuel_type,
+                                         transmission, condition, steering, color
+    installment=true|false
+    lat=, lon=, radius=<км>              в радиусе от точки (cars/geo.py), radius по умолчанию 50
+    ordering=price|-price|year|-year|mileage|-mileage|views|-views|created_at|-created_at|distance
+                                         distance — от ближних к дальним, только вместе с lat/lon
+
+CarFilterField — тот же фильтр в теле запроса (сохранённые поиски, пачечные правки): JSON-объект
+параметров -> проверенный CarFilter хотя бы с одним условием.
+"""
+import hashlib
+import json
+import math
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.db.models.lookups import LessThanOrEqual
+from django.http import QueryDict
+from rest_framework import serializers
+
+from . import geo
+from .models import Car
+
+MAX_IN_VALUES = 20
+MAX_SEARCH_LENGTH = 100
+TRUE_VALUES = ('true', '1', 'yes', 'on')
+FALSE_VALUES = ('false', '0', 'no', 'off')
+
+
+class RangeFilter:
+    """Диапазон min_<name>/max_<name> по числовому полю."""
+
+    def __init__(self, field, cast, minimum=None, maximum=None):
+        self.field = field
+        self.cast = cast
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def params(self, name):
+        return [f'min_{name}', f'max_{name}']
+
+    def parse(self, name, params, errors):
+        bounds = {}
+        for bound in ('min', 'max'):
+            key = f'{bound}_{name}'
+            raw = params.get(key)
+            if raw in (None, ''):
+                continue
+            try:
+                value = self.cast(raw)
+            except (TypeError, ValueError, InvalidOperation):
+                errors[key] = 'Ожидается число.'
+                continue
+            # Decimal('sNaN') != ... само бросает InvalidOperation — проверяем без сравнений
+            if not (value.is_finite() if isinstance(value, Decimal) else math.isfinite(value)):
+                errors[key] = 'Ожидается число.'
+                continue
+            minimum = self.minimum() if callable(self.minimum) else self.minimum
+            maximum = self.maximum() if callable(self.maximum) else self.maximum
+            if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                errors[key] = f'Допустимый диапазон: {minimum}..{maximum}.'
+                continue
+            bounds[bound] = value
+        if 'min' in bounds and 'max' in bounds and bounds['min'] > bounds['max']:
+            errors[f'min_{name}'] = f'min_{name} больше max_{name}.'
+            return None
+        return bounds or None
+
+    def to_q(self, value):
+        lookups = {}
+        if 'min' in value:
+            lookups[f'{self.field}__gte'] = value['min']
+        if 'max' in value:
+            lookups[f'{self.field}__lte'] = value['max']
+        return Q(**lookups)
+
+    def matches(self, obj, value):
+        attr = getattr(obj, self.field)
+        if attr is None:
+            return False
+        attr = self.cast(attr)
+        return ('min' not in value or attr >= value['min']) and ('max' not in value or attr <= value['max'])
+
+    def dump(self, value):
+        return {k: format(v.normalize(), 'f') if isinstance(v, Decimal) else v for k, v in value.items()}
+
+
+class InFilter:
+    """Одно или несколько значений поля: ?fuel_type=petrol,diesel."""
+
+    def __init__(self, field, choices=None, max_length=100):
+        self.field = field
+        self.choices = {key for key, _ in choices} if choices else None
+        self.max_length = max_length
+
+    def params(self, name):
+        return [name]
+
+    def parse(self, name, params, errors):
+        raw = params.getlist(name) if hasattr(params, 'getlist') else [params.get(name)]
+        values = []
+        for item in raw:
+            if item is None:
+                continue
+            values.extend(v.strip() for v in str(item).split(',') if v.strip())
+        if not values:
+            return None
+        if len(values) > MAX_IN_VALUES:
+            errors[name] = f'Не больше {MAX_IN_VALUES} значений.'
+            return None
+        if self.choices is not None:
+            invalid = [v for v in values if v not in self.choices]
+            if invalid:
+                errors[name] = f'Недопустимые значения: {", ".join(invalid)}. Допустимо: {", ".join(sorted(self.choices))}.'
+                return None
+        elif any(len(v) > self.max_length for v in values):
+            errors[name] = f'Значение длиннее {self.max_length} символов.'
+            return None
+        return sorted(set(values))
+
+    def to_q(self, value):
+        if len(value) == 1:
+            return Q(**{self.field: value[0]})
+        return Q(**{f'{self.field}__in': value})
+
+    def matches(self, obj, value):
+        return getattr(obj, self.field) in value
+
+    def dump(self, value):
+        return value
+
+
+class BooleanFilter:
+    def __init__(self, field):
+        self.field = field
+
+    def params(self, name):
+        return [name]
+
+    def parse(self, name, params, errors):
+        raw = params.get(name)
+        if raw in (None, ''):
+            return None
+        raw = str(raw).lower()
+        if raw in TRUE_VALUES:
+            return True
+        if raw in FALSE_VALUES:
+            return False
+        errors[name] = 'Ожидается true или false.'
+        return None
+
+    def to_q(self, value):
+        return Q(**{self.field: value})
+
+    def matches(self, obj, value):
+        return getattr(obj, self.field) == value
+
+    def dump(self, value):
+        return value
+
+
+class SearchFilter:
+    """Подстрока в марке или модели."""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def params(self, name):
+        return [name]
+
+    def parse(self, name, params, errors):
+        raw = (params.get(name) or '').strip()
+        if not raw:
+            return None
+        if len(raw) > MAX_SEARCH_LENGTH:
+            errors[name] = f'Не длиннее {MAX_SEARCH_LENGTH} символов.'
+            return None
+        return raw
+
+    def to_q(self, value):
+        q = Q()
+        for field in self.fields:
+            q |= Q(**{f'{field}__icontains': value})
+        return q
+
+    def matches(self, obj, value):
+        needle = value.casefold()
+        return any(needle in (getattr(obj, field) or '').casefold() for field in self.fields)
+
+    def dump(self, value):
+        return value
+
+
+class NearFilter:
+    """Машины в радиусе от точки: ?lat=&lon=&radius=."""
+    fields = ['latitude', 'longitude']
+
+    def __init__(self, default_radius=50, max_radius=500):
+        self.default_radius = default_radius
+        self.max_radius = max_radius
+
+    def params(self, name):
+        return ['lat', 'lon', 'radius']
+
+    def parse(self, name, params, errors):
+        raw = {key: params.get(key) for key in self.params(name)}
+        if all(value in (None, '') for value in raw.values()):
+            return None
+        value = {}
+        for key, limit in (('lat', 90), ('lon', 180), ('radius', self.max_radius)):
+            if raw[key] in (None, ''):
+                if key == 'radius':
+                    value[key] = float(self.default_radius)
+                    continue
+                errors[key] = 'Нужны оба параметра: lat и lon.'
+                continue
+            try:
+                number = float(raw[key])
+            except (TypeError, ValueError):
+                errors[key] = 'Ожидается число.'
+                continue
+            low = 0 if key == 'radius' else -limit
+            if not low <= number <= limit or number != number or (key == 'radius' and number == 0):
+                errors[key] = f'Допустимый диапазон: {low}..{limit}.'
+                continue
+            value[key] = number
+        return value if len(value) == 3 else None
+
+    def to_q(self, value):
+        lat, lon, radius = value['lat'], value['lon'], value['radius']
+        cells = [
+            Car.objects.order_by().filter(geohash__gte=start, **({'geohash__lt': end} if end else {})).values('id')
+            for start, end in geo.cover(lat, lon, radius)
+        ]
+        candidates = cells[0].union(*cells[1:], all=True) if len(cells) > 1 else cells[0]
+        distance_sq = geo.distance_sq_expression(lat, lon)
+        return Q(id__in=candidates) & geo.box_q(lat, lon, radius) & Q(LessThanOrEqual(distance_sq, radius ** 2))
+
+    def matches(self, obj, value):
+        if obj.latitude is None or obj.longitude is None:
+            return False
+        return geo.distance_km(value['lat'], value['lon'], obj.latitude, obj.longitude) <= value['radius']
+
+    def dump(self, value):
+        return value
+
+
+def _max_year():
+    return date.today().year + 1
+
+
+class CarFilter:
+    """Фильтры и сортировка каталога. Невалидный ввод — serializers.ValidationError (HTTP 400)."""
+
+    filters = {
+        'search': SearchFilter(['brand', 'model']),
+        'price': RangeFilter('price', Decimal, minimum=0, maximum=Decimal('9999999999.99')),
+        'year': RangeFilter('year', int, minimum=1900, maximum=_max_year),
+        'mileage': RangeFilter('mileage', int, minimum=0, maximum=10_000_000),
+        'power': RangeFilter('power', int, minimum=0, maximum=5000),
+        'engine_volume': RangeFilter('engine_volume', float, minimum=0, maximum=20),
+        'brand': InFilter('brand'),
+        'model': InFilter('model'),
+        'car_type': InFilter('car_type', Car.CAR_TYPES),
+        'fuel_type': InFilter('fuel_type', Car.FUEL_TYPES),
+        'transmission': InFilter('transmission', Car.TRANSMISSION_TYPES),
+        'condition': InFilter('condition', Car.CONDITION_TYPES),
+        'steering': InFilter('steering', Car.STEERING_TYPES),
+        'color': InFilter('color', max_length=50),
+        'installment': BooleanFilter('installment'),
+        'near': NearFilter(),
+    }
+
+    # Каждой сортировке — tie-breaker по id, чтобы страницы не «плавали»
+    orderings = {
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'year': ('year', 'id'),
+        '-year': ('-year', '-id'),
+        'mileage': ('mileage', 'id'),
+        '-mileage': ('-mileage', '-id'),
+        'views': ('views', 'id'),
+        '-views': ('-views', '-id'),
+        'created_at': ('created_at', 'id'),
+        '-created_at': ('-created_at', '-id'),
+        'distance': ('distance_sq', 'id'),
+    }
+    default_ordering = '-created_at'
+
+    def __init__(self, params, default_ordering=None):
+        self.errors = {}
+        self.spec = {}
+        for name, flt in self.filters.items():
+            value = flt.parse(name, params, self.errors)
+            if value is not None:
+                self.spec[name] = value
+
+        self.ordering = params.get('ordering') or default_ordering or self.default_ordering
+        if self.ordering not in self.orderings:
+            self.errors['ordering'] = f'Допустимо: {", ".join(self.orderings)}.'
+        elif self.ordering == 'distance' and 'near' not in self.spec:
+            self.errors['ordering'] = 'Сортировка distance — только вместе с lat и lon.'
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Обратная операция к dump(): восстановить фильтр из сохранённой спецификации."""
+        params = {}
+        for name, value in (spec or {}).items():
+            if name == 'ordering':
+                params['ordering'] = value
+                continue
+            flt = cls.filters.get(name)
+            if isinstance(flt, RangeFilter):
+                for bound, v in value.items():
+                    params[f'{bound}_{name}'] = v
+            elif isinstance(flt, InFilter):
+                params[name] = ','.join(value)
+            elif isinstance(flt, NearFilter):
+                params.update(value)
+            elif flt is not None:
+                params[name] = str(value).lower() if isinstance(value, bool) else value
+        return cls(params)
+
+    @classmethod
+    def from_query(cls, data):
+        """Фильтр из JSON-объекта с ключами query-параметров (значение — скаляр или список)."""
+        params = QueryDict(mutable=True)
+        for key, item in data.items():
+            params.setlist(key, [str(v) for v in item] if isinstance(item, list) else [str(item)])
+        return cls(params)
+
+    def is_valid(self, raise_exception=False):
+        if self.errors and raise_exception:
+            raise serializers.ValidationError(self.errors)
+        return not self.errors
+
+    def get_q(self):
+        q = Q()
+        for name, value in self.spec.items():
+            q &= self.filters[name].to_q(value)
+        return q
+
+    def filter_queryset(self, queryset, order=True):
+        self.is_valid(raise_exception=True)
+        queryset = queryset.filter(self.get_q())
+        if 'near' in self.spec:
+            near = self.spec['near']
+            queryset = queryset.annotate(distance_sq=geo.distance_sq_expression(near['lat'], near['lon']))
+        if order:
+            queryset = queryset.order_by(*self.orderings[self.ordering])
+        return queryset
+
+    def matches(self, obj):
+        """Проверка объекта Car в памяти — без запроса к БД."""
+        return all(self.filters[name].matches(obj, value) for name, value in self.spec.items())
+
+    def dump(self):
+        """JSON-совместимая спецификация (для хранения и подписи)."""
+        return {name: self.filters[name].dump(value) for name, value in sorted(self.spec.items())}
+
+    def signature(self, with_ordering=False):
+        payload = self.dump()
+        if with_ordering:
+            payload['ordering'] = self.ordering
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    @classmethod
+    def openapi_parameters(cls):
+        """Описание параметров для swagger_auto_schema."""
+        from core.openapi import openapi
+
+        parameters = []
+        for name, flt in cls.filters.items():
+            if isinstance(flt, RangeFilter):
+                parameters += [openapi.Parameter(p, openapi.IN_QUERY, type=openapi.TYPE_NUMBER)
+                               for p in flt.params(name)]
+            elif isinstance(flt, BooleanFilter):
+                parameters.append(openapi.Parameter(name, openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN))
+            elif isinstance(flt, NearFilter):
+                parameters += [
+                    openapi.Parameter('lat', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+                    openapi.Parameter('lon', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+                    openapi.Parameter('radius', openapi.IN_QUERY, type=openapi.TYPE_NUMBER,
+                                      description=f'км, по умолчанию {flt.default_radius}, не больше {flt.max_radius}'),
+                ]
+            else:
+                description = f'Через запятую: {", ".join(sorted(flt.choices))}' \
+                    if isinstance(flt, InFilter) and flt.choices else None
+                parameters.append(openapi.Parameter(name, openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                                    description=description))
+        parameters.append(openapi.Parameter('ordering', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                            enum=list(cls.orderings)))
+        return parameters
+
+
+class CarFilterField(serializers.DictField):
+    """Параметры фильтра каталога в JSON -> CarFilter. ordering не учитывается, пустой фильтр — ошибка."""
+    default_error_messages = {'empty': 'Нужен хотя бы один фильтр.'}
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('help_text', 'Параметры фильтра каталога, как в GET /cars/cars/')
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        data = super().to_internal_value(data)
+        car_filter = CarFilter.from_query({key: item for key, item in data.items() if key != 'ordering'})
+        car_filter.is_valid(raise_exception=True)
+        if not car_filter.spec:
+            self.fail('empty')
+        return car_filter
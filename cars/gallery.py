@@ -0,0 +1,43 @@
+# cars/gallery.py
+"""
+Сводка галереи на самой машине: Car.cover_thumbnail и Car.images_count.
+
+Карточке списка нужны одно превью и число фото, поэтому список (CarCardSerializer) читает только
+строки Car — без JOIN и prefetch по CarImage. Поля пересчитывает refresh() в той же транзакции,
+что меняет фото: AdminCarViewSet, админка Django, восстановление из архива, перенос файлов
+(cars/blobs.py). seed_catalog заполняет их сам при вставке.
+
+Обложка — главное фото (Car.image), без него — первое фото галереи; хранится имя превью
+(core.media.rendition_name) относительно MEDIA_URL, файл превью создаётся при первом запросе.
+"""
+from core.media import RENDITION_WIDTHS, rendition_name
+
+from .models import Car, CarImage
+
+COVER_WIDTH = RENDITION_WIDTHS[0]
+
+
+def cover_for(main_name, gallery_names):
+    name = main_name or (gallery_names[0] if gallery_names else '')
+    return rendition_name(name, COVER_WIDTH) if name else ''
+
+
+def refresh(car_ids):
+    """Пересчитывает обложку и число фото у машин car_ids: два SELECT и UPDATE только изменившихся."""
+    car_ids = list(car_ids)
+    if not car_ids:
+        return 0
+    gallery = {}
+    for car_id, name in CarImage.objects.filter(car_id__in=car_ids).order_by('car_id', 'id').values_list(
+            'car_id', 'image'):
+        gallery.setdefault(car_id, []).append(name)
+    changed = []
+    for car in Car.objects.filter(id__in=car_ids).only('id', 'image', 'cover_thumbnail', 'images_count'):
+        names = gallery.get(car.id, [])
+        cover = cover_for(car.image.name, names)
+        if (car.cover_thumbnail, car.images_count) != (cover, len(names)):
+            car.cover_thumbnail, car.images_count = cover, len(names)
+            changed.append(car)
+    # bulk_update — без сигналов Car: версию каталога и карточки сбрасывают изменения самих фото
+    Car.objects.bulk_update(changed, ['cover_thumbnail', 'images_count'], batch_size=500)
+    return len(changed)
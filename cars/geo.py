@@ -0,0 +1,145 @@
+# cars/geo.py
+"""
+Поиск машин по расстоянию без PostGIS: geohash в обычном индексе (SQLite и PostgreSQL).
+
+Car.geohash — geohash точки (PRECISION символов), пишется в Car.save() и в пачечных загрузках.
+Все точки ячейки geohash имеют общий префикс, поэтому ячейка — это диапазон строк
+[prefix, следующий префикс) и читается из B-tree индекса без вычислений над строками.
+
+Запрос «в радиусе r от точки» (cover):
+  1. берётся самая мелкая длина префикса, при которой прямоугольник вокруг круга накрывается
+     не больше чем MAX_CELLS ячейками; соседние по порядку строк ячейки склеиваются в один диапазон;
+  2. крупнее сетка — больше лишних кандидатов, мельче — больше диапазонов в запросе;
+  3. кандидаты — UNION ALL диапазонных выборок id (CarFilter, NearFilter): OR диапазонов по одной
+     колонке SQLite индексом не читает, объединение подзапросов — читает на обеих БД;
+  4. поверх — ограничивающий прямоугольник по latitude/longitude, расстояние считается только для
+     оставшихся кандидатов.
+
+Расстояние — равнопромежуточная проекция с масштабом долготы по средней широте: на радиусах до 500 км
+(вне приполярных широт) расходится с haversine меньше чем на 1%, зато в SQL считается без тригонометрии.
+"""
+import math
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import Abs, Least
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+MAX_CELLS = 24
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(высота, ширина) ячейки в градусах."""
+    bits = precision * 5
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def _successor(prefix):
+    """Следующий префикс той же длины — верхняя граница диапазона ячейки (None — конец алфавита)."""
+    for i in range(len(prefix) - 1, -1, -1):
+        index = BASE32.index(prefix[i])
+        if index < len(BASE32) - 1:
+            return prefix[:i] + BASE32[index + 1]
+    return None
+
+
+def degree_box(latitude, longitude, radius_km):
+    """Половины сторон прямоугольника вокруг круга, в градусах."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(abs(latitude) + dlat, 89.9)))
+    return dlat, min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+
+def cover(latitude, longitude, radius_km):
+    """Диапазоны geohash [(start, end|None), ...], покрывающие круг."""
+    dlat, dlon = degree_box(latitude, longitude, radius_km)
+    south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    # Самая мелкая сетка, которой прямоугольник круга накрывается не больше чем MAX_CELLS ячейками
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor((north + 90) / height) - math.floor((south + 90) / height) + 1
+        columns = min(math.floor((longitude + dlon + 180) / width) - math.floor((longitude - dlon + 180) / width) + 1,
+                      round(360 / width))
+        if rows * columns <= MAX_CELLS:
+            break
+    cells = set()
+    for row in range(rows):
+        lat = min(south + row * height, north)
+        for column in range(columns):
+            lon = (longitude - dlon + column * width + 180) % 360 - 180
+            cells.add(encode(lat, lon, precision))
+        cells.add(encode(lat, (longitude + dlon + 180) % 360 - 180, precision))
+    for lon in (longitude - dlon, longitude + dlon):
+        cells.add(encode(north, (lon + 180) % 360 - 180, precision))
+    ranges = []
+    for cell in sorted(cells):
+        end = _successor(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((cell, end))
+    return ranges
+
+
+def box_q(latitude, longitude, radius_km):
+    """Ограничивающий прямоугольник круга по latitude/longitude (с переходом через 180-й меридиан)."""
+    dlat, dlon = degree_box(latitude, longitude, radius_km)
+    box = Q(latitude__gte=latitude - dlat, latitude__lte=latitude + dlat)
+    if dlon < 180:
+        west, east = longitude - dlon, longitude + dlon
+        if west < -180:
+            box &= Q(longitude__gte=west + 360) | Q(longitude__lte=east)
+        elif east > 180:
+            box &= Q(longitude__gte=west) | Q(longitude__lte=east - 360)
+        else:
+            box &= Q(longitude__gte=west, longitude__lte=east)
+    return box
+
+
+def _lon_delta(delta):
+    """Разница долгот с учётом перехода через 180-й меридиан."""
+    return min(abs(delta), 360 - abs(delta))
+
+
+def distance_sq_expression(latitude, longitude):
+    """
+    Квадрат расстояния до точки в км² как выражение БД — для отсечки по радиусу и сортировки.
+    Только арифметика: тригонометрия Django на SQLite — функции на Python, по вызову на строку;
+    косинус средней широты берётся рядом Тейлора вокруг широты точки.
+    """
+    base = math.radians(latitude)
+    half = (F('latitude') - Value(latitude)) * Value(math.radians(1) / 2)
+    scale = Value(math.cos(base)) - half * Value(math.sin(base)) - half * half * Value(math.cos(base) / 2)
+    dlon = Abs(F('longitude') - Value(longitude))
+    dy = (F('latitude') - Value(latitude)) * Value(KM_PER_DEGREE)
+    dx = Least(dlon, Value(360.0) - dlon) * scale * Value(KM_PER_DEGREE)
+    return ExpressionWrapper(dy * dy + dx * dx, output_field=FloatField())
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Расстояние в км по той же формуле, что distance_sq_expression (в SQL — приближение косинуса)."""
+    dy = (lat2 - lat1) * KM_PER_DEGREE
+    dx = _lon_delta(lon2 - lon1) * KM_PER_DEGREE * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(dx, dy)
@@ -0,0 +1,126 @@
+# cars/installments.py
+"""
+Платежи по рассрочке для карточек машин.
+
+Снимок активных InstallmentPlan живёт в памяти процесса (как баннеры в cars/ads.py): штамп
+(max(updated_at), count) проверяется не чаще раза в PLAN_CHECK_INTERVAL секунд, изменения через ORM
+сбрасывают его сразу. Платёж зависит только от цены и набора планов, поэтому снимок кеширует
+готовые котировки по цене: новая версия планов — новый снимок и пустой кеш.
+
+Для страницы списка (CarListSerializer) недостающие цены считаются одним проходом numpy:
+матрица цены × планы по формуле аннуитета.
+"""
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Count, Max
+
+from .models import InstallmentPlan
+
+PLAN_CHECK_INTERVAL = 2.0
+QUOTE_CACHE_SIZE = 50_000
+
+
+def monthly_payments(prices, months, annual_rates, down_payments):
+    """
+    Ежемесячный платёж, матрица len(prices) × len(months).
+    Ставки и первый взнос — в процентах; при нулевой ставке платёж — просто сумма / срок.
+    """
+    prices = np.asarray(prices, dtype=np.float64)[:, None]
+    months = np.asarray(months, dtype=np.float64)[None, :]
+    rate = np.asarray(annual_rates, dtype=np.float64)[None, :] / 1200
+    financed = prices * (1 - np.asarray(down_payments, dtype=np.float64)[None, :] / 100)
+    # Для r = 0 знаменатель 0 — подставляем 1, значение всё равно берётся из другой ветки
+    safe_rate = np.where(rate > 0, rate, 1.0)
+    annuity = financed * safe_rate / (1 - (1 + safe_rate) ** -months)
+    return np.where(rate > 0, annuity, financed / months)
+
+
+class PlanSnapshot:
+    def __init__(self, stamp, plans):
+        self.stamp = stamp
+        self.plans = plans
+        self.months = [plan.months for plan in plans]
+        self._quotes = {}
+        self._lock = threading.Lock()
+
+    def quotes(self, prices):
+        """Котировки для списка цен (по порядку): [[{plan, months, down_payment, monthly_payment}, ...], ...]."""
+        if not self.plans:
+            return [[] for _ in prices]
+        # Только локальный словарь: общий кеш может очистить переполнение — своё или другого потока
+        found = {}
+        for price in prices:
+            quote = self._quotes.get(price)
+            if quote is not None:
+                found[price] = quote
+        missing = sorted({price for price in prices if price not in found})
+        if missing:
+            table = monthly_payments(
+                [float(price) for price in missing], self.months,
+                [float(plan.annual_rate) for plan in self.plans], [float(plan.down_payment) for plan in self.plans],
+            )
+            computed = {}
+            for price, row in zip(missing, table):
+                computed[price] = [{
+                    'plan': plan.id,
+                    'months': plan.months,
+                    'down_payment': f'{Decimal(price) * plan.down_payment / 100:.2f}',
+                    'monthly_payment': f'{payment:.2f}',
+                } for plan, payment in zip(self.plans, row)]
+            with self._lock:
+                if len(self._quotes) + len(computed) > QUOTE_CACHE_SIZE:
+                    self._quotes.clear()
+                self._quotes.update(computed)
+            found.update(computed)
+        return [found[price] for price in prices]
+
+
+def _stamp():
+    row = InstallmentPlan.objects.aggregate(updated=Max('updated_at'), total=Count('id'))
+    return row['updated'], row['total']
+
+
+class PlanRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def snapshot(self):
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < PLAN_CHECK_INTERVAL:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < PLAN_CHECK_INTERVAL:
+                return self._snapshot
+            stamp = _stamp()
+            if self._snapshot is None or self._snapshot.stamp != stamp:
+                self._snapshot = PlanSnapshot(stamp, list(InstallmentPlan.objects.filter(is_active=True)))
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+
+registry = PlanRegistry()
+
+
+def attach_quotes(cars):
+    """Считает котировки для всей страницы разом и кладёт в car._installment_quotes."""
+    cars = [car for car in cars if car.installment and '_installment_quotes' not in car.__dict__]
+    if cars:
+        for car, quotes in zip(cars, registry.snapshot().quotes([car.price for car in cars])):
+            car._installment_quotes = quotes
+
+
+def quotes_for(car):
+    if not car.installment:
+        return []
+    if '_installment_quotes' not in car.__dict__:
+        attach_quotes([car])
+    return car._installment_quotes
@@ -0,0 +1,22 @@
+# cars/management/commands/archive_cars.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from cars import archive
+
+
+class Command(BaseCommand):
+    help = 'Переносит давно неактивные машины (с фото и избранным) в архив ArchivedCar пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=archive.ARCHIVE_AFTER.days,
+                            help='Сколько дней машина должна быть неактивной и не меняться')
+        parser.add_argument('--batch-size', type=int, default=archive.ARCHIVE_BATCH)
+        parser.add_argument('--limit', type=int, default=None, help='Не больше N машин за запуск')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        archived = archive.archive_inactive(timedelta(days=options['days']), options['batch_size'], options['limit'])
+        self.stdout.write(f'В архив перенесено: {archived} за {time.perf_counter() - started:.1f} с')
@@ -0,0 +1,116 @@
+# cars/management/commands/bench.py
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.models import User
+from cars import benchmarks
+from cars.models import Car, CarImage
+from favorites.models import Favorite
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест API: сценарии browse, search, favorite_toggle, login, admin_upload. '
+        'Результаты (rps, перцентили задержки) сохраняются в JSON для сравнения между коммитами. '
+        'Данные: manage.py seed_catalog. Пример: manage.py bench -s browse -s search -n 500 -c 4 '
+        '--compare bench_results/old.json'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-s', '--scenario', action='append', dest='scenarios',
+                            help='Сценарий (можно несколько раз). По умолчанию — все')
+        parser.add_argument('-n', '--requests', type=int, default=200, help='Итераций на сценарий')
+        parser.add_argument('-c', '--concurrency', type=int, default=1, help='Число потоков')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--base-url', help='Адрес запущенного сервера; без него — in-process клиент')
+        parser.add_argument('--out', help='Файл отчёта (по умолчанию bench_results/<время>-<коммит>.json)')
+        parser.add_argument('--compare', help='Отчёт предыдущего прогона для сравнения')
+        parser.add_argument('--list', action='store_true', help='Показать доступные сценарии')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name, spec in benchmarks.SCENARIOS.items():
+                self.stdout.write(f'{name:20} {spec["doc"]}')
+            return
+
+        names = options['scenarios'] or list(benchmarks.SCENARIOS)
+        unknown = set(names) - set(benchmarks.SCENARIOS)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+
+        if options['base_url']:
+            transport = benchmarks.HttpTransport(options['base_url'])
+        else:
+            transport = benchmarks.InProcessTransport()
+        ctx = benchmarks.BenchContext(transport, seed=options['seed'])
+
+        revision = git_revision()
+        report = {
+            'meta': {
+                'git_revision': revision,
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'transport': options['base_url'] or 'in-process',
+                'rows': {
+                    'users': User.objects.count(),
+                    'cars': Car.objects.count(),
+                    'car_images': CarImage.objects.count(),
+                    'favorites': Favorite.objects.count(),
+                },
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+            },
+            'scenarios': {},
+        }
+
+        for name in names:
+            self.stdout.write(f'▶ {name} ...')
+            try:
+                result = benchmarks.run_scenario(
+                    name, ctx, requests=options['requests'],
+                    concurrency=options['concurrency'], warmup=options['warmup'],
+                )
+            except RuntimeError as exc:
+                raise CommandError(f'{name}: {exc}')
+            report['scenarios'][name] = result
+            latency = result.get('latency_ms') or {}
+            self.stdout.write(
+                f'  {result.get("throughput_rps")} rps, p50 {latency.get("p50")} ms, '
+                f'p95 {latency.get("p95")} ms, p99 {latency.get("p99")} ms, ошибок {result.get("errors")}'
+            )
+
+        out = options['out'] or os.path.join(
+            settings.BASE_DIR, 'bench_results',
+            f'{datetime.now():%Y%m%d-%H%M%S}-{revision or "nogit"}.json',
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Отчёт: {out}'))
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.stdout.write(f'Сравнение с {baseline["meta"].get("git_revision")}:')
+            for name, metric, old, new, delta in benchmarks.compare(report, baseline):
+                self.stdout.write(f'  {name:20} {metric:4} {old:>10} → {new:>10} ({delta:+.1f}%)')
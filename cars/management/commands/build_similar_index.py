@@ -0,0 +1,29 @@
+# cars/management/commands/build_similar_index.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars import similar
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит индекс похожих машин (NumPy, .npy в SIMILAR_INDEX_DIR). '
+        'С --incremental пересчитывает только изменившиеся с прошлой сборки машины — для cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('-k', type=int, default=similar.DEFAULT_K, help='Соседей на машину')
+        parser.add_argument('--window', type=int, default=similar.PRICE_WINDOW,
+                            help='Окно кандидатов по цене при полной сборке')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['incremental']:
+            path, stats = similar.build_incremental(k=options['k'], window=options['window'])
+        else:
+            path, stats = similar.build_full(k=options['k'], window=options['window'])
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{key}={value}' for key, value in stats.items())
+        self.stdout.write(self.style.SUCCESS(f'Индекс: {path} ({summary}) за {elapsed:.1f} с'))
@@ -0,0 +1,37 @@
+# cars/management/commands/gc_media.py
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from cars import blobs
+
+
+class Command(BaseCommand):
+    help = 'Удаляет медиафайлы машин, на которые больше нет ссылок (пачками, с grace-периодом).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=blobs.DEFAULT_GRACE.total_seconds() / 3600)
+        parser.add_argument('--batch-size', type=int, default=blobs.GC_BATCH)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--reconcile', action='store_true', help='Сначала пересчитать refcount по БД')
+        parser.add_argument('--orphans', action='store_true', help='Также удалить файлы без записи MediaBlob')
+
+    def handle(self, *args, **options):
+        grace = timedelta(hours=options['grace_hours'])
+        if options['reconcile']:
+            created, fixed = blobs.reconcile(options['batch_size'])
+            self.stdout.write(f'reconcile: новых записей {created}, исправлено счётчиков {fixed}')
+
+        removed, freed = blobs.collect_garbage(grace, options['batch_size'], options['dry_run'])
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(f'{prefix}Удалено файлов без ссылок: {removed}, освобождено {freed / 2**20:.1f} МБ')
+
+        if options['orphans']:
+            count = size = 0
+            for name, file_size in blobs.orphan_files(grace):
+                if not options['dry_run']:
+                    for path in [name] + blobs.derived_names(name):
+                        default_storage.delete(path)
+                count, size = count + 1, size + file_size
+            self.stdout.write(f'{prefix}Удалено файлов-сирот: {count}, освобождено {size / 2**20:.1f} МБ')
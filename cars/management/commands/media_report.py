@@ -0,0 +1,33 @@
+# cars/management/commands/media_report.py
+from django.core.management.base import BaseCommand
+
+from cars import blobs
+
+
+def mb(value):
+    return f'{value / 2**20:.1f} МБ'
+
+
+class Command(BaseCommand):
+    help = 'Отчёт об экономии места от дедупликации фото машин.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help='Перенести старые файлы под хеш-имена, слив дубликаты')
+        parser.add_argument('--reconcile', action='store_true', help='Пересчитать refcount по БД')
+
+    def handle(self, *args, **options):
+        if options['adopt_legacy']:
+            moved, freed = blobs.adopt_legacy()
+            self.stdout.write(f'Перенесено под хеш-имена: {moved} файлов, освобождено {mb(freed)}')
+        if options['reconcile']:
+            blobs.reconcile()
+
+        report = blobs.savings_report()
+        saved_pct = 100 * report['saved_bytes'] / report['logical_bytes'] if report['logical_bytes'] else 0
+        self.stdout.write(
+            f"Ссылок на фото: {report['references']}, уникальных файлов: {report['blobs']}\n"
+            f"Без дедупликации: {mb(report['logical_bytes'])}, на диске: {mb(report['physical_bytes'])}\n"
+            f"Сэкономлено: {mb(report['saved_bytes'])} ({saved_pct:.1f}%)\n"
+            f"Без ссылок (ждут gc_media): {report['unreferenced_blobs']} файлов, {mb(report['unreferenced_bytes'])}"
+        )
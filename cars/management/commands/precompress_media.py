@@ -0,0 +1,38 @@
+# cars/management/commands/precompress_media.py
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.media import COMPRESSIBLE_EXTENSIONS, RENDITION_WIDTHS, make_rendition, precompress
+from cars.models import Car, CarImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Дописывает .gz/.br к текстовым файлам в MEDIA_ROOT и (с --renditions) заранее '
+        'строит превью фото машин, чтобы первый запрос не ждал ресайза.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renditions', action='store_true')
+
+    def handle(self, *args, **options):
+        compressed = 0
+        for root, _, files in os.walk(settings.MEDIA_ROOT):
+            for filename in files:
+                if os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                    compressed += len(precompress(os.path.join(root, filename)))
+        self.stdout.write(f'Сжатых версий: {compressed}')
+
+        if options['renditions']:
+            names = set(CarImage.objects.values_list('image', flat=True).distinct())
+            names |= set(Car.objects.exclude(image='').exclude(image=None).values_list('image', flat=True).distinct())
+            made = 0
+            for name in names:
+                for width in RENDITION_WIDTHS:
+                    try:
+                        made += bool(make_rendition(name, width))
+                    except OSError as exc:
+                        self.stderr.write(f'{name}: {exc}')
+            self.stdout.write(f'Превью: {made}')
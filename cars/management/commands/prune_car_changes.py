@@ -0,0 +1,17 @@
+# cars/management/commands/prune_car_changes.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from cars import changes
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые записи журнала изменений каталога (клиенты со старым курсором получат 410).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=changes.RETENTION.days)
+
+    def handle(self, *args, **options):
+        removed = changes.prune(timedelta(days=options['days']))
+        self.stdout.write(f'Удалено записей журнала: {removed}')
@@ -0,0 +1,23 @@
+# cars/management/commands/refresh_market_stats.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars import market
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику цен по группам, где что-то поменялось (запускать по cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересчитать все группы за один проход')
+        parser.add_argument('--batch-size', type=int, default=market.REFRESH_BATCH)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['full']:
+            summary = f'групп: {market.rebuild()}'
+        else:
+            refreshed, removed = market.refresh(options['batch_size'])
+            summary = f'пересчитано групп: {refreshed}, удалено пустых: {removed}'
+        self.stdout.write(self.style.SUCCESS(f'Готово: {summary} за {time.perf_counter() - started:.1f} с'))
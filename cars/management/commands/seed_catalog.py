@@ -0,0 +1,226 @@
+# cars/management/commands/seed_catalog.py
+import io
+import itertools
+import os
+import random
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from api.models import User
+from cars import blobs, gallery, market
+from cars.models import Car, CarImage
+from favorites.models import Favorite
+
+
+SEED_EMAIL_DOMAIN = 'bench.local'
+SEED_PASSWORD = 'BenchPass123!'
+SEED_ADMIN_EMAIL = f'admin@{SEED_EMAIL_DOMAIN}'
+
+# Марка -> (модели, базовая цена нового авто)
+CATALOG = {
+    'Toyota': (['Camry', 'Corolla', 'RAV4', 'Land Cruiser', 'Prius'], 35000),
+    'Lexus': (['RX', 'LX', 'ES', 'NX'], 60000),
+    'Honda': (['Civic', 'Accord', 'CR-V', 'Fit'], 28000),
+    'Hyundai': (['Sonata', 'Elantra', 'Tucson', 'Santa Fe'], 26000),
+    'Kia': (['K5', 'Rio', 'Sportage', 'Sorento'], 25000),
+    'BMW': (['3 Series', '5 Series', 'X5', 'X3', 'M4'], 65000),
+    'Mercedes-Benz': (['C-Class', 'E-Class', 'S-Class', 'GLE', 'G-Class'], 75000),
+    'Audi': (['A4', 'A6', 'Q5', 'Q7'], 55000),
+    'Volkswagen': (['Passat', 'Golf', 'Tiguan', 'Polo'], 27000),
+    'Chevrolet': (['Malibu', 'Cobalt', 'Tahoe', 'Spark'], 22000),
+    'Tesla': (['Model 3', 'Model Y', 'Model S'], 50000),
+    'Lada': (['Vesta', 'Granta', 'Niva'], 12000),
+}
+# Город -> (широта, долгота, вес); машины разбросаны вокруг центра на ~10 км
+CITIES = {
+    'Бишкек': (42.8746, 74.5698, 50),
+    'Ош': (40.5140, 72.8161, 15),
+    'Джалал-Абад': (40.9333, 73.0000, 7),
+    'Каракол': (42.4907, 78.3936, 5),
+    'Токмок': (42.8421, 75.3015, 5),
+    'Кара-Балта': (42.8142, 73.8481, 5),
+    'Нарын': (41.4287, 75.9911, 3),
+    'Талас': (42.5228, 72.2427, 3),
+    'Баткен': (40.0629, 70.8194, 2),
+    'Алматы': (43.2389, 76.8897, 5),
+}
+COLORS = ['Белый', 'Черный', 'Серый', 'Серебристый', 'Синий', 'Красный', 'Зеленый']
+SEED_IMAGE_COUNT = 8
+
+
+def seed_image_names():
+    """Несколько реальных JPEG-файлов в MEDIA_ROOT, на которые ссылаются все сгенерированные записи."""
+    names = []
+    directory = os.path.join(settings.MEDIA_ROOT, 'cars', 'seed')
+    os.makedirs(directory, exist_ok=True)
+    for i in range(SEED_IMAGE_COUNT):
+        name = f'cars/seed/seed_{i}.jpg'
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.exists(path):
+            color = ((i * 53) % 256, (i * 97) % 256, (i * 151) % 256)
+            Image.new('RGB', (1280, 960), color).save(path, 'JPEG', quality=85)
+        names.append(name)
+    return names
+
+
+def make_jpeg(size=(1280, 960), seed=0):
+    """JPEG в памяти — для сценариев загрузки фото."""
+    buf = io.BytesIO()
+    Image.new('RGB', size, ((seed * 37) % 256, (seed * 71) % 256, 128)).save(buf, 'JPEG', quality=85)
+    return buf.getvalue()
+
+
+def random_car(rng, image_names, inactive_ratio=0.0):
+    brand = rng.choice(list(CATALOG))
+    models_, base_price = CATALOG[brand]
+    year = rng.randint(2000, 2025)
+    age = 2025 - year
+    condition = 'new' if age == 0 and rng.random() < 0.7 else 'used'
+    mileage = 0 if condition == 'new' else rng.randint(5000, 25000) * max(age, 1)
+    fuel_type = rng.choices(['petrol', 'diesel', 'hybrid', 'electric'], weights=[60, 20, 12, 8])[0]
+    if brand == 'Tesla':
+        fuel_type = 'electric'
+    price = base_price * (0.88 ** age) * rng.uniform(0.85, 1.15)
+    city = rng.choices(list(CITIES), weights=[weight for _, _, weight in CITIES.values()])[0]
+    latitude, longitude, _ = CITIES[city]
+    car = Car(
+        brand=brand,
+        model=rng.choice(models_),
+        year=year,
+        price=Decimal(round(price, -2)).quantize(Decimal('0.01')),
+        car_type='electric' if fuel_type == 'electric' and rng.random() < 0.5 else rng.choice(
+            ['sedan', 'suv', 'coupe', 'hatchback', 'sport']),
+        fuel_type=fuel_type,
+        engine_volume=None if fuel_type == 'electric' else rng.choice([1.4, 1.6, 2.0, 2.5, 3.0, 3.5, 4.4]),
+        power=rng.randint(90, 450),
+        transmission=rng.choice(['manual', 'automatic', 'tiptronic', 'robot']),
+        mileage=mileage,
+        condition=condition,
+        steering='right' if rng.random() < 0.1 else 'left',
+        color=rng.choice(COLORS),
+        installment=rng.random() < 0.6,
+        phone=f'+996{rng.randint(500000000, 799999999)}',
+        image=rng.choice(image_names),
+        description=f'{brand} в хорошем состоянии, один владелец.',
+        is_active=rng.random() >= inactive_ratio,
+        views=int(rng.paretovariate(1.5) * 10),
+        city=city,
+        latitude=round(latitude + rng.gauss(0, 0.06), 6),
+        longitude=round(longitude + rng.gauss(0, 0.08), 6),
+    )
+    # bulk_create не вызывает save() — geohash считаем сами
+    car.geohash = car.compute_geohash()
+    return car
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу тестовыми пользователями, машинами, фото и избранным '
+        'для бенчмарков (SQLite и PostgreSQL). Пример: manage.py seed_catalog --cars 100000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--cars', type=int, default=10000)
+        parser.add_argument('--images-per-car', type=int, default=5)
+        parser.add_argument('--favorites-per-user', type=int, default=10)
+        parser.add_argument('--inactive-ratio', type=float, default=0.1,
+                            help='Доля неактивных объявлений (0..1)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора — для воспроизводимости')
+        parser.add_argument('--flush', action='store_true',
+                            help='Удалить ранее сгенерированные данные перед заполнением')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        if options['flush']:
+            self.flush()
+
+        image_names = seed_image_names()
+        # Хешируем пароль один раз: PBKDF2 на каждого пользователя занял бы минуты
+        password_hash = make_password(SEED_PASSWORD)
+
+        with transaction.atomic():
+            User.objects.get_or_create(
+                email=SEED_ADMIN_EMAIL,
+                defaults={'password': password_hash, 'is_staff': True, 'is_superuser': True,
+                          'role': 'admin', 'first_name': 'Bench'},
+            )
+
+        start = User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}', is_staff=False).count()
+        users = [
+            User(email=f'user{start + i}@{SEED_EMAIL_DOMAIN}', first_name=f'User {start + i}',
+                 password=password_hash)
+            for i in range(options['users'])
+        ]
+        User.objects.bulk_create(users, batch_size=batch_size)
+        self.stdout.write(f'Пользователи: +{len(users)}')
+
+        created = 0
+        while created < options['cars']:
+            chunk = min(batch_size, options['cars'] - created)
+            with transaction.atomic():
+                cars = [random_car(rng, image_names, options['inactive_ratio']) for _ in range(chunk)]
+                # Галерею выбираем заранее: сводку (cars/gallery.py) пишем сразу в INSERT машины
+                galleries = [[rng.choice(image_names) for _ in range(rng.randint(0, options['images_per_car']))]
+                             for _ in cars]
+                for car, names in zip(cars, galleries):
+                    car.images_count = len(names)
+                    car.cover_thumbnail = gallery.cover_for(car.image.name, names)
+                cars = Car.objects.bulk_create(cars, batch_size=batch_size)
+                if not cars or cars[0].pk is None:
+                    # Бэкенд не вернул id (старый SQLite) — берём последние вставленные
+                    cars = list(Car.objects.order_by('-id')[:chunk])[::-1]
+                images = [CarImage(car=car, image=name) for car, names in zip(cars, galleries) for name in names]
+                CarImage.objects.bulk_create(images, batch_size=batch_size)
+            created += chunk
+            self.stdout.write(f'Машины: {created}/{options["cars"]}')
+
+        self.seed_favorites(rng, options['favorites_per_user'], batch_size)
+        # bulk_create обходит сигналы — счётчики ссылок на фото и статистику рынка пересчитываем разом
+        blobs.reconcile(batch_size)
+        market.rebuild()
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def seed_favorites(self, rng, per_user, batch_size):
+        if per_user <= 0:
+            return
+        car_ids = list(Car.objects.filter(is_active=True).values_list('id', flat=True))
+        if not car_ids:
+            return
+        user_ids = list(User.objects.filter(
+            email__endswith=f'@{SEED_EMAIL_DOMAIN}', is_staff=False, favorite__isnull=True,
+        ).values_list('id', flat=True))
+
+        batch = []
+        total = 0
+        # Популярность машин неравномерна — часть объявлений собирает большую долю избранного
+        cum_weights = list(itertools.accumulate(1.0 / (rank + 1) ** 0.8 for rank in range(len(car_ids))))
+        for user_id in user_ids:
+            picked = set(rng.choices(car_ids, cum_weights=cum_weights, k=per_user))
+            batch.extend(Favorite(user_id=user_id, car_id=car_id) for car_id in picked)
+            if len(batch) >= batch_size:
+                Favorite.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+                total += len(batch)
+                batch = []
+        if batch:
+            Favorite.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+            total += len(batch)
+        self.stdout.write(f'Избранное: +{total}')
+
+    def flush(self):
+        users = User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}')
+        Favorite.objects.filter(user__in=users).delete()
+        # Машины сидера узнаём по фото из cars/seed/
+        seeded = Car.objects.filter(image__startswith='cars/seed/')
+        CarImage.objects.filter(car__in=seeded).delete()
+        seeded.delete()
+        users.delete()
+        self.stdout.write('Старые данные удалены')
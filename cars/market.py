@@ -0,0 +1,163 @@
+# cars/market.py
+"""
+История цен и статистика рынка по группам марка/модель/корзина лет.
+
+Сигналы Car (cars/signals.py): при создании и при смене цены — строка PriceHistory; если машина
+была или стала активной в группе, группа помечается MarketStat.dirty (один UPDATE, без пересчёта).
+refresh_market_stats пересчитывает только помеченные группы: флаг снимается до чтения цен, поэтому
+изменение во время пересчёта снова пометит группу и не потеряется. rebuild — полный проход по
+каталогу (после seed_catalog и пачечных загрузок, обходящих сигналы).
+
+Эндпоинт market_stats читает готовые строки MarketStat; ответ кешируется под версией статистики,
+которая растёт после каждого пересчёта.
+"""
+import hashlib
+from decimal import Decimal
+from itertools import groupby
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+from .models import Car, MarketStat, PriceHistory
+
+YEAR_BUCKET = 3
+REFRESH_BATCH = 200
+MARKET_VERSION_KEY = 'cars:market_version'
+STATS_CACHE_TIMEOUT = 600
+MAX_NAME_LENGTH = 100  # как у Car.brand и Car.model
+_TRACKED = ('brand', 'model', 'year', 'price', 'is_active')
+PRICE_FIELDS = ('price_min', 'price_p25', 'price_median', 'price_p75', 'price_max', 'price_mean')
+
+
+def year_bucket(year):
+    return year - year % YEAR_BUCKET
+
+
+def _state(instance):
+    values = instance.__dict__
+    # Машина, загруженная через only()/defer() без нужных полей, — не отслеживаем
+    if any(field not in values for field in _TRACKED):
+        return None
+    return tuple(values[field] for field in _TRACKED)
+
+
+def _group(state):
+    brand, model, year, _, is_active = state
+    return (brand, model, year_bucket(year)) if is_active else None
+
+
+def remember(instance):
+    instance._market_state = _state(instance) if instance.pk else None
+
+
+def track(instance, created):
+    """post_save Car: история цены и пометка затронутых групп."""
+    previous = getattr(instance, '_market_state', None)
+    current = _state(instance)
+    if current is None:
+        return
+    if created or (previous is not None and Decimal(previous[3]) != Decimal(current[3])):
+        PriceHistory.objects.create(car=instance, price=instance.price)
+    if previous != current:
+        mark_dirty({_group(state) for state in (previous, current) if state is not None} - {None})
+    instance._market_state = current
+
+
+def untrack(instance):
+    """post_delete Car."""
+    state = getattr(instance, '_market_state', None) or _state(instance)
+    if state is not None and _group(state) is not None:
+        mark_dirty([_group(state)])
+
+
+def mark_dirty(groups):
+    for brand, model, year_from in groups:
+        key = {'brand': brand, 'model': model, 'year_from': year_from}
+        if not MarketStat.objects.filter(**key).update(dirty=True):
+            MarketStat.objects.bulk_create([MarketStat(**key, dirty=True)], ignore_conflicts=True)
+
+
+def _money(value):
+    return Decimal(str(round(float(value), 2)))
+
+
+def _summary(prices):
+    prices = np.asarray(prices, dtype=np.float64)
+    p25, median, p75 = np.percentile(prices, [25, 50, 75])
+    return {
+        'count': len(prices),
+        'price_min': _money(prices.min()), 'price_p25': _money(p25), 'price_median': _money(median),
+        'price_p75': _money(p75), 'price_max': _money(prices.max()), 'price_mean': _money(prices.mean()),
+    }
+
+
+def refresh(batch_size=REFRESH_BATCH):
+    """Пересчитывает помеченные группы. Возвращает (пересчитано, удалено пустых)."""
+    refreshed = removed = 0
+    while True:
+        stats = list(MarketStat.objects.filter(dirty=True).order_by('brand', 'model', 'year_from')[:batch_size])
+        if not stats:
+            break
+        MarketStat.objects.filter(id__in=[stat.id for stat in stats]).update(dirty=False)
+        # Одна выборка цен на пару марка/модель, а не на каждую корзину
+        for (brand, model), group in groupby(stats, key=lambda stat: (stat.brand, stat.model)):
+            group = list(group)
+            years = [stat.year_from for stat in group]
+            prices = {}
+            for year, price in (Car.objects.filter(is_active=True, brand=brand, model=model,
+                                                   year__gte=min(years), year__lt=max(years) + YEAR_BUCKET)
+                                .values_list('year', 'price')):
+                prices.setdefault(year_bucket(year), []).append(price)
+            now = timezone.now()
+            for stat in group:
+                if stat.year_from not in prices:
+                    # Если группу успели снова пометить — оставляем до следующего прохода
+                    removed += MarketStat.objects.filter(id=stat.id, dirty=False).delete()[0]
+                    continue
+                MarketStat.objects.filter(id=stat.id).update(refreshed_at=now, **_summary(prices[stat.year_from]))
+                refreshed += 1
+    if refreshed or removed:
+        bump_version(MARKET_VERSION_KEY)
+    return refreshed, removed
+
+
+def rebuild(batch_size=5000):
+    """Полный пересчёт за один проход по активным машинам (отсортированы по группе)."""
+    rows = (Car.objects.filter(is_active=True).order_by('brand', 'model', 'year')
+            .values_list('brand', 'model', 'year', 'price').iterator(chunk_size=batch_size))
+    now = timezone.now()
+    stats = []
+    for (brand, model, year_from), group in groupby(rows, key=lambda row: (row[0], row[1], year_bucket(row[2]))):
+        stats.append(MarketStat(brand=brand, model=model, year_from=year_from, dirty=False, refreshed_at=now,
+                                **_summary([row[3] for row in group])))
+    with transaction.atomic():
+        MarketStat.objects.all().delete()
+        MarketStat.objects.bulk_create(stats, batch_size=1000)
+    bump_version(MARKET_VERSION_KEY)
+    return len(stats)
+
+
+def market_stats(brand, model=None, year=None):
+    """Строки статистики для ответа API — из кеша под версией статистики."""
+    # Параметры приходят из запроса как есть: в ключе — хеш (memcached не принимает пробелы и > 250 байт)
+    params = hashlib.sha1(f'{brand}\0{model or ""}\0{year or ""}'.encode()).hexdigest()
+    key = f'cars:market:{get_version(MARKET_VERSION_KEY)}:{params}'
+    data = cache.get(key)
+    if data is None:
+        stats = MarketStat.objects.filter(brand=brand, count__gt=0).order_by('model', 'year_from')
+        if model:
+            stats = stats.filter(model=model)
+        if year:
+            stats = stats.filter(year_from=year_bucket(year))
+        data = [{
+            'brand': stat.brand, 'model': stat.model,
+            'year_from': stat.year_from, 'year_to': stat.year_from + YEAR_BUCKET - 1, 'count': stat.count,
+            # Цены строками, как price в карточке машины
+            **{field: str(getattr(stat, field)) for field in PRICE_FIELDS},
+            'refreshed_at': stat.refreshed_at,
+        } for stat in stats]
+        cache.set(key, data, STATS_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_alter_ad_options_alter_car_is_active_alter_car_phone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='car_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'id'], name='car_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['year', 'id'], name='car_active_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['mileage', 'id'], name='car_active_mileage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['views', 'id'], name='car_active_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['brand', 'model'], name='car_active_brand_model_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['car_type', 'price'], name='car_active_type_price_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0007_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='impressions',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Показы'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='weight',
+            field=models.PositiveIntegerField(default=1, verbose_name='Вес в ротации'),
+        ),
+    ]
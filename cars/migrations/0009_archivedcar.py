@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0008_ad_weight_impressions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCar',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('brand', models.CharField(max_length=100, verbose_name='Марка')),
+                ('model', models.CharField(max_length=100, verbose_name='Модель')),
+                ('year', models.IntegerField(verbose_name='Год выпуска')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Цена')),
+                ('phone', models.CharField(max_length=20, verbose_name='Телефон')),
+                ('created_at', models.DateTimeField()),
+                ('deactivated_at', models.DateTimeField(verbose_name='Последнее изменение до архивации')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('data', models.JSONField()),
+                ('images', models.JSONField(default=list)),
+                ('favorites', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Архивное объявление',
+                'verbose_name_plural': 'Архив объявлений',
+                'ordering': ['-archived_at', '-id'],
+                'indexes': [models.Index(fields=['brand', 'model'], name='archivedcar_brand_model_idx'), models.Index(fields=['phone'], name='archivedcar_phone_idx')],
+            },
+        ),
+    ]
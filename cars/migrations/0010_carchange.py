@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_archivedcar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('car_id', models.BigIntegerField()),
+                ('op', models.CharField(choices=[('upsert', 'Изменение'), ('delete', 'Удаление')], max_length=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Изменение каталога',
+                'verbose_name_plural': 'Журнал изменений каталога',
+            },
+        ),
+    ]
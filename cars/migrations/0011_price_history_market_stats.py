@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0010_carchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand', models.CharField(max_length=100)),
+                ('model', models.CharField(max_length=100)),
+                ('year_from', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('price_p25', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('price_median', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('price_p75', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('price_mean', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('dirty', models.BooleanField(default=True)),
+                ('refreshed_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name': 'Статистика рынка',
+                'verbose_name_plural': 'Статистика рынка',
+                'indexes': [models.Index(condition=models.Q(('dirty', True)), fields=['id'], name='marketstat_dirty_idx')],
+                'unique_together': {('brand', 'model', 'year_from')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='cars.car')),
+            ],
+            options={
+                'verbose_name': 'Изменение цены',
+                'verbose_name_plural': 'История цен',
+                'indexes': [models.Index(fields=['car', 'changed_at'], name='pricehistory_car_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:04
+
+from django.db import migrations, models
+
+
+def create_default_plans(apps, schema_editor):
+    # Прежнее поведение: 6, 9 и 12 месяцев без процентов
+    InstallmentPlan = apps.get_model('cars', 'InstallmentPlan')
+    InstallmentPlan.objects.bulk_create([
+        InstallmentPlan(name=f'Рассрочка {months} мес.', months=months) for months in (6, 9, 12)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0011_price_history_market_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstallmentPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('months', models.PositiveSmallIntegerField(verbose_name='Срок (мес.)')),
+                ('annual_rate', models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='Ставка, % годовых')),
+                ('down_payment', models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='Первый взнос, %')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активно')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'План рассрочки',
+                'verbose_name_plural': 'Планы рассрочки',
+                'ordering': ['months', 'id'],
+            },
+        ),
+        migrations.RunPython(create_default_plans, migrations.RunPython.noop),
+    ]
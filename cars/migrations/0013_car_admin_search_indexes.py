@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:13
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0012_installmentplan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(django.db.models.functions.text.Upper('brand'), name='car_brand_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(django.db.models.functions.text.Upper('model'), name='car_model_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['phone'], name='car_phone_idx'),
+        ),
+    ]
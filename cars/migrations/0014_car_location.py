@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0013_car_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='city',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Город'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['geohash'], name='car_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:07
+
+from django.db import migrations, models
+from django.db.models import Case, CharField, Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat
+
+# core.media.rendition_name(name, 320) на момент миграции
+COVER_PREFIX = 'renditions/320/'
+
+
+def fill_gallery_summary(apps, schema_editor):
+    """Один UPDATE по всей таблице: число фото и обложка считаются подзапросами в БД."""
+    Car = apps.get_model('cars', 'Car')
+    CarImage = apps.get_model('cars', 'CarImage')
+    gallery = CarImage.objects.filter(car_id=OuterRef('pk'))
+    count = gallery.order_by().values('car_id').annotate(n=Count('id')).values('n')
+    first = gallery.order_by('id').values('image')[:1]
+    Car.objects.update(
+        images_count=Coalesce(Subquery(count, output_field=IntegerField()), 0),
+        cover_thumbnail=Case(
+            When(~Q(image='') & Q(image__isnull=False), then=Concat(Value(COVER_PREFIX), F('image'), output_field=CharField())),
+            When(Exists(gallery), then=Concat(Value(COVER_PREFIX), Subquery(first), output_field=CharField())),
+            default=Value(''),
+            output_field=CharField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0014_car_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='cover_thumbnail',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Обложка (превью)'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='images_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Фото в галерее'),
+        ),
+        migrations.RunPython(fill_gallery_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0015_car_gallery_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedcar',
+            name='price_history',
+            field=models.JSONField(default=list),
+        ),
+    ]
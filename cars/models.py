@@ -1,7 +1,9 @@
 # cars/models.py
 
 from django.db import models
+from django.db.models.functions import Upper
 from api.models import User
+from . import geo
 
 
 class Car(models.Model):
@@ -55,19 +57,58 @@ class Car(models.Model):
     color = models.CharField(max_length=50, blank=True, verbose_name='Цвет')
     installment = models.BooleanField(default=True, verbose_name='Рассрочка')
     phone = models.CharField(max_length=20, verbose_name='Телефон')  # УБРАН default!
+    city = models.CharField(max_length=100, blank=True, verbose_name='Город')
+    latitude = models.FloatField(null=True, blank=True, verbose_name='Широта')
+    longitude = models.FloatField(null=True, blank=True, verbose_name='Долгота')
+    # Считается из координат в save() — индекс для поиска по радиусу (cars/geo.py)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
     image = models.ImageField(upload_to='cars/', blank=True, null=True, verbose_name='Главное фото')
+    # Сводка галереи для карточек списка — пересчитывает cars/gallery.py
+    cover_thumbnail = models.CharField(max_length=255, blank=True, editable=False, verbose_name='Обложка (превью)')
+    images_count = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Фото в галерее')
     description = models.TextField(blank=True, verbose_name='Описание')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     is_active = models.BooleanField(default=True, verbose_name='Активно')
     views = models.IntegerField(default=0, verbose_name='Просмотры')
 
     def __str__(self):
         return f"{self.brand} {self.model} ({self.year})"
 
+    def save(self, *args, **kwargs):
+        self.geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+    def compute_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return geo.encode(self.latitude, self.longitude)
+
     class Meta:
         verbose_name = 'Автомобиль'
         verbose_name_plural = 'Автомобили'
         ordering = ['-created_at']
+        # Публичные запросы всегда идут с is_active=True: частичные индексы только по активным
+        # объявлениям (SQLite не использует индекс по голому "WHERE is_active"). id в конце —
+        # tie-breaker сортировок CarFilter, чтобы ORDER BY закрывался индексом без сортировки.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='car_active_created_idx', condition=models.Q(is_active=True)),
+            models.Index(fields=['price', 'id'], name='car_active_price_idx', condition=models.Q(is_active=True)),
+            models.Index(fields=['year', 'id'], name='car_active_year_idx', condition=models.Q(is_active=True)),
+            models.Index(fields=['mileage', 'id'], name='car_active_mileage_idx', condition=models.Q(is_active=True)),
+            models.Index(fields=['views', 'id'], name='car_active_views_idx', condition=models.Q(is_active=True)),
+            models.Index(fields=['brand', 'model'], name='car_active_brand_model_idx', condition=models.Q(is_active=True)),
+            models.Index(fields=['car_type', 'price'], name='car_active_type_price_idx', condition=models.Q(is_active=True)),
+            # Поиск в админке (cars/admin.py) — по всем машинам, включая снятые: iexact даёт UPPER(...) = UPPER(...)
+            models.Index(Upper('brand'), name='car_brand_upper_idx'),
+            models.Index(Upper('model'), name='car_model_upper_idx'),
+            models.Index(fields=['phone'], name='car_phone_idx'),
+            # Поиск по радиусу: диапазоны geohash выбираются подзапросами без is_active
+            models.Index(fields=['geohash'], name='car_geohash_idx'),
+        ]
 
 
 class CarImage(models.Model):
@@ -84,8 +125,145 @@ class Ad(models.Model):
     image = models.ImageField(upload_to='ads/', null=True, blank=True, verbose_name='Изображение')
     installment_info = models.CharField(max_length=255, null=True, blank=True, verbose_name='Инфо о рассрочке')
     is_active = models.BooleanField(default=True, verbose_name='Активно')
+    weight = models.PositiveIntegerField(default=1, verbose_name='Вес в ротации')
+    # Пишется пачками из cars/ads.py через update() — updated_at не меняется, снимок не сбрасывается
+    impressions = models.PositiveBigIntegerField(default=0, verbose_name='Показы')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
+
+
+class MediaBlob(models.Model):
+    """
+    Файл в хранилище и число ссылок на него из Car.image / CarImage.image (см. cars/blobs.py).
+    Одинаковые загрузки ContentHashStorage кладёт в один файл — здесь считаем, кто им пользуется.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(null=True, blank=True, verbose_name='Последняя ссылка снята')
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+        indexes = [
+            models.Index(fields=['released_at'], name='mediablob_unreferenced_idx', condition=models.Q(refcount__lte=0)),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class ArchivedCar(models.Model):
+    """
+    Давно снятое с продажи объявление, вынесенное из cars_car (cars/archive.py). id — прежний id машины;
+    ключевые поля — колонками для поиска в админке, остальное и связанные строки — в JSON для восстановления.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    brand = models.CharField(max_length=100, verbose_name='Марка')
+    model = models.CharField(max_length=100, verbose_name='Модель')
+    year = models.IntegerField(verbose_name='Год выпуска')
+    price = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='Цена')
+    phone = models.CharField(max_length=20, verbose_name='Телефон')
+    created_at = models.DateTimeField()
+    deactivated_at = models.DateTimeField(verbose_name='Последнее изменение до архивации')
+    archived_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Все поля Car (values()), фото галереи [имя, ...], избранное [[user_id, created_at], ...],
+    # история цен [[цена, changed_at], ...]
+    data = models.JSONField()
+    images = models.JSONField(default=list)
+    favorites = models.JSONField(default=list)
+    price_history = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name = 'Архивное объявление'
+        verbose_name_plural = 'Архив объявлений'
+        ordering = ['-archived_at', '-id']
+        indexes = [
+            models.Index(fields=['brand', 'model'], name='archivedcar_brand_model_idx'),
+            models.Index(fields=['phone'], name='archivedcar_phone_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.brand} {self.model} ({self.year}), архив"
+
+
+class CarChange(models.Model):
+    """
+    Журнал изменений каталога для инкрементальной синхронизации (cars/changes.py). id — монотонный
+    курсор; car_id без FK, чтобы запись об удалении пережила саму машину.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OPS = [(UPSERT, 'Изменение'), (DELETE, 'Удаление')]
+
+    id = models.BigAutoField(primary_key=True)
+    car_id = models.BigIntegerField()
+    op = models.CharField(max_length=6, choices=OPS)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Изменение каталога'
+        verbose_name_plural = 'Журнал изменений каталога'
+
+    def __str__(self):
+        return f'#{self.id} {self.op} {self.car_id}'
+
+
+class PriceHistory(models.Model):
+    """Цена машины с момента изменения. Только добавление: пишет cars/market.py из сигналов."""
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='price_history')
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Изменение цены'
+        verbose_name_plural = 'История цен'
+        indexes = [models.Index(fields=['car', 'changed_at'], name='pricehistory_car_idx')]
+
+
+class MarketStat(models.Model):
+    """
+    Распределение цен активных машин по группе марка/модель/корзина лет (cars/market.py).
+    dirty — в группе что-то поменялось, refresh_market_stats пересчитает её.
+    """
+    brand = models.CharField(max_length=100)
+    model = models.CharField(max_length=100)
+    year_from = models.IntegerField()
+    count = models.IntegerField(default=0)
+    price_min = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    price_p25 = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    price_median = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    price_p75 = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    price_max = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    price_mean = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    dirty = models.BooleanField(default=True)
+    refreshed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = 'Статистика рынка'
+        verbose_name_plural = 'Статистика рынка'
+        unique_together = ['brand', 'model', 'year_from']
+        indexes = [models.Index(fields=['id'], name='marketstat_dirty_idx', condition=models.Q(dirty=True))]
+
+
+class InstallmentPlan(models.Model):
+    """Условия рассрочки; платежи по ним считает cars/installments.py для всех машин с installment=True."""
+    name = models.CharField(max_length=100, verbose_name='Название')
+    months = models.PositiveSmallIntegerField(verbose_name='Срок (мес.)')
+    annual_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0, verbose_name='Ставка, % годовых')
+    down_payment = models.DecimalField(max_digits=5, decimal_places=2, default=0, verbose_name='Первый взнос, %')
+    is_active = models.BooleanField(default=True, verbose_name='Активно')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'План рассрочки'
+        verbose_name_plural = 'Планы рассрочки'
+        ordering = ['months', 'id']
+
+    def __str__(self):
+        return f'{self.name} ({self.months} мес.)'
@@ -0,0 +1,155 @@
+# cars/pagination.py
+"""
+Пагинация каталога с дешёвым подсчётом количества.
+
+Полный COUNT(*) по отфильтрованному каталогу — самая дорогая часть списка на большой базе.
+Стратегия CarCountPaginator:
+  1. счётчик из кеша по подписи фильтра и версии каталога;
+  2. пробный COUNT по LIMIT EXACT_COUNT_LIMIT + 1 строк — для небольших выборок он и есть точный ответ;
+  3. для больших выборок на PostgreSQL — оценка планировщика (EXPLAIN), на остальных БД — полный COUNT.
+В ответе поле count_exact говорит, точное ли число count.
+
+Те же пагинаторы стоят в админке (cars/admin.py, api/admin.py); для таблиц вне каталога кеш по
+версии каталога не годится — EstimatedCountPaginator считает шаги 2–3 без кеша.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from .cache import catalog_version
+
+EXACT_COUNT_LIMIT = 10_000
+EXACT_COUNT_TTL = 300
+ESTIMATED_COUNT_TTL = 60
+
+
+def planner_estimate(queryset):
+    """Оценка числа строк от планировщика PostgreSQL — без выполнения запроса."""
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    """Возвращает (count, exact) без кеша."""
+    probe = queryset.order_by().values('pk')[:EXACT_COUNT_LIMIT + 1].count()
+    if probe <= EXACT_COUNT_LIMIT:
+        return probe, True
+    if connections[queryset.db].vendor == 'postgresql':
+        # Оценка не может быть меньше того, что мы уже насчитали пробой
+        return max(planner_estimate(queryset), probe), False
+    return queryset.order_by().count(), True
+
+
+def count_queryset(queryset, signature):
+    """Возвращает (count, exact)."""
+    key = f'cars:count:{catalog_version()}:{signature}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = estimate_count(queryset)
+    cache.set(key, result, EXACT_COUNT_TTL if result[1] else ESTIMATED_COUNT_TTL)
+    return result
+
+
+class EstimatedPage(Page):
+    """Страница при приблизительном count: есть ли следующая — по лишней строке, а не по count."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CarCountPaginator(Paginator):
+    def __init__(self, object_list, per_page, signature=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.signature = signature or hashlib.sha1(str(object_list.query).encode()).hexdigest()
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        count, self.count_exact = count_queryset(self.object_list, self.signature)
+        return count
+
+    def validate_number(self, number):
+        self.count  # заполняет count_exact
+        if self.count_exact:
+            return super().validate_number(number)
+        # При оценке последняя страница неизвестна точно — проверяем только нижнюю границу
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        return EstimatedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class EstimatedCountPaginator(CarCountPaginator):
+    """Без кеша: для таблиц, которые не меняют версию каталога (пользователи в админке)."""
+
+    @cached_property
+    def count(self):
+        count, self.count_exact = estimate_count(self.object_list)
+        return count
+
+
+class EstimatedCountAdminMixin:
+    """ModelAdmin без полного COUNT: paginator с оценкой и без второго подсчёта всей таблицы."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        # Позиционный третий аргумент у наших пагинаторов — signature, а не orphans
+        return self.paginator(queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page)
+
+
+class CarPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.signature = view.get_count_signature() if hasattr(view, 'get_count_signature') else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        return CarCountPaginator(object_list, per_page, signature=self.signature)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_exact'] = {'type': 'boolean'}
+        return response_schema
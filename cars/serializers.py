@@ -1,29 +1,90 @@
 # cars/serializers.py
+import math
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
-from .models import Car, CarImage, Ad
+from core.media import rendition_url
+from . import installments
+from .filters import CarFilterField
+from .models import Ad, ArchivedCar, Car, CarImage, InstallmentPlan
+from .uploads import UploadedImageField
 from favorites.models import Favorite
 
+THUMBNAIL_WIDTH = 320
+# Поля-ссылки на медиа в ответах, собранных без запроса (core.media.absolutize)
+MEDIA_URL_FIELDS = frozenset({'image', 'image_thumbnail', 'thumbnail', 'cover_thumbnail'})
+
+
+class ThumbnailField(serializers.Field):
+    """URL превью картинки-поля (core.media) — без обращения к диску."""
+
+    def __init__(self, source_field, width=THUMBNAIL_WIDTH, **kwargs):
+        self.source_field = source_field
+        self.width = width
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        url = rendition_url(getattr(obj, self.source_field), self.width)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if url and request else url
+
+
+class MediaNameField(serializers.CharField):
+    """Имя файла в хранилище (строкой, не FileField) -> абсолютный URL; пустое имя -> None."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = settings.MEDIA_URL + value
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 
 class CarImageSerializer(serializers.ModelSerializer):
+    thumbnail = ThumbnailField('image')
+
     class Meta:
         model = CarImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'thumbnail']
+
+
+class CarListSerializer(serializers.ListSerializer):
+    """Список машин: котировки рассрочки считаются для всей страницы одним проходом."""
+
+    def to_representation(self, data):
+        cars = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        installments.attach_quotes(cars)
+        return super().to_representation(cars)
 
 
 class CarSerializer(serializers.ModelSerializer):
     images = CarImageSerializer(many=True, read_only=True)
+    image_thumbnail = ThumbnailField('image')
+    cover_thumbnail = MediaNameField()
     is_favorite = serializers.SerializerMethodField()
     installment_months = serializers.SerializerMethodField()
+    installment_quotes = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Car
+        list_serializer_class = CarListSerializer
         fields = [
             'id', 'brand', 'model', 'year', 'price', 'car_type', 'fuel_type',
             'engine_volume', 'power', 'transmission', 'mileage', 'condition',
-            'steering', 'color', 'installment', 'phone', 'image', 'description',
-            'images', 'created_at', 'is_active', 'views', 'is_favorite', 'installment_months'
+            'steering', 'color', 'installment', 'phone', 'image', 'image_thumbnail', 'description',
+            'images', 'created_at', 'is_active', 'views', 'is_favorite', 'installment_months',
+            'installment_quotes', 'city', 'latitude', 'longitude', 'distance_km', 'cover_thumbnail', 'images_count'
         ]
-        read_only_fields = ['images', 'views', 'created_at']
+        read_only_fields = ['images', 'views', 'created_at', 'images_count']
 
     def get_is_favorite(self, obj):
         request = self.context.get('request')
@@ -32,13 +93,29 @@ class CarSerializer(serializers.ModelSerializer):
         return False
 
     def get_installment_months(self, obj):
-        return [6, 9, 12] if obj.installment else []
+        return [quote['months'] for quote in installments.quotes_for(obj)]
+
+    def get_installment_quotes(self, obj):
+        return installments.quotes_for(obj)
+
+    def get_distance_km(self, obj):
+        # Есть только в выдаче поиска по радиусу (CarFilter, lat/lon)
+        distance_sq = getattr(obj, 'distance_sq', None)
+        return None if distance_sq is None else round(math.sqrt(distance_sq), 1)
+
+
+class CarCardSerializer(CarSerializer):
+    """Карточка списка: вместо галереи — обложка и число фото (cars/gallery.py), без запросов к CarImage."""
+
+    class Meta(CarSerializer.Meta):
+        fields = [field for field in CarSerializer.Meta.fields if field != 'images']
 
 
 class CarCreateSerializer(serializers.ModelSerializer):
+    image = UploadedImageField(required=False, allow_null=True)
     # Доп. фото — список файлов
     images = serializers.ListField(
-        child=serializers.ImageField(),
+        child=UploadedImageField(),
         write_only=True,
         required=False,
         max_length=10
@@ -49,8 +126,20 @@ class CarCreateSerializer(serializers.ModelSerializer):
         fields = [
             'brand', 'model', 'year', 'price', 'car_type', 'fuel_type',
             'engine_volume', 'power', 'transmission', 'mileage', 'condition',
-            'steering', 'color', 'installment', 'phone', 'image', 'description', 'is_active', 'images'
+            'steering', 'color', 'installment', 'phone', 'image', 'description', 'is_active', 'images',
+            'city', 'latitude', 'longitude'
         ]
+        extra_kwargs = {
+            'latitude': {'min_value': -90, 'max_value': 90},
+            'longitude': {'min_value': -180, 'max_value': 180},
+        }
+
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError({'latitude': 'Координаты задаются парой: latitude и longitude.'})
+        return attrs
 
     def validate_phone(self, value):
         if not value:
@@ -64,8 +153,111 @@ class CarCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(f"Год должен быть от 1900 до {current_year + 1}")
         return value
 
+    # Фото галереи сохраняет вьюха (AdminCarViewSet) — обратную связь images ORM не назначаем
+    def create(self, validated_data):
+        validated_data.pop('images', None)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data.pop('images', None)
+        return super().update(instance, validated_data)
+
+
+class CarFormSchemaSerializer(CarCreateSerializer):
+    """Только для схемы Swagger: список файлов в form-data drf_yasg не описывает — images идёт manual-параметром."""
+    images = None
+
+    class Meta(CarCreateSerializer.Meta):
+        fields = [field for field in CarCreateSerializer.Meta.fields if field != 'images']
+
+
+class CarBulkSerializer(serializers.Serializer):
+    """Пачечное изменение машин (cars/bulk.py): по списку id или по фильтру каталога."""
+    ACTIONS = ['activate', 'deactivate', 'set_price', 'adjust_price']
+    MAX_IDS = 10_000
+    MAX_PRICE = Decimal('9999999999.99')  # numeric(12,2) у Car.price
+
+    action = serializers.ChoiceField(choices=ACTIONS)
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False,
+                                allow_empty=False, max_length=MAX_IDS)
+    query = CarFilterField(required=False)
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0'), required=False,
+                                     help_text='Новая цена (set_price)')
+    percent = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('-90'),
+                                       max_value=Decimal('100'), required=False,
+                                       help_text='Изменение цены в процентах (adjust_price)')
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('query' in attrs):
+            raise serializers.ValidationError('Укажите либо ids, либо query.')
+        required = {'set_price': 'price', 'adjust_price': 'percent'}.get(attrs['action'])
+        if required and required not in attrs:
+            raise serializers.ValidationError({required: 'Обязательное поле для этого действия.'})
+        if attrs['action'] == 'adjust_price' and attrs['percent'] > 0:
+            # Переполнение numeric(12,2) на PostgreSQL уронило бы UPDATE посреди пачек — проверяем заранее
+            highest = self._queryset(attrs).aggregate(price=models.Max('price'))['price']
+            factor = 1 + attrs['percent'] / 100
+            if highest is not None and (highest * factor).quantize(Decimal('0.01'), ROUND_HALF_UP) > self.MAX_PRICE:
+                raise serializers.ValidationError(
+                    {'percent': f'Цена {highest} превысит максимум {self.MAX_PRICE}.'})
+        return attrs
+
+    def get_queryset(self):
+        return self._queryset(self.validated_data)
+
+    @staticmethod
+    def _queryset(attrs):
+        if 'ids' in attrs:
+            return Car.objects.filter(id__in=attrs['ids'])
+        return attrs['query'].filter_queryset(Car.objects.all(), order=False)
+
 
 class AdSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ad
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['impressions']
+
+
+class InstallmentPlanSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InstallmentPlan
+        fields = ['id', 'name', 'months', 'annual_rate', 'down_payment', 'is_active', 'created_at', 'updated_at']
+
+    def validate_months(self, value):
+        if not 1 <= value <= 120:
+            raise serializers.ValidationError('Срок от 1 до 120 месяцев.')
+        return value
+
+    def validate_annual_rate(self, value):
+        if not 0 <= value <= 100:
+            raise serializers.ValidationError('Ставка от 0 до 100%.')
+        return value
+
+    def validate_down_payment(self, value):
+        if not 0 <= value < 100:
+            raise serializers.ValidationError('Первый взнос от 0 до 100%.')
+        return value
+
+
+class PublicAdSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Ad
+        fields = ['id', 'title', 'description', 'image', 'installment_info']
+
+
+class ArchivedCarSerializer(serializers.ModelSerializer):
+    favorites_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedCar
+        fields = ['id', 'brand', 'model', 'year', 'price', 'phone', 'created_at', 'deactivated_at',
+                  'archived_at', 'images', 'favorites_count']
+
+    def get_favorites_count(self, obj):
+        return len(obj.favorites)
+
+
+class ArchivedCarDetailSerializer(ArchivedCarSerializer):
+    class Meta(ArchivedCarSerializer.Meta):
+        fields = ArchivedCarSerializer.Meta.fields + ['data']
@@ -0,0 +1,86 @@
+# cars/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import ads, blobs, changes, detail, installments, market, stream
+from .cache import bump_catalog_version
+from .models import Ad, Car, CarChange, CarImage, InstallmentPlan
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_init, sender=Car)
+@receiver(post_init, sender=CarImage)
+def remember_media(sender, instance, **kwargs):
+    blobs.remember_names(instance)
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=CarImage)
+def count_media(sender, instance, created, **kwargs):
+    blobs.sync_names(instance, created)
+
+
+@receiver(post_delete, sender=Car)
+@receiver(post_delete, sender=CarImage)
+def release_media(sender, instance, **kwargs):
+    blobs.release_names(instance)
+
+
+@receiver(post_save, sender=Ad)
+@receiver(post_delete, sender=Ad)
+def refresh_ads(sender, **kwargs):
+    ads.delivery.invalidate()
+
+
+@receiver(post_save, sender=InstallmentPlan)
+@receiver(post_delete, sender=InstallmentPlan)
+def refresh_installment_plans(sender, **kwargs):
+    installments.registry.invalidate()
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def log_car_upsert(sender, instance, **kwargs):
+    changes.record([instance.car_id if sender is CarImage else instance.pk])
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def invalidate_detail(sender, instance, **kwargs):
+    detail.invalidate([instance.car_id if sender is CarImage else instance.pk])
+
+
+@receiver(post_delete, sender=Car)
+def log_car_delete(sender, instance, **kwargs):
+    changes.record([instance.pk], CarChange.DELETE)
+
+
+@receiver(post_save, sender=Car)
+def push_to_stream(sender, instance, **kwargs):
+    transaction.on_commit(lambda: stream.publish_car(instance))
+
+
+@receiver(post_init, sender=Car)
+def remember_market(sender, instance, **kwargs):
+    market.remember(instance)
+
+
+@receiver(post_save, sender=Car)
+def track_market(sender, instance, created, **kwargs):
+    market.track(instance, created)
+
+
+@receiver(post_delete, sender=Car)
+def untrack_market(sender, instance, **kwargs):
+    market.untrack(instance)
@@ -0,0 +1,377 @@
+# cars/similar.py
+"""
+Похожие машины: заранее посчитанные ближайшие соседи.
+
+Признаки: цена (log), год, пробег (log1p), мощность, объём двигателя — z-нормализация;
+тип кузова, топливо, марка — one-hot с весами. Соседи ищутся внутри типа кузова в окне
+по цене (приближённый k-NN: O(N·окно) вместо O(N²)), результат хранится в .npy:
+
+    ids.npy         отсортированные id машин (N,)
+    features.npy    признаки (N, D) float32
+    neighbours.npy  id соседей (N, K), -1 — пусто
+    distances.npy   расстояния (N, K) float32
+    meta.json       словари категорий, параметры нормализации, время сборки
+
+Каждая сборка пишется в новый каталог версии, указатель CURRENT переключается атомарно.
+Веб-процессы открывают файлы через mmap — поиск соседа это searchsorted + срез строки.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Car
+
+NUMERIC_FEATURES = ['price', 'year', 'mileage', 'power', 'engine_volume']
+LOG_FEATURES = {'price', 'mileage'}
+CATEGORY_FEATURES = {
+    # поле: вес (расстояние между разными значениями)
+    'car_type': 1.0,
+    'fuel_type': 0.7,
+    'brand': 1.2,
+}
+VALUE_FIELDS = ['id', 'car_type'] + NUMERIC_FEATURES + [f for f in CATEGORY_FEATURES if f != 'car_type']
+
+DEFAULT_K = 20
+PRICE_WINDOW = 2000
+BLOCK_SIZE = 1024
+MAX_BLOCK_CELLS = 16_000_000
+KEEP_VERSIONS = 2
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+class Featurizer:
+    """Переводит строки Car в векторы. Параметры нормализации фиксируются при полной сборке."""
+
+    def __init__(self, means, stds, vocab):
+        self.means = means
+        self.stds = stds
+        self.vocab = vocab
+        self.offsets = {}
+        offset = len(NUMERIC_FEATURES)
+        for field in CATEGORY_FEATURES:
+            self.offsets[field] = offset
+            offset += len(vocab[field])
+        self.dim = offset
+
+    @staticmethod
+    def numeric_matrix(rows):
+        matrix = np.array([[np.nan if row[f] is None else float(row[f]) for f in NUMERIC_FEATURES] for row in rows],
+                          dtype=np.float64).reshape(len(rows), len(NUMERIC_FEATURES))
+        for i, field in enumerate(NUMERIC_FEATURES):
+            if field in LOG_FEATURES:
+                matrix[:, i] = np.log1p(np.clip(matrix[:, i], 0, None))
+        return matrix
+
+    @classmethod
+    def fit(cls, rows):
+        numeric = cls.numeric_matrix(rows)
+        means = np.nanmean(numeric, axis=0) if len(rows) else np.zeros(len(NUMERIC_FEATURES))
+        stds = np.nanstd(numeric, axis=0) if len(rows) else np.ones(len(NUMERIC_FEATURES))
+        means = np.nan_to_num(means)
+        stds = np.where(np.nan_to_num(stds) > 0, np.nan_to_num(stds), 1.0)
+        vocab = {field: sorted({row[field] for row in rows if row[field]}) for field in CATEGORY_FEATURES}
+        for field, choices in (('car_type', Car.CAR_TYPES), ('fuel_type', Car.FUEL_TYPES)):
+            vocab[field] = sorted(set(vocab[field]) | {key for key, _ in choices})
+        return cls(means.tolist(), stds.tolist(), vocab)
+
+    def transform(self, rows):
+        features = np.zeros((len(rows), self.dim), dtype=np.float32)
+        numeric = (self.numeric_matrix(rows) - np.array(self.means)) / np.array(self.stds)
+        features[:, :len(NUMERIC_FEATURES)] = np.nan_to_num(numeric)  # пропуск = среднее
+        for field, weight in CATEGORY_FEATURES.items():
+            # Разные значения дают расстояние ровно weight: две координаты по weight/√2
+            index = {value: i for i, value in enumerate(self.vocab[field])}
+            value = weight / np.sqrt(2)
+            for r, row in enumerate(rows):
+                position = index.get(row[field])
+                if position is not None:
+                    features[r, self.offsets[field] + position] = value
+        return features
+
+    def dump(self):
+        return {'means': self.means, 'stds': self.stds, 'vocab': self.vocab}
+
+
+def _squared_distances(a, b):
+    d = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2.0 * (a @ b.T)
+    return np.maximum(d, 0)
+
+
+def _top_k(distances, candidate_ids, k):
+    """Лучшие k по строкам; недостающее добивается -1/inf."""
+    n_rows, n_cols = distances.shape
+    take = min(k, n_cols)
+    neighbours = np.full((n_rows, k), -1, dtype=np.int64)
+    best = np.full((n_rows, k), np.inf, dtype=np.float32)
+    if take == 0:
+        return neighbours, best
+    part = np.argpartition(distances, take - 1, axis=1)[:, :take]
+    part_dist = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_dist, axis=1)
+    part = np.take_along_axis(part, order, axis=1)
+    neighbours[:, :take] = candidate_ids[part]
+    best[:, :take] = np.sqrt(np.take_along_axis(part_dist, order, axis=1))
+    best[neighbours == -1] = np.inf
+    return neighbours, best
+
+
+def knn_windowed(ids, features, groups, sort_key, k, window=PRICE_WINDOW, block=BLOCK_SIZE):
+    """Полная сборка: соседи внутри группы (тип кузова) в окне ±window по sort_key (цене)."""
+    n = len(ids)
+    neighbours = np.full((n, k), -1, dtype=np.int64)
+    distances = np.full((n, k), np.inf, dtype=np.float32)
+    for group in np.unique(groups):
+        members = np.flatnonzero(groups == group)
+        members = members[np.argsort(sort_key[members], kind='stable')]
+        member_features = features[members]
+        member_ids = ids[members]
+        for start in range(0, len(members), block):
+            stop = min(start + block, len(members))
+            lo, hi = max(0, start - window), min(len(members), stop + window)
+            d = _squared_distances(member_features[start:stop], member_features[lo:hi])
+            # Сама машина себе не сосед
+            rows = np.arange(stop - start)
+            d[rows, rows + (start - lo)] = np.inf
+            nb, dist = _top_k(d, member_ids[lo:hi], k)
+            nb[~np.isfinite(dist)] = -1
+            neighbours[members[start:stop]] = nb
+            distances[members[start:stop]] = dist
+    return neighbours, distances
+
+
+def knn_exact(query_ids, query_features, query_groups, ids, features, groups, k):
+    """Точные соседи для небольшого набора строк (инкрементальное обновление)."""
+    neighbours = np.full((len(query_ids), k), -1, dtype=np.int64)
+    distances = np.full((len(query_ids), k), np.inf, dtype=np.float32)
+    for group in np.unique(query_groups):
+        rows = np.flatnonzero(query_groups == group)
+        members = np.flatnonzero(groups == group)
+        member_features = np.asarray(features[members])
+        member_ids = np.asarray(ids[members])
+        # Держим матрицу расстояний блока в пределах MAX_BLOCK_CELLS
+        block = max(1, min(BLOCK_SIZE, MAX_BLOCK_CELLS // max(len(members), 1)))
+        for start in range(0, len(rows), block):
+            chunk = rows[start:start + block]
+            d = _squared_distances(query_features[chunk], member_features)
+            d[query_ids[chunk][:, None] == member_ids[None, :]] = np.inf
+            nb, dist = _top_k(d, member_ids, k)
+            nb[~np.isfinite(dist)] = -1
+            neighbours[chunk] = nb
+            distances[chunk] = dist
+    return neighbours, distances
+
+
+def _fetch_rows(queryset, limit=None):
+    queryset = queryset.order_by('id').values(*VALUE_FIELDS)
+    return list(queryset[:limit] if limit else queryset)
+
+
+def feature_groups(features, vocab):
+    """Группа строки — индекс типа кузова из one-hot признаков (-1, если тип неизвестен)."""
+    offset = len(NUMERIC_FEATURES)
+    block = np.asarray(features[:, offset:offset + len(vocab['car_type'])])
+    groups = np.argmax(block, axis=1).astype(np.int32) if block.shape[1] else np.zeros(len(block), np.int32)
+    groups[block.max(axis=1, initial=0) == 0] = -1
+    return groups
+
+
+# === Хранение ===
+
+def _index_dir():
+    return settings.SIMILAR_INDEX_DIR
+
+
+def _current_path():
+    return os.path.join(_index_dir(), 'CURRENT')
+
+
+def current_version_dir():
+    try:
+        with open(_current_path(), encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(_index_dir(), name) if name else None
+
+
+def save_index(ids, features, neighbours, distances, meta):
+    base = _index_dir()
+    os.makedirs(base, exist_ok=True)
+    name = f'v{time.time_ns()}'
+    path = os.path.join(base, name)
+    os.makedirs(path)
+    np.save(os.path.join(path, 'ids.npy'), ids)
+    np.save(os.path.join(path, 'features.npy'), features)
+    np.save(os.path.join(path, 'neighbours.npy'), neighbours)
+    np.save(os.path.join(path, 'distances.npy'), distances)
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    tmp = _current_path() + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(tmp, _current_path())
+
+    # Старые версии держим на случай, если их ещё читает процесс через mmap
+    versions = sorted(d for d in os.listdir(base) if d.startswith('v') and os.path.isdir(os.path.join(base, d)))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+    return path
+
+
+class SimilarIndex:
+    def __init__(self, path, mmap=True):
+        mode = 'r' if mmap else None
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode=mode)
+        self.features = np.load(os.path.join(path, 'features.npy'), mmap_mode=mode)
+        self.neighbours = np.load(os.path.join(path, 'neighbours.npy'), mmap_mode=mode)
+        self.distances = np.load(os.path.join(path, 'distances.npy'), mmap_mode=mode)
+        self.featurizer = Featurizer(self.meta['means'], self.meta['stds'], self.meta['vocab'])
+
+    def row(self, car_id):
+        position = int(np.searchsorted(self.ids, car_id))
+        if position < len(self.ids) and self.ids[position] == car_id:
+            return position
+        return None
+
+    def neighbours_for(self, car_id, limit):
+        position = self.row(car_id)
+        if position is None:
+            return None
+        row = self.neighbours[position, :limit]
+        return [int(x) for x in row if x != -1]
+
+    def neighbours_for_car(self, car, limit):
+        """Машины нет в индексе (добавлена после сборки) — считаем на лету против всех строк группы."""
+        query = self.featurizer.transform([{field: getattr(car, field) for field in VALUE_FIELDS}])
+        nb, _ = knn_exact(np.array([car.id]), query, feature_groups(query, self.meta['vocab']),
+                          np.asarray(self.ids), self.features, self.groups, limit)
+        return [int(x) for x in nb[0] if x != -1]
+
+    @property
+    def groups(self):
+        if not hasattr(self, '_groups'):
+            self._groups = feature_groups(self.features, self.meta['vocab'])
+        return self._groups
+
+
+_loaded = {'index': None, 'path': None, 'checked': 0.0}
+_lock = threading.Lock()
+
+
+def get_index():
+    """Текущий индекс процесса; указатель CURRENT перечитывается не чаще раза в RELOAD_CHECK_INTERVAL."""
+    now = time.monotonic()
+    if now - _loaded['checked'] < RELOAD_CHECK_INTERVAL:
+        return _loaded['index']
+    with _lock:
+        if now - _loaded['checked'] >= RELOAD_CHECK_INTERVAL:
+            path = current_version_dir()
+            if path != _loaded['path']:
+                _loaded['index'] = SimilarIndex(path) if path and os.path.isdir(path) else None
+                _loaded['path'] = path
+            _loaded['checked'] = now
+    return _loaded['index']
+
+
+def reset_index_cache():
+    with _lock:
+        _loaded.update(index=None, path=None, checked=0.0)
+
+
+# === Сборка ===
+
+def build_full(k=DEFAULT_K, window=PRICE_WINDOW, batch_size=50_000):
+    started = timezone.now()
+    rows = []
+    last_id = 0
+    active = Car.objects.filter(is_active=True)
+    while True:
+        chunk = _fetch_rows(active.filter(id__gt=last_id), limit=batch_size)
+        if not chunk:
+            break
+        rows.extend(chunk)
+        last_id = chunk[-1]['id']
+
+    featurizer = Featurizer.fit(rows)
+    ids = np.array([row['id'] for row in rows], dtype=np.int64)
+    features = featurizer.transform(rows)
+    groups = feature_groups(features, featurizer.vocab)
+    neighbours, distances = knn_windowed(ids, features, groups, features[:, 0], k, window=window)
+    meta = dict(featurizer.dump(), k=k, built_at=started.isoformat(), full_build_at=started.isoformat(),
+                count=len(ids))
+    return save_index(ids, features, neighbours, distances, meta), {'cars': len(ids), 'changed': len(ids)}
+
+
+def build_incremental(max_changed_ratio=0.2, **kwargs):
+    """
+    Обновляет только изменившиеся машины (updated_at после прошлой сборки), удалённые/снятые
+    и те строки, в чей top-K попал изменившийся сосед. Слишком много изменений — полная сборка.
+    """
+    path = current_version_dir()
+    if not path or not os.path.isdir(path):
+        return build_full(**kwargs)
+    index = SimilarIndex(path, mmap=False)
+    meta = index.meta
+    k = meta['k']
+    started = timezone.now()
+    since = parse_datetime(meta['built_at'])
+
+    ids = index.ids
+    changed_rows = _fetch_rows(Car.objects.filter(is_active=True, updated_at__gte=since))
+    changed_ids = {row['id'] for row in changed_rows}
+    # Снятые и удалённые: были в индексе, но среди активных их больше нет
+    alive = np.fromiter(Car.objects.filter(is_active=True).values_list('id', flat=True).iterator(chunk_size=50_000),
+                        dtype=np.int64)
+    removed = set(ids[~np.isin(ids, alive)].tolist())
+
+    if len(changed_ids) + len(removed) > max_changed_ratio * max(len(ids), 1):
+        return build_full(k=k, **{key: v for key, v in kwargs.items() if key != 'k'})
+
+    featurizer = index.featurizer
+    keep = ~np.isin(ids, list(removed | changed_ids))
+    new_ids = np.array([row['id'] for row in changed_rows], dtype=np.int64)
+    new_features = featurizer.transform(changed_rows)
+
+    all_ids = np.concatenate([ids[keep], new_ids])
+    all_features = np.concatenate([index.features[keep], new_features])
+    all_neighbours = np.concatenate([index.neighbours[keep], np.full((len(new_ids), k), -1, dtype=np.int64)])
+    all_distances = np.concatenate([index.distances[keep], np.full((len(new_ids), k), np.inf, dtype=np.float32)])
+    order = np.argsort(all_ids)
+    all_ids, all_features = all_ids[order], all_features[order]
+    all_neighbours, all_distances = all_neighbours[order], all_distances[order]
+    groups = feature_groups(all_features, meta['vocab'])
+
+    # Кого пересчитать: изменённые, ссылавшиеся на изменённые/удалённые, и тех, к кому изменённый
+    # подошёл ближе их k-го соседа
+    touched = np.isin(all_ids, new_ids)
+    touched |= np.isin(all_neighbours, list(removed | changed_ids)).any(axis=1)
+    if len(new_ids):
+        new_rows = np.searchsorted(all_ids, new_ids)
+        step = max(1, MAX_BLOCK_CELLS // len(new_rows))
+        for start in range(0, len(all_ids), step):
+            stop = min(start + step, len(all_ids))
+            d = np.sqrt(_squared_distances(all_features[start:stop], all_features[new_rows]))
+            same_group = groups[start:stop][:, None] == groups[new_rows][None, :]
+            kth = all_distances[start:stop, -1][:, None]
+            touched[start:stop] |= (same_group & (d < kth)).any(axis=1)
+
+    rows = np.flatnonzero(touched)
+    if len(rows):
+        nb, dist = knn_exact(all_ids[rows], all_features[rows], groups[rows], all_ids, all_features, groups, k)
+        all_neighbours[rows] = nb
+        all_distances[rows] = dist
+
+    meta = dict(meta, built_at=started.isoformat(), count=len(all_ids))
+    path = save_index(all_ids, all_features, all_neighbours, all_distances, meta)
+    return path, {'cars': len(all_ids), 'changed': len(new_ids), 'removed': len(removed), 'recomputed': len(rows)}
@@ -0,0 +1,290 @@
+# cars/stream.py
+"""
+Server-sent events: новые и изменённые активные машины по фильтру клиента.
+
+GET /api/v1/cars/stream/?<параметры CarFilter> — держит соединение и шлёт event: car с карточкой
+машины, когда подходящая машина сохранена. Работает только под ASGI: соединение — это корутина и
+ограниченная очередь, без потока на клиента. Под WSGI (gunicorn core.wsgi) бесконечный асинхронный
+генератор занял бы воркер навсегда, поэтому там эндпоинт отвечает 501. Развёртывание: API — как
+раньше, gunicorn core.wsgi:application; поток — отдельный процесс
+    uvicorn core.asgi:application --host 0.0.0.0 --port 8001 --workers 2
+и в прокси location /api/v1/cars/stream/ -> :8001 с proxy_buffering off.
+
+Подписок на процесс не больше CAR_STREAM_MAX_SUBSCRIBERS (дальше 503), с одного IP — не больше
+CAR_STREAM_MAX_PER_CLIENT (дальше 429): каждая держит соединение и очередь в памяти.
+
+Поток событий: post_save Car -> on_commit -> broker.publish(карточка). Карточка сериализуется один раз
+на событие; подписчики сгруппированы по подписи фильтра, и CarFilter.matches считается один раз
+на группу. Брокер:
+- InMemoryBroker — в пределах процесса (локально и в тестах);
+- RedisBroker — если задан REDIS_URL: публикация в канал Redis из любого процесса (в том числе
+  WSGI-воркеров админки), в ASGI-процессе один поток слушает канал и раздаёт события локально.
+  Ошибка Redis не убивает поток: он пишет её в лог и переподключается через REDIS_RETRY_SECONDS.
+  Decimal в карточке для matches — строкой: через JSON float дал бы 19999.98999… вместо 19999.99.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import serializers
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.encoders import JSONEncoder
+
+from .filters import CarFilter
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 20
+RETRY_MS = 5000
+REDIS_CHANNEL = 'cars:stream'
+REDIS_RETRY_SECONDS = 5
+DEFAULT_MAX_SUBSCRIBERS = 1000
+DEFAULT_MAX_PER_CLIENT = 4
+
+
+class Subscription:
+    def __init__(self, car_filter, loop):
+        self.filter = car_filter
+        self.signature = car_filter.signature()
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, message):
+        # Вызывается в потоке цикла событий (call_soon_threadsafe)
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать — закрываем поток, он переподключится и дочитает через changes/
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class StreamSlots:
+    """Открытые подписки процесса: всего и по IP клиента."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total = 0
+        self._clients = Counter()
+
+    def acquire(self, client):
+        """Занимает место. Отказ — HTTP-статус (503 — процесс полон, 429 — лимит IP), иначе None."""
+        with self._lock:
+            if self._total >= getattr(settings, 'CAR_STREAM_MAX_SUBSCRIBERS', DEFAULT_MAX_SUBSCRIBERS):
+                return 503
+            if self._clients[client] >= getattr(settings, 'CAR_STREAM_MAX_PER_CLIENT', DEFAULT_MAX_PER_CLIENT):
+                return 429
+            self._total += 1
+            self._clients[client] += 1
+        return None
+
+    def release(self, client):
+        with self._lock:
+            self._total -= 1
+            self._clients[client] -= 1
+            if self._clients[client] <= 0:
+                del self._clients[client]
+
+
+slots = StreamSlots()
+
+
+class InMemoryBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}  # подпись фильтра -> (CarFilter, [Subscription])
+        self._next_id = 0
+
+    @property
+    def has_subscribers(self):
+        return bool(self._groups)
+
+    def subscribe(self, car_filter, loop):
+        subscription = Subscription(car_filter, loop)
+        with self._lock:
+            self._groups.setdefault(subscription.signature, (car_filter, []))[1].append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            group = self._groups.get(subscription.signature)
+            if group and subscription in group[1]:
+                group[1].remove(subscription)
+                if not group[1]:
+                    del self._groups[subscription.signature]
+
+    def publish(self, card):
+        self.dispatch(card)
+
+    def dispatch(self, card):
+        """Раздаёт карточку подписчикам этого процесса. Возвращает число получателей."""
+        with self._lock:
+            self._next_id += 1
+            groups = list(self._groups.values())
+            event_id = self._next_id
+        car = SimpleNamespace(**card['match'])
+        message = f'id: {event_id}\nevent: car\ndata: {card["data"]}\n\n'
+        delivered = 0
+        for car_filter, subscriptions in groups:
+            if not car_filter.matches(car):
+                continue
+            for subscription in list(subscriptions):
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+                delivered += 1
+        return delivered
+
+
+class RedisBroker(InMemoryBroker):
+    def __init__(self, url):
+        super().__init__()
+        import redis  # необязательная зависимость, как и RedisCache в settings
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    @property
+    def has_subscribers(self):
+        # Подписчики могут быть в другом процессе — публикуем всегда
+        return True
+
+    def subscribe(self, car_filter, loop):
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name='cars-stream', daemon=True)
+                    self._listener.start()
+        return super().subscribe(car_filter, loop)
+
+    def publish(self, card):
+        self._redis.publish(REDIS_CHANNEL, json.dumps(card, cls=JSONEncoder))
+
+    def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(REDIS_CHANNEL)
+                for message in pubsub.listen():
+                    self.dispatch(json.loads(message['data']))
+            except Exception:
+                logger.exception('Канал %s: ошибка Redis, переподключение через %s с', REDIS_CHANNEL,
+                                 REDIS_RETRY_SECONDS)
+            finally:
+                pubsub.close()
+            time.sleep(REDIS_RETRY_SECONDS)
+
+
+def _make_broker():
+    if getattr(settings, 'REDIS_URL', None):
+        return RedisBroker(settings.REDIS_URL)
+    return InMemoryBroker()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = _make_broker()
+    return _broker
+
+
+def set_broker(broker):
+    """Подмена брокера (тесты)."""
+    global _broker
+    _broker = broker
+
+
+def car_card(car):
+    """Поля для CarFilter.matches и готовый JSON карточки — считаются один раз на событие."""
+    from .serializers import CarCardSerializer
+    names = {flt.field for flt in CarFilter.filters.values() if hasattr(flt, 'field')}
+    names |= {field for flt in CarFilter.filters.values() for field in getattr(flt, 'fields', [])}
+    match = {name: getattr(car, name) for name in names}
+    # Decimal строкой — RangeFilter.matches вернёт точное значение и после JSON (RedisBroker)
+    match = {name: str(value) if isinstance(value, Decimal) else value for name, value in match.items()}
+    data = json.dumps(CarCardSerializer(car).data, cls=JSONEncoder, ensure_ascii=False)
+    return {'match': match, 'data': data}
+
+
+def publish_car(car):
+    broker = get_broker()
+    if car.is_active and broker.has_subscribers:
+        broker.publish(car_card(car))
+
+
+async def _events(car_filter):
+    broker = get_broker()
+    subscription = broker.subscribe(car_filter, asyncio.get_running_loop())
+    try:
+        yield f'retry: {RETRY_MS}\n: подписка {subscription.signature[:8]}\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Комментарий-пинг не даёт прокси закрыть простаивающее соединение
+                yield ': ping\n\n'
+                continue
+            if message is None:
+                yield 'event: overflow\ndata: {}\n\n'
+                return
+            yield message
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """Место в slots освобождается в close(): ASGIHandler вызывает его и после обрыва соединения."""
+
+    def __init__(self, events, client):
+        super().__init__(events, content_type='text/event-stream')
+        self._client = client
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._client is not None:
+                slots.release(self._client)
+                self._client = None
+
+
+@require_GET
+async def car_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'Поток событий доступен только под ASGI (uvicorn core.asgi:application).'},
+                            status=501)
+    car_filter = CarFilter(request.GET)
+    try:
+        car_filter.is_valid(raise_exception=True)
+    except serializers.ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    client = BaseThrottle().get_ident(request)
+    refused = slots.acquire(client)
+    if refused == 503:
+        response = JsonResponse({'detail': 'Слишком много подписок, повторите позже.'}, status=503)
+        response['Retry-After'] = str(RETRY_MS // 1000)
+        return response
+    if refused == 429:
+        return JsonResponse({'detail': 'Слишком много открытых потоков с этого адреса.'}, status=429)
+    response = EventStreamResponse(_events(car_filter), client)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать поток
+    return response
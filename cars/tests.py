@@ -1,3 +1,1206 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from . import bulk, pagination, similar
+from .filters import CarFilter
+from .models import Car
+
+
+def make_car(**kwargs):
+    data = {
+        'brand': 'Toyota', 'model': 'Camry', 'year': 2018, 'price': Decimal('20000'),
+        'car_type': 'sedan', 'fuel_type': 'petrol', 'transmission': 'automatic',
+        'mileage': 50000, 'power': 180, 'engine_volume': 2.5, 'phone': '+996555000000',
+    }
+    data.update(kwargs)
+    return Car.objects.create(**data)
+
+
+class CarFilterTests(TestCase):
+    def filtered(self, query):
+        return CarFilter(QueryDict(query)).filter_queryset(Car.objects.filter(is_active=True))
+
+    def test_ranges_and_multi_value(self):
+        cheap = make_car(price=Decimal('9000'), fuel_type='diesel')
+        make_car(price=Decimal('30000'))
+        make_car(price=Decimal('9000'), fuel_type='electric')
+        make_car(price=Decimal('9000'), is_active=False)
+
+        result = self.filtered('min_price=5000&max_price=10000&fuel_type=petrol,diesel')
+        self.assertEqual(list(result), [cheap])
+
+    def test_ordering_has_stable_tie_breaker(self):
+        first = make_car(price=Decimal('10000'))
+        second = make_car(price=Decimal('10000'))
+        self.assertEqual(list(self.filtered('ordering=price')), [first, second])
+        self.assertEqual(list(self.filtered('ordering=-price')), [second, first])
+
+    def test_invalid_input_is_collected_before_query(self):
+        flt = CarFilter(QueryDict('min_price=abc&max_year=1800&car_type=boat&ordering=color'))
+        self.assertFalse(flt.is_valid())
+        self.assertEqual(set(flt.errors), {'min_price', 'max_year', 'car_type', 'ordering'})
+
+    def test_non_finite_numbers_are_rejected(self):
+        flt = CarFilter(QueryDict('min_price=sNaN&max_price=NaN&min_engine_volume=inf&max_engine_volume=nan'))
+        self.assertFalse(flt.is_valid())
+        self.assertEqual(set(flt.errors), {'min_price', 'max_price', 'min_engine_volume', 'max_engine_volume'})
+        self.assertEqual(self.client.get('/api/v1/cars/cars/', {'min_price': 'sNaN'}).status_code, 400)
+
+    def test_min_greater_than_max(self):
+        flt = CarFilter(QueryDict('min_mileage=100&max_mileage=10'))
+        self.assertIn('min_mileage', flt.errors)
+
+    def test_matches_agrees_with_queryset(self):
+        car = make_car(brand='BMW', model='X5', year=2020, car_type='suv')
+        for query, expected in [
+            ('brand=BMW&min_year=2019', True),
+            ('search=x5', True),
+            ('car_type=sedan', False),
+            ('max_power=100', False),
+        ]:
+            flt = CarFilter(QueryDict(query))
+            self.assertEqual(flt.matches(car), expected, query)
+            self.assertEqual(flt.filter_queryset(Car.objects.all()).exists(), expected, query)
+
+    def test_signature_ignores_parameter_order(self):
+        a = CarFilter(QueryDict('fuel_type=diesel,petrol&min_price=1000'))
+        b = CarFilter(QueryDict('min_price=1000.00&fuel_type=petrol&fuel_type=diesel'))
+        self.assertEqual(a.signature(), b.signature())
+        self.assertEqual(CarFilter.from_spec(a.dump()).signature(), a.signature())
+
+
+class CarQueryPlanTests(TestCase):
+    """Частые комбинации фильтров должны идти по частичным индексам car_active_*."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(50):
+            make_car(price=Decimal(5000 + i * 500), year=2000 + i % 25, mileage=i * 1000,
+                     brand=['Toyota', 'BMW', 'Kia'][i % 3], car_type=['sedan', 'suv'][i % 2],
+                     is_active=i % 5 != 0)
+
+    def plan(self, query):
+        return CarFilter(QueryDict(query)).filter_queryset(Car.objects.filter(is_active=True)).explain()
+
+    def assertUsesIndex(self, query, index, sorted_by_index=False):
+        plan = self.plan(query)
+        self.assertIn(index, plan, f'{query}: {plan}')
+        if sorted_by_index and connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', plan, f'{query}: {plan}')
+
+    def test_default_listing(self):
+        self.assertUsesIndex('', 'car_active_created_idx', sorted_by_index=True)
+
+    def test_price_range(self):
+        self.assertUsesIndex('min_price=10000&max_price=20000', 'car_active_price_idx')
+
+    def test_price_range_sorted_by_price(self):
+        self.assertUsesIndex('min_price=10000&max_price=20000&ordering=-price', 'car_active_price_idx',
+                             sorted_by_index=True)
+
+    def test_year_sorted(self):
+        self.assertUsesIndex('min_year=2015&ordering=-year', 'car_active_year_idx', sorted_by_index=True)
+
+    def test_mileage_sorted(self):
+        self.assertUsesIndex('ordering=mileage', 'car_active_mileage_idx', sorted_by_index=True)
+
+    def test_popular(self):
+        self.assertUsesIndex('ordering=-views', 'car_active_views_idx', sorted_by_index=True)
+
+    def test_brand_and_model(self):
+        self.assertUsesIndex('brand=Toyota&model=Camry', 'car_active_brand_model_idx')
+
+    def test_body_type_with_price(self):
+        self.assertUsesIndex('car_type=suv&min_price=10000&max_price=30000', 'car_active_type_price_idx')
+
+
+class CarListApiTests(APITestCase):
+    def test_bad_filter_is_400(self):
+        response = self.client.get('/api/v1/cars/cars/', {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('min_price', response.json())
+
+    def test_filters_applied(self):
+        make_car(year=2010)
+        match = make_car(year=2021, transmission='manual')
+        response = self.client.get('/api/v1/cars/cars/', {'min_year': 2020, 'transmission': 'manual'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([car['id'] for car in response.json()['results']], [match.id])
+
+    def test_paginated_count_is_exact_for_small_results(self):
+        for year in range(2010, 2015):
+            make_car(year=year)
+        response = self.client.get('/api/v1/cars/cars/', {'page_size': 2, 'min_year': 2011})
+        body = response.json()
+        self.assertEqual(body['count'], 4)
+        self.assertTrue(body['count_exact'])
+        self.assertEqual(len(body['results']), 2)
+        self.assertIsNotNone(body['next'])
+
+    def test_count_cache_is_invalidated_by_catalog_changes(self):
+        make_car()
+        self.assertEqual(self.client.get('/api/v1/cars/cars/').json()['count'], 1)
+        make_car()
+        self.assertEqual(self.client.get('/api/v1/cars/cars/').json()['count'], 2)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def test_estimated_page_uses_lookahead_row(self):
+        for i in range(5):
+            make_car(year=2000 + i)
+        qs = Car.objects.order_by('id')
+        with mock.patch.object(pagination, 'count_queryset', return_value=(100, False)):
+            paginator = pagination.CarCountPaginator(qs, 2, signature='test')
+            self.assertEqual(paginator.count, 100)
+            self.assertFalse(paginator.count_exact)
+            self.assertTrue(paginator.page(2).has_next())
+            last = paginator.page(3)
+            self.assertEqual(len(last), 1)
+            self.assertFalse(last.has_next())
+
+
+class SimilarCarsTests(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(SIMILAR_INDEX_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        similar.reset_index_cache()
+        self.addCleanup(similar.reset_index_cache)
+
+    def similar_ids(self, car):
+        similar.reset_index_cache()
+        response = self.client.get(f'/api/v1/cars/cars/{car.id}/similar/', {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()]
+
+    def test_nearest_within_body_type_and_incremental_refresh(self):
+        base = make_car(price=Decimal('20000'), year=2018)
+        close = make_car(price=Decimal('21000'), year=2018)
+        far = make_car(price=Decimal('90000'), year=2005, mileage=400000)
+        make_car(price=Decimal('20000'), year=2018, car_type='suv')
+        similar.build_full(k=5)
+        self.assertEqual(self.similar_ids(base), [close.id, far.id])
+
+        close.is_active = False
+        close.save()
+        closer = make_car(price=Decimal('20500'), year=2018)
+        similar.build_incremental()
+        self.assertEqual(self.similar_ids(base), [closer.id, far.id])
+
+    def test_car_added_after_build_is_computed_on_the_fly(self):
+        make_car(price=Decimal('20000'))
+        similar.build_full(k=5)
+        fresh = make_car(price=Decimal('20000'))
+        self.assertEqual(len(self.similar_ids(fresh)), 1)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def save(self, name, data):
+        from django.core.files.base import ContentFile
+        from core.media import ContentHashStorage
+        return ContentHashStorage(location=self.media_root).save(name, ContentFile(data))
+
+    def test_same_content_is_stored_once_under_hashed_name(self):
+        first = self.save('cars/a.txt', b'x' * 1000)
+        second = self.save('cars/b.txt', b'x' * 1000)
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^cars/[0-9a-f]{2}/[0-9a-f]{40}\.txt$')
+
+    def test_immutable_headers_etag_and_range(self):
+        name = self.save('cars/a.txt', b'0123456789' * 100)
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(f'/media/{name}', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        partial = self.client.get(f'/media/{name}', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.content, b'0123456789')
+        self.assertEqual(self.client.get(f'/media/{name}', HTTP_RANGE='bytes=5000-').status_code, 416)
+
+    def test_precompressed_variant_is_served(self):
+        import gzip
+        name = self.save('cars/a.json', b'{"k": 1}' * 200)
+        response = self.client.get(f'/media/{name}', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'{"k": 1}' * 200)
+
+    def test_rendition_is_built_on_demand(self):
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+        name = self.save('cars/photo.jpg', buffer.getvalue())
+        response = self.client.get(f'/media/renditions/320/{name}')
+        self.assertEqual(response.status_code, 200)
+        image = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.width, 320)
+        self.assertEqual(self.client.get('/media/renditions/321/' + name).status_code, 404)
+        self.assertEqual(self.client.get('/media/../core/settings.py').status_code, 404)
+
+    def test_concurrent_renditions_in_threads(self):
+        import io
+        from concurrent.futures import ThreadPoolExecutor
+        from PIL import Image
+        from core.media import ContentHashStorage, make_rendition
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+        name = self.save('cars/photo.jpg', buffer.getvalue())
+        storage = ContentHashStorage(location=self.media_root)
+        # storage.exists пропускаем: все потоки строят одно превью одновременно
+        with mock.patch.object(storage, 'exists', lambda path: path == name), ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: make_rendition(name, 320, storage), range(16)))
+        target = results[0]
+        self.assertEqual(set(results), {target})
+        self.assertEqual(Image.open(storage.path(target)).width, 320)
+        self.assertEqual(os.listdir(os.path.dirname(storage.path(target))), [os.path.basename(target)])
+
+
+class MediaBlobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def photo(self, color='red'):
+        import io
+        from django.core.files.base import ContentFile
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue(), name='photo.jpg')
+
+    def test_duplicate_uploads_share_one_counted_blob(self):
+        from datetime import timedelta
+        from django.core.files.storage import default_storage
+        from .blobs import collect_garbage
+        from .models import CarImage, MediaBlob
+
+        first, second = make_car(), make_car()
+        a = CarImage.objects.create(car=first, image=self.photo())
+        b = CarImage.objects.create(car=second, image=self.photo())
+        self.assertEqual(a.image.name, b.image.name)
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+
+        first.delete()
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+
+        b.image = self.photo('blue')
+        b.save()
+        old = MediaBlob.objects.get(name=a.image.name)
+        self.assertEqual(old.refcount, 0)
+        self.assertEqual(MediaBlob.objects.get(name=b.image.name).refcount, 1)
+
+        self.assertEqual(collect_garbage(grace=timedelta(hours=1))[0], 0)  # ещё в grace-периоде
+        self.assertEqual(collect_garbage(grace=timedelta(0))[0], 1)
+        self.assertFalse(default_storage.exists(a.image.name))
+        self.assertTrue(default_storage.exists(b.image.name))
+
+    def test_reconcile_and_adopt_legacy_names(self):
+        from django.core.files.storage import default_storage
+        from .blobs import adopt_legacy, savings_report
+        from .models import MediaBlob
+
+        data = self.photo().read()
+        for name in ('cars/a.jpg', 'cars/b.jpg'):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        # UPDATE сигналов не шлёт — как bulk_create в seed_catalog
+        for name in ('cars/a.jpg', 'cars/b.jpg'):
+            Car.objects.filter(pk=make_car().pk).update(image=name)
+
+        moved, freed = adopt_legacy()
+        self.assertEqual((moved, freed), (2, len(data)))
+        names = set(Car.objects.exclude(image='').values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(default_storage.exists(names.pop()))
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        report = savings_report()
+        self.assertEqual(report['saved_bytes'], len(data))
+
+
+class AdminUploadTestCase(APITestCase):
+    """Админ и временный MEDIA_ROOT для загрузки фото через AdminCarViewSet."""
+
+    def setUp(self):
+        from api.models import User
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(admin)
+
+    def post(self, *files):
+        data = {
+            'brand': 'Toyota', 'model': 'Camry', 'year': 2020, 'price': '25000.00', 'car_type': 'sedan',
+            'fuel_type': 'petrol', 'transmission': 'automatic', 'phone': '+996555000000', 'images': list(files),
+        }
+        return self.client.post('/api/v1/cars/admin/cars/', data, format='multipart')
+
+    def jpeg(self, name='a.jpg', size=(640, 480)):
+        import io
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'green').save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class StreamingUploadTests(AdminUploadTestCase):
+    def test_valid_images_are_moved_into_hashed_storage(self):
+        response = self.post(self.jpeg('a.jpg'), self.jpeg('b.jpg'))
+        self.assertEqual(response.status_code, 201, response.content)
+        names = {image['image'].split('/media/')[-1] for image in response.json()['images']}
+        self.assertEqual(len(names), 1)  # одинаковое содержимое — один файл
+        self.assertRegex(names.pop(), r'^cars/gallery/[0-9a-f]{2}/[0-9a-f]{40}\.jpg$')
+        self.assertEqual(os.listdir(os.path.join(self.media_root, '.uploads')), [])
+
+    def test_non_image_is_rejected_per_field(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        response = self.post(self.jpeg(), SimpleUploadedFile('x.jpg', b'not an image' * 100))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('images', response.json())
+        self.assertFalse(Car.objects.exists())
+
+    @override_settings(CAR_IMAGE_MAX_SIZE=2048)
+    def test_size_limit_is_checked_while_streaming(self):
+        response = self.post(self.jpeg(size=(1600, 1200)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('больше', response.json()['images'][0])
+
+    @override_settings(CAR_IMAGE_MAX_PIXELS=1000)
+    def test_dimensions_are_read_from_header(self):
+        self.assertEqual(self.post(self.jpeg(size=(100, 100))).status_code, 400)
+
+
+class AdDeliveryTests(APITestCase):
+    def setUp(self):
+        from .ads import delivery
+        from .models import Ad
+        self.delivery = delivery
+        self.delivery.invalidate()
+        self.addCleanup(self.delivery.flush)
+        self.heavy = Ad.objects.create(title='Heavy', description='x', weight=50, image='ads/heavy.jpg')
+        self.light = Ad.objects.create(title='Light', description='x', weight=1)
+        Ad.objects.create(title='Off', description='x', is_active=False)
+
+    def test_public_and_served_from_snapshot(self):
+        self.assertEqual(self.client.get('/api/v1/cars/ads/active/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/cars/ads/active/', {'limit': 5})
+        titles = [ad['title'] for ad in response.json()]
+        self.assertEqual(sorted(titles), ['Heavy', 'Light'])
+        self.assertNotIn('impressions', response.json()[0])
+
+    def test_image_urls_are_absolute(self):
+        def images(**extra):
+            return {ad['title']: ad['image'] for ad in self.client.get('/api/v1/cars/ads/active/', **extra).json()}
+        self.assertEqual(images(), {'Heavy': 'http://testserver/media/ads/heavy.jpg', 'Light': None})
+        self.assertEqual(images(HTTP_HOST='other.example')['Heavy'], 'http://other.example/media/ads/heavy.jpg')
+        with override_settings(PUBLIC_BASE_URL='https://cars.example'):
+            self.assertEqual(images(HTTP_HOST='other.example')['Heavy'], 'https://cars.example/media/ads/heavy.jpg')
+
+    def test_weighted_rotation(self):
+        snapshot = self.delivery.snapshot()
+        import random
+        rng = random.Random(1)
+        first = [snapshot.ids[snapshot.pick(1, rng)[0]] for _ in range(500)]
+        self.assertGreater(first.count(self.heavy.id), 450)
+
+    def test_changes_are_picked_up(self):
+        self.client.get('/api/v1/cars/ads/active/')
+        self.light.title = 'Renamed'
+        self.light.save()
+        titles = [ad['title'] for ad in self.client.get('/api/v1/cars/ads/active/').json()]
+        self.assertIn('Renamed', titles)
+
+    def test_impressions_are_flushed_in_batches(self):
+        updated_at = self.heavy.updated_at
+        for _ in range(3):
+            self.client.get('/api/v1/cars/ads/active/', {'limit': 2})
+        self.delivery.flush()
+        self.heavy.refresh_from_db()
+        self.assertEqual(self.heavy.impressions, 3)
+        self.assertEqual(self.heavy.updated_at, updated_at)
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from api.models import User
+        from favorites.models import Favorite
+        from .models import CarImage
+        self.user = User.objects.create_user(email='u@example.com', password='x')
+        self.old = make_car(is_active=False, image='cars/old.jpg')
+        CarImage.objects.create(car=self.old, image='cars/gallery/old.jpg')
+        Favorite.objects.create(user=self.user, car=self.old)
+        self.old.price = Decimal('18000')
+        self.old.save()
+        self.recent = make_car(is_active=False)
+        self.active = make_car()
+        long_ago = timezone.now() - timedelta(days=400)
+        Car.objects.filter(id__in=[self.old.id, self.active.id]).update(updated_at=long_ago, created_at=long_ago)
+        self.created_at = Car.objects.get(id=self.old.id).created_at
+
+    def test_archive_moves_only_long_inactive_cars(self):
+        from favorites.models import Favorite
+        from .archive import archive_inactive
+        from .models import ArchivedCar, CarImage
+        self.assertEqual(archive_inactive(batch_size=1), 1)
+        self.assertFalse(Car.objects.filter(id=self.old.id).exists())
+        self.assertFalse(CarImage.objects.filter(car_id=self.old.id).exists())
+        self.assertFalse(Favorite.objects.filter(car_id=self.old.id).exists())
+        archived = ArchivedCar.objects.get()
+        self.assertEqual((archived.id, archived.images), (self.old.id, ['cars/gallery/old.jpg']))
+        self.assertEqual(archived.favorites[0][0], self.user.id)
+
+    def test_admin_can_browse_and_restore(self):
+        from api.models import User
+        from favorites.models import Favorite
+        from .archive import archive_inactive
+        from .blobs import referenced_counts
+        history = list(self.old.price_history.order_by('id').values_list('price', 'changed_at'))
+        self.assertEqual([price for price, _ in history], [Decimal('20000'), Decimal('18000')])
+        archive_inactive()
+        # Архив держит ссылки на файлы — gc_media их не удалит
+        self.assertEqual(referenced_counts()['cars/gallery/old.jpg'], 1)
+
+        self.client.force_authenticate(User.objects.create_user(email='a@example.com', password='x', is_staff=True))
+        listing = self.client.get('/api/v1/cars/admin/archive/', {'brand': 'Toyota'}).json()
+        self.assertEqual([row['id'] for row in listing['results']], [self.old.id])
+
+        response = self.client.post(f'/api/v1/cars/admin/archive/{self.old.id}/restore/')
+        self.assertEqual(response.status_code, 201)
+        car = Car.objects.get(id=self.old.id)
+        self.assertEqual((car.image.name, car.created_at, car.is_active), ('cars/old.jpg', self.created_at, False))
+        self.assertEqual(list(car.images.values_list('image', flat=True)), ['cars/gallery/old.jpg'])
+        self.assertTrue(Favorite.objects.filter(user=self.user, car=car).exists())
+        # История цен возвращается с исходными датами
+        self.assertEqual(list(car.price_history.order_by('id').values_list('price', 'changed_at')), history)
+
+    def test_active_car_cannot_be_archived(self):
+        from api.models import User
+        self.client.force_authenticate(User.objects.create_user(email='a@example.com', password='x', is_staff=True))
+        self.assertEqual(self.client.post(f'/api/v1/cars/admin/cars/{self.active.id}/archive/').status_code, 400)
+        self.assertEqual(self.client.post(f'/api/v1/cars/admin/cars/{self.recent.id}/archive/').status_code, 201)
+
+
+@mock.patch('cars.changes.SETTLE', timedelta(0))
+class ChangeFeedTests(APITestCase):
+    url = '/api/v1/cars/cars/changes/'
+
+    def make(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_car(**kwargs)
+
+    def test_sync_returns_compacted_upserts_and_tombstones(self):
+        from .models import CarImage
+        stays, hidden, gone = self.make(), self.make(), self.make()
+        cursor = self.client.get(self.url).json()['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stays.price = Decimal('19000')
+            stays.save()
+            CarImage.objects.create(car=stays, image='cars/gallery/x.jpg')
+            hidden.is_active = False
+            hidden.save()
+            gone_id = gone.id
+            gone.delete()
+            fresh = make_car()
+
+        data = self.client.get(self.url, {'since': cursor}).json()
+        self.assertEqual([car['id'] for car in data['upserts']], [stays.id, fresh.id])
+        self.assertEqual(data['upserts'][0]['price'], '19000.00')
+        self.assertEqual(sorted(data['deletes']), sorted([hidden.id, gone_id]))
+        self.assertFalse(data['has_more'])
+
+        # Нет изменений — пустой ответ с тем же курсором
+        empty = self.client.get(self.url, {'since': data['cursor']}).json()
+        self.assertEqual((empty['cursor'], empty['upserts'], empty['deletes']), (data['cursor'], [], []))
+
+    def test_pagination_by_sequence(self):
+        cursor = self.client.get(self.url).json()['cursor']
+        ids = [self.make().id for _ in range(5)]
+        seen = []
+        while True:
+            data = self.client.get(self.url, {'since': cursor, 'limit': 2}).json()
+            seen += [car['id'] for car in data['upserts']]
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, ids)
+
+    def test_pruned_cursor_requires_full_sync(self):
+        from django.utils import timezone
+        from .changes import prune
+        from .models import CarChange
+        cursor = self.client.get(self.url).json()['cursor']
+        for _ in range(3):
+            self.make()
+        CarChange.objects.update(created_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(prune(), 2)  # последняя запись остаётся
+        response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['cursor'], CarChange.objects.get().id)
+
+
+class CarStreamTests(TestCase):
+    url = '/api/v1/cars/stream/'
+
+    def setUp(self):
+        from . import stream
+        from .stream import InMemoryBroker, set_broker
+        self.broker = InMemoryBroker()
+        set_broker(self.broker)
+        self.addCleanup(set_broker, None)
+        slots = mock.patch.object(stream, 'slots', stream.StreamSlots())
+        self.slots = slots.start()
+        self.addCleanup(slots.stop)
+
+    def test_broker_fans_out_by_filter(self):
+        import asyncio
+        from . import stream
+
+        card = stream.car_card(make_car(brand='BMW', price=Decimal('30000')))
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            bmw = [self.broker.subscribe(self.make_filter(brand='BMW'), loop) for _ in range(2)]
+            cheap = self.broker.subscribe(self.make_filter(max_price='15000'), loop)
+            self.assertEqual(len(self.broker._groups), 2)  # одинаковые фильтры — одна группа
+
+            delivered = self.broker.dispatch(card)
+            await asyncio.sleep(0)
+            self.assertEqual(delivered, 2)
+            self.assertEqual([s.queue.qsize() for s in bmw + [cheap]], [1, 1, 0])
+            message = bmw[0].queue.get_nowait()
+            self.assertIn('event: car', message)
+            self.assertIn('"brand":"BMW"', message.replace(' ', ''))
+
+            for subscription in bmw + [cheap]:
+                self.broker.unsubscribe(subscription)
+            self.assertFalse(self.broker.has_subscribers)
+
+        asyncio.run(scenario())
+
+    def test_saved_car_is_published_after_commit(self):
+        with mock.patch.object(self.broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                make_car()
+            publish.assert_not_called()  # без подписчиков карточку не собираем
+
+            self.broker._groups['x'] = (self.make_filter(), [])
+            with self.captureOnCommitCallbacks(execute=True):
+                make_car(brand='Audi')
+                make_car(brand='Kia', is_active=False)
+        self.assertEqual([call.args[0]['match']['brand'] for call in publish.call_args_list], ['Audi'])
+
+    def test_overflow_closes_subscription(self):
+        import asyncio
+        from . import stream
+
+        async def scenario():
+            subscription = self.broker.subscribe(self.make_filter(), asyncio.get_running_loop())
+            for i in range(stream.QUEUE_SIZE + 1):
+                subscription.offer(f'event {i}')
+            self.assertEqual(subscription.queue.qsize(), 1)
+            self.assertIsNone(subscription.queue.get_nowait())
+
+        asyncio.run(scenario())
+
+    def test_redis_broker_keeps_exact_price_and_reconnects(self):
+        import json
+        import sys
+        from . import stream
+
+        published, received = [], []
+
+        class PubSub:
+            attempts = 0
+
+            def subscribe(self, channel):
+                PubSub.attempts += 1
+                if PubSub.attempts == 1:
+                    raise ConnectionError('redis down')
+
+            def listen(self):
+                for data in published:
+                    yield {'data': data}
+                raise SystemExit  # завершает поток слушателя
+
+            def close(self):
+                pass
+
+        fake_redis = mock.Mock()
+        client = fake_redis.Redis.from_url.return_value
+        client.pubsub.side_effect = lambda **kwargs: PubSub()
+        client.publish.side_effect = lambda channel, data: published.append(data)
+        with mock.patch.dict(sys.modules, {'redis': fake_redis}), \
+                mock.patch.object(stream, 'REDIS_RETRY_SECONDS', 0), self.assertLogs('cars.stream', 'ERROR'):
+            broker = stream.RedisBroker('redis://localhost')
+            broker.publish(stream.car_card(make_car(price=Decimal('19999.99'))))
+            with mock.patch.object(broker, 'dispatch', side_effect=received.append):
+                broker.subscribe(self.make_filter(), mock.Mock())
+                broker._listener.join(5)
+        # Первая ошибка Redis не остановила слушателя
+        self.assertEqual(PubSub.attempts, 2)
+        # Цена на границе фильтра после JSON — та же, а не 19999.98999…
+        car = stream.SimpleNamespace(**received[0]['match'])
+        self.assertTrue(self.make_filter(min_price='19999.99').matches(car))
+        self.assertFalse(self.make_filter(min_price='20000').matches(car))
+
+    async def test_invalid_filter(self):
+        response = await self.async_client.get(self.url, {'min_year': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_wsgi_is_refused(self):
+        # Под WSGI бесконечный поток занял бы воркер навсегда
+        self.assertEqual(self.client.get(self.url).status_code, 501)
+
+    @override_settings(CAR_STREAM_MAX_SUBSCRIBERS=2, CAR_STREAM_MAX_PER_CLIENT=1)
+    async def test_subscription_limits(self):
+        self.assertIsNone(self.slots.acquire('127.0.0.1'))
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 429)
+        self.assertIsNone(self.slots.acquire('10.0.0.1'))
+        response = await self.async_client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 503)
+        self.slots.release('127.0.0.1')
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        await anext(aiter(response.streaming_content))
+        response.close()
+        response.close()
+        self.assertEqual(self.slots._clients, {'10.0.0.1': 1})
+
+    async def test_event_stream_response(self):
+        response = await self.async_client.get(self.url, {'brand': 'BMW'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertIn(b'retry:', await anext(events))
+        card = {'match': {'brand': 'BMW'}, 'data': '{"id": 1}'}
+        self.broker.dispatch(card)
+        self.assertIn(b'data: {"id": 1}', await anext(events))
+
+    @staticmethod
+    def make_filter(**params):
+        car_filter = CarFilter(params)
+        car_filter.is_valid(raise_exception=True)
+        return car_filter
+
+
+class MarketStatsTests(APITestCase):
+    url = '/api/v1/cars/cars/market_stats/'
+
+    def test_price_changes_are_appended_to_history(self):
+        from .models import PriceHistory
+        car = make_car(price=Decimal('20000'))
+        car.mileage = 60000
+        car.save()
+        car = Car.objects.get(id=car.id)
+        car.price = Decimal('18500')
+        car.save()
+        history = self.client.get(f'/api/v1/cars/cars/{car.id}/price_history/').json()
+        self.assertEqual([row['price'] for row in history], ['20000.00', '18500.00'])
+        self.assertEqual(PriceHistory.objects.count(), 2)
+
+    def test_refresh_recomputes_only_dirty_groups(self):
+        from . import market
+        from .models import MarketStat
+        for price in (10000, 20000, 30000, 40000):
+            make_car(brand='BMW', model='X5', year=2019, price=Decimal(price))
+        make_car(brand='BMW', model='X5', year=2012, price=Decimal('9000'))
+        self.assertEqual(market.refresh(), (2, 0))
+        self.assertEqual(market.refresh(), (0, 0))
+
+        stats = self.client.get(self.url, {'brand': 'BMW', 'model': 'X5', 'year': 2019}).json()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual((stats[0]['year_from'], stats[0]['year_to'], stats[0]['count']), (2019, 2021, 4))
+        self.assertEqual(stats[0]['price_median'], '25000.00')
+
+        # Снятие с продажи помечает группу; пустая группа удаляется
+        old = Car.objects.get(year=2012)
+        old.is_active = False
+        old.save()
+        self.assertEqual(list(MarketStat.objects.filter(dirty=True).values_list('year_from', flat=True)), [2010])
+        self.assertEqual(market.refresh(), (0, 1))
+        self.assertEqual(len(self.client.get(self.url, {'brand': 'BMW'}).json()), 1)
+
+    def test_rebuild_matches_incremental_refresh(self):
+        from . import market
+        from .models import MarketStat
+        for i in range(6):
+            make_car(brand='Kia', model='Rio', year=2015 + i, price=Decimal(8000 + 500 * i))
+        market.refresh()
+        incremental = list(MarketStat.objects.order_by('year_from').values('year_from', 'count', 'price_median'))
+        self.assertEqual(market.rebuild(), 3)
+        self.assertEqual(list(MarketStat.objects.order_by('year_from').values('year_from', 'count', 'price_median')),
+                         incremental)
+
+    def test_brand_is_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'brand': 'BMW', 'year': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'brand': 'B' * 101}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'brand': 'BMW', 'model': 'X' * 101}).status_code, 400)
+
+    def test_cache_key_is_safe_for_memcached(self):
+        from django.core.cache import cache
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.assertEqual(self.client.get(self.url, {'brand': 'Land Rover', 'model': 'Ж' * 100}).json(), [])
+        key = cache_set.call_args.args[0]
+        self.assertLess(len(key), 250)
+        self.assertNotIn(' ', key)
+
+
+class InstallmentQuoteTests(APITestCase):
+    def setUp(self):
+        from .installments import registry
+        self.registry = registry
+        self.registry.invalidate()
+        self.addCleanup(self.registry.invalidate)
+
+    def test_annuity_formula(self):
+        from .installments import monthly_payments
+        table = monthly_payments([12000, 24000], [12, 12], [0, 12], [0, 25])
+        self.assertAlmostEqual(table[0, 0], 1000)
+        self.assertAlmostEqual(table[1, 0], 2000)
+        # 18000 на 12 мес. под 1% в месяц
+        self.assertAlmostEqual(table[1, 1], 18000 * 0.01 / (1 - 1.01 ** -12), places=6)
+
+    def test_list_quotes_default_plans(self):
+        make_car(price=Decimal('12000'))
+        make_car(price=Decimal('12000'), installment=False)
+        cars = self.client.get('/api/v1/cars/cars/').json()['results']
+        with_plan = next(car for car in cars if car['installment'])
+        self.assertEqual(with_plan['installment_months'], [6, 9, 12])
+        self.assertEqual([q['monthly_payment'] for q in with_plan['installment_quotes']],
+                         ['2000.00', '1333.33', '1000.00'])
+        without = next(car for car in cars if not car['installment'])
+        self.assertEqual((without['installment_months'], without['installment_quotes']), ([], []))
+
+    def test_plan_changes_apply_immediately(self):
+        from .models import InstallmentPlan
+        car = make_car(price=Decimal('10000'))
+        InstallmentPlan.objects.exclude(months=12).update(is_active=False)
+        InstallmentPlan.objects.create(name='24', months=24, annual_rate=Decimal('12'), down_payment=Decimal('20'))
+        data = self.client.get(f'/api/v1/cars/cars/{car.id}/').json()
+        self.assertEqual(data['installment_months'], [12, 24])
+        self.assertEqual(data['installment_quotes'][1]['down_payment'], '2000.00')
+        self.assertEqual(data['installment_quotes'][1]['monthly_payment'], '376.59')
+
+    def test_page_quotes_cost_no_queries_once_plans_are_loaded(self):
+        from .installments import attach_quotes
+        cars = [make_car(price=Decimal(10000 + i)) for i in range(20)]
+        self.registry.snapshot()
+        with self.assertNumQueries(0):
+            attach_quotes(list(cars))
+        self.assertEqual(len(cars[5]._installment_quotes), 3)
+
+    def test_quote_cache_overflow_keeps_page_quotes(self):
+        from . import installments
+        snapshot = self.registry.snapshot()
+        with mock.patch.object(installments, 'QUOTE_CACHE_SIZE', 3):
+            snapshot.quotes([Decimal(1), Decimal(2), Decimal(3)])
+            # Цена 1 была в кеше, но переполнение его очищает
+            first, fourth = snapshot.quotes([Decimal(1), Decimal(4)])
+        self.assertEqual(first[0]['monthly_payment'], f'{1 / 6:.2f}')
+        self.assertEqual(len(fourth), 3)
+
+
+class CarAdminTests(TestCase):
+    url = '/admin/cars/car/'
+
+    def setUp(self):
+        from api.models import User
+        self.admin = User.objects.create_superuser('root@example.com', 'pass')
+        self.client.force_login(self.admin)
+
+    def test_changelist_search_is_exact_and_skips_full_count(self):
+        camry = make_car(brand='Toyota', model='Camry')
+        make_car(brand='Toyota', model='Corolla')
+        make_car(brand='Honda', model='Camry Hybrid')
+
+        response = self.client.get(self.url, {'q': 'toyota camry'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [camry])
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+        by_id = self.client.get(self.url, {'q': str(camry.id)})
+        self.assertEqual(list(by_id.context['cl'].result_list), [camry])
+
+        change = self.client.get(f'{self.url}{camry.id}/change/')
+        self.assertEqual(change.status_code, 200)
+
+    def test_bulk_actions_update_in_one_statement(self):
+        from . import market
+        from .cache import catalog_version
+        from .models import CarChange, MarketStat
+        cars = [make_car(year=2019) for _ in range(3)]
+        make_car(brand='Honda', model='Civic')
+        market.rebuild()
+        version = catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {
+                'action': 'deactivate', '_selected_action': [car.id for car in cars],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "cars_car"')]), 1)
+        self.assertEqual(Car.objects.filter(is_active=False).count(), 3)
+        self.assertEqual(catalog_version(), version + 1)
+        self.assertEqual(CarChange.objects.filter(car_id__in=[car.id for car in cars]).count(), 3)
+        self.assertTrue(MarketStat.objects.get(brand='Toyota').dirty)
+        self.assertFalse(MarketStat.objects.get(brand='Honda').dirty)
+
+
+
+class CarBulkApiTests(APITestCase):
+    url = '/api/v1/cars/admin/cars/bulk/'
+
+    def setUp(self):
+        from api.models import User
+        self.client.force_authenticate(User.objects.create_superuser('root@example.com', 'pass'))
+
+    def test_deactivate_by_ids_bumps_catalog_once(self):
+        from .cache import catalog_version
+        cars = [make_car() for _ in range(3)]
+        version = catalog_version()
+        response = self.client.post(self.url, {'action': 'deactivate', 'ids': [cars[0].id, cars[1].id]}, format='json')
+        self.assertEqual(response.json(), {'action': 'deactivate', 'updated': 2})
+        self.assertEqual(catalog_version(), version + 1)
+        self.assertEqual(list(Car.objects.filter(is_active=True)), [cars[2]])
+
+        # Повтор ничего не меняет и кеш не трогает
+        response = self.client.post(self.url, {'action': 'deactivate', 'ids': [cars[0].id]}, format='json')
+        self.assertEqual(response.json()['updated'], 0)
+        self.assertEqual(catalog_version(), version + 1)
+
+    def test_adjust_price_by_filter_writes_history(self):
+        from .models import PriceHistory
+        bmw = make_car(brand='BMW', price=Decimal('10000.00'))
+        other = make_car(brand='Toyota', price=Decimal('10000.00'))
+        PriceHistory.objects.all().delete()
+
+        response = self.client.post(self.url, {
+            'action': 'adjust_price', 'percent': '-12.5', 'query': {'brand': ['BMW']},
+        }, format='json')
+        self.assertEqual(response.json()['updated'], 1)
+        bmw.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(bmw.price, Decimal('8750.00'))
+        self.assertEqual(other.price, Decimal('10000.00'))
+        self.assertEqual(list(PriceHistory.objects.values_list('car_id', 'price')), [(bmw.id, Decimal('8750.00'))])
+
+        response = self.client.post(self.url, {'action': 'set_price', 'price': '9999.99', 'ids': [bmw.id, other.id]},
+                                    format='json')
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(set(Car.objects.values_list('price', flat=True)), {Decimal('9999.99')})
+
+    def test_adjust_price_cannot_overflow_price_column(self):
+        top = make_car(brand='BMW', price=Decimal('5000000000.00'))
+        make_car(brand='Toyota', price=Decimal('4999999999.99'))
+        response = self.client.post(self.url, {'action': 'adjust_price', 'percent': '100', 'query': {'brand': 'BMW'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('percent', response.json())
+        top.refresh_from_db()
+        self.assertEqual(top.price, Decimal('5000000000.00'))
+
+        response = self.client.post(self.url, {'action': 'adjust_price', 'percent': '100', 'query': {'brand': 'Toyota'}},
+                                    format='json')
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(Car.objects.get(brand='Toyota').price, Decimal('9999999999.98'))
+        # Снижение цены не упирается в максимум
+        response = self.client.post(self.url, {'action': 'adjust_price', 'percent': '-10', 'ids': [top.id]},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rejects_ambiguous_or_unbounded_targets(self):
+        car = make_car()
+        for body in (
+            {'action': 'activate'},
+            {'action': 'activate', 'ids': [car.id], 'query': {'brand': 'Toyota'}},
+            {'action': 'activate', 'query': {}},
+            {'action': 'activate', 'query': {'ordering': 'price'}},
+            {'action': 'set_price', 'ids': [car.id]},
+            {'action': 'adjust_price', 'ids': [car.id], 'percent': '-95'},
+        ):
+            self.assertEqual(self.client.post(self.url, body, format='json').status_code, 400, body)
+
+
+class CarDetailCacheTests(APITestCase):
+    def setUp(self):
+        from . import detail
+        self.detail = detail
+        detail.local.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car = make_car()
+        self.url = f'/api/v1/cars/cars/{self.car.id}/'
+
+    def test_second_request_is_served_from_memory_then_shared_cache(self):
+        self.assertEqual(self.client.get(self.url).json()['price'], '20000.00')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Другой процесс: пустой LRU, карточка из общего кеша
+        self.detail.local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).json()['id'], self.car.id)
+
+    def test_changes_and_deactivation_invalidate(self):
+        from .models import CarImage
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.price = Decimal('15000')
+            self.car.save()
+        self.assertEqual(self.client.get(self.url).json()['price'], '15000.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            CarImage.objects.create(car=self.car, image='cars/gallery/x.jpg')
+        self.assertEqual(len(self.client.get(self.url).json()['images']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.set_active(Car.objects.filter(id=self.car.id), False)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/cars/cars/abc/').status_code, 404)
+
+    def test_one_cached_card_for_all_hosts(self):
+        from django.core.cache import cache
+        Car.objects.filter(id=self.car.id).update(image='cars/main.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.detail.invalidate([self.car.id])
+        self.assertEqual(self.client.get(self.url).json()['image'], 'http://testserver/media/cars/main.jpg')
+        with self.assertNumQueries(0):
+            data = self.client.get(self.url, HTTP_HOST='evil.example').json()
+        self.assertEqual(data['image_thumbnail'], 'http://evil.example/media/renditions/320/cars/main.jpg')
+        with self.settings(PUBLIC_BASE_URL='https://cars.example'), self.assertNumQueries(0):
+            data = self.client.get(self.url, HTTP_HOST='evil.example').json()
+        self.assertEqual(data['image'], 'https://cars.example/media/cars/main.jpg')
+
+        # Несуществующий id не оставляет версии в общем кеше
+        self.assertEqual(self.client.get('/api/v1/cars/cars/987654/').status_code, 404)
+        self.assertIsNone(cache.get(self.detail._version_key(987654)))
+
+    def test_is_favorite_is_per_user(self):
+        from api.models import User
+        from favorites.models import Favorite
+        fan = User.objects.create_user('fan@example.com', 'pass')
+        Favorite.objects.create(user=fan, car=self.car)
+        self.client.force_authenticate(fan)
+        self.assertTrue(self.client.get(self.url).json()['is_favorite'])
+        self.client.force_authenticate(None)
+        self.assertFalse(self.client.get(self.url).json()['is_favorite'])
+
+    def test_single_flight_computes_once(self):
+        import threading
+        import time
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(1)
+            return 'card'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.detail.flight.do('k', compute)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)  # все потоки успевают встать в ожидание первого
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['card'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class GeoSearchTests(APITestCase):
+    url = '/api/v1/cars/cars/'
+    BISHKEK = (42.8746, 74.5698)
+
+    def test_geohash_and_cover(self):
+        from . import geo
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        rng = __import__('random').Random(1)
+        for radius in (0.5, 5, 50, 300):
+            ranges = geo.cover(*self.BISHKEK, radius)
+            self.assertLessEqual(len(ranges), geo.MAX_CELLS)
+            for _ in range(200):
+                lat = self.BISHKEK[0] + rng.uniform(-1, 1) * radius / 111
+                lon = self.BISHKEK[1] + rng.uniform(-1, 1) * radius / 80
+                if geo.distance_km(*self.BISHKEK, lat, lon) > radius:
+                    continue
+                cell = geo.encode(lat, lon)
+                self.assertTrue(any(start <= cell and (end is None or cell < end) for start, end in ranges),
+                                (radius, lat, lon))
+
+    def test_radius_search_combines_with_filters_and_sorts_by_distance(self):
+        center = make_car(city='Бишкек', latitude=42.8746, longitude=74.5698)
+        near = make_car(city='Бишкек', latitude=42.90, longitude=74.62, price=Decimal('15000'))
+        make_car(city='Токмок', latitude=42.8421, longitude=75.3015)
+        make_car(city='Ош', latitude=40.5140, longitude=72.8161)
+        make_car()  # без координат
+        self.assertEqual(center.geohash[:5], 'txt5b')
+
+        data = self.client.get(self.url, {'lat': 42.8746, 'lon': 74.5698, 'radius': 10,
+                                          'ordering': 'distance'}).json()
+        self.assertEqual([car['id'] for car in data['results']], [center.id, near.id])
+        self.assertEqual(data['results'][0]['distance_km'], 0.0)
+        self.assertGreater(data['results'][1]['distance_km'], 3)
+
+        data = self.client.get(self.url, {'lat': 42.8746, 'lon': 74.5698, 'radius': 80, 'max_price': 16000}).json()
+        self.assertEqual([car['id'] for car in data['results']], [near.id])
+        self.assertEqual(self.client.get(self.url, {'lat': 42.8746, 'lon': 74.5698, 'radius': 80}).json()['count'], 3)
+
+    def test_validation(self):
+        for params in ({'lat': 42}, {'lat': 91, 'lon': 74}, {'lat': 42, 'lon': 74, 'radius': 501},
+                       {'ordering': 'distance'}, {'lat': 'x', 'lon': 74}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+    def test_filter_matches_in_memory(self):
+        car = make_car(latitude=42.90, longitude=74.62)
+        self.assertTrue(CarFilter(QueryDict('lat=42.8746&lon=74.5698&radius=10')).matches(car))
+        self.assertFalse(CarFilter(QueryDict('lat=42.8746&lon=74.5698&radius=2')).matches(car))
+        self.assertFalse(CarFilter(QueryDict('lat=42.8746&lon=74.5698')).matches(make_car()))
+        spec = CarFilter(QueryDict('lat=42.8746&lon=74.5698&radius=10')).dump()
+        self.assertEqual(CarFilter.from_spec(spec).dump(), spec)
+
+
+class AutocompleteTests(APITestCase):
+    url = '/api/v1/cars/cars/autocomplete/'
+
+    def setUp(self):
+        from .autocomplete import registry
+        registry.invalidate()
+        self.addCleanup(registry.invalidate)
+        for model, count in (('Camry', 3), ('Corolla', 2), ('Land Cruiser', 1)):
+            for _ in range(count):
+                make_car(model=model)
+        make_car(brand='BMW', model='X5')
+        make_car(brand='Mercedes-Benz', model='E-Class')
+        make_car(brand='Lada', model='Vesta', is_active=False)
+
+    def labels(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(item['label'], item['count']) for item in response.json()['results']]
+
+    def test_prefix_with_counts(self):
+        self.assertEqual(self.labels('toy'), [('Toyota', 6), ('Toyota Camry', 3), ('Toyota Corolla', 2),
+                                              ('Toyota Land Cruiser', 1)])
+        self.assertEqual(self.labels('toyota co'), [('Toyota Corolla', 2)])
+        self.assertEqual(self.labels('land'), [('Toyota Land Cruiser', 1)])
+        self.assertEqual(self.labels('toy', limit=2), [('Toyota', 6), ('Toyota Camry', 3)])
+        self.assertEqual(self.labels('lada'), [])
+        self.assertEqual(self.labels(''), [])
+
+    def test_transliteration_and_typos(self):
+        self.assertEqual(self.labels('камри'), [('Toyota Camry', 3)])
+        self.assertEqual(self.labels('тойота кам'), [('Toyota Camry', 3)])
+        self.assertEqual(self.labels('мерседес')[0], ('Mercedes-Benz', 1))
+        self.assertEqual(self.labels('бмв')[0], ('BMW', 1))
+        self.assertEqual(self.labels('х5'), [('BMW X5', 1)])  # кириллическая «х»
+        self.assertEqual(self.labels('toyta')[0], ('Toyota', 6))
+        self.assertEqual(self.labels('corola'), [('Toyota Corolla', 2)])
+        self.assertEqual(self.labels('kamyr'), [('Toyota Camry', 3)])
+        self.assertEqual(self.labels('qwerty'), [])
+
+    def test_refreshes_after_catalog_change(self):
+        from .autocomplete import registry
+        self.assertEqual(self.labels('vesta'), [])
+        Car.objects.filter(brand='Lada').update(is_active=True)
+        self.assertEqual(self.labels('vesta'), [])  # снимок ещё не проверял версию каталога
+        make_car(brand='Lada', model='Vesta')
+        registry.invalidate()
+        self.assertEqual(self.labels('vesta'), [('Lada Vesta', 2)])
+
+    def test_answers_without_queries_and_validates_limit(self):
+        self.labels('toy')
+        with CaptureQueriesContext(connection) as queries:
+            self.labels('cam')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.client.get(self.url, {'q': 'toy', 'limit': 'x'}).status_code, 400)
+
+
+class ResponseFormatTests(APITestCase):
+    url = '/api/v1/cars/cars/'
+
+    def test_list_formats_carry_the_same_data(self):
+        import json
+        import msgpack
+        from core.renderers import from_columns
+        for n in range(3):
+            make_car(price=Decimal(10000 + n))
+        plain = self.client.get(self.url).json()
+        packed = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(packed['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(packed.content), plain)
+        columnar = self.client.get(self.url, {'format': 'columnar'})
+        self.assertEqual(columnar['Content-Type'], 'application/vnd.columnar+json')
+        page = json.loads(columnar.content)
+        self.assertEqual(from_columns(page['results']), plain['results'])
+        self.assertEqual(page['count'], 3)
+
+
+class GallerySummaryTests(AdminUploadTestCase):
+    """Обложка и число фото на самой машине (cars/gallery.py)."""
+
+    def test_create_and_update_keep_summary(self):
+        response = self.post(self.jpeg('a.jpg'), self.jpeg('b.jpg', size=(320, 240)))
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual(data['images_count'], 2)
+        first = data['images'][0]['image'].split('/media/')[-1]
+        self.assertTrue(data['cover_thumbnail'].endswith(f'/media/renditions/320/{first}'))
+
+        car = Car.objects.get(id=data['id'])
+        response = self.client.patch(f'/api/v1/cars/admin/cars/{car.id}/', {'images': [self.jpeg('c.jpg')]},
+                                     format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        car.refresh_from_db()
+        self.assertEqual(car.images_count, 1)
+        self.assertEqual(car.cover_thumbnail, f'renditions/320/{car.images.get().image.name}')
+
+    def test_main_image_wins_and_refresh_skips_unchanged(self):
+        from . import gallery
+        from .models import CarImage
+        car = make_car(image='cars/main.jpg')
+        CarImage.objects.create(car=car, image='cars/gallery/one.jpg')
+        self.assertEqual(gallery.refresh([car.id]), 1)
+        car.refresh_from_db()
+        self.assertEqual((car.cover_thumbnail, car.images_count), ('renditions/320/cars/main.jpg', 1))
+        self.assertEqual(gallery.refresh([car.id]), 0)
+
+    def test_list_cards_do_not_touch_gallery(self):
+        for n in range(3):
+            make_car(price=Decimal(10000 + n), images_count=2, cover_thumbnail=f'renditions/320/cars/{n}.jpg')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/cars/cars/')
+        self.assertEqual(response.status_code, 200)
+        card = response.json()['results'][0]
+        self.assertNotIn('images', card)
+        self.assertEqual(card['images_count'], 2)
+        self.assertFalse([q for q in queries.captured_queries if 'cars_carimage' in q['sql']])
@@ -0,0 +1,175 @@
+# cars/uploads.py
+"""
+Потоковый приём фото машин (multipart).
+
+Стандартная цепочка: обработчики Django копят файл в памяти или /tmp, ImageField открывает его
+Pillow, ContentHashStorage перечитывает для хеша и копирует в MEDIA_ROOT. Здесь всё делается
+за один проход по чанкам:
+- лимит размера проверяется на каждом чанке, лишние файлы отбрасываются до записи;
+- заголовок картинки разбирается Image.open по первым килобайтам — формат и размеры без декодирования
+  пикселей (ImageFile.Parser не подходит: после заголовка он выделяет буфер под весь кадр);
+- sha256 считается на лету, а временный файл лежит в MEDIA_ROOT, так что сохранение — это rename.
+
+Ошибки копятся в обработчике и отдаются как 400 из ImageMultiPartParser.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+from rest_framework.parsers import MultiPartParser
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+HEADER_PROBE_LIMIT = 256 * 1024  # EXIF в JPEG бывает до 64 КБ, берём с запасом
+MAX_FILES = 11  # главное фото + 10 в галерее
+UPLOAD_TEMP_DIR = '.uploads'
+
+
+def upload_temp_dir():
+    path = os.path.join(settings.MEDIA_ROOT, UPLOAD_TEMP_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class UploadedImage(UploadedFile):
+    """Проверенная при приёме картинка во временном файле рядом с MEDIA_ROOT."""
+
+    def __init__(self, name, content_type, charset=None, content_type_extra=None):
+        file = tempfile.NamedTemporaryFile(suffix='.upload', dir=upload_temp_dir())
+        super().__init__(file, name, content_type, 0, charset, content_type_extra)
+        self.sha256 = None
+        self.image_format = None
+        self.width = self.height = None
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # Файл уже перенесён хранилищем (rename)
+            pass
+
+
+class ImageUploadHandler(FileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.CAR_IMAGE_MAX_SIZE
+        self.max_pixels = settings.CAR_IMAGE_MAX_PIXELS
+        self.errors = {}
+        self.files_seen = 0
+
+    def reject(self, message):
+        self.errors.setdefault(self.field_name, []).append(f'{self.file_name}: {message}')
+        self._discard()
+        raise SkipFile
+
+    def _discard(self):
+        if getattr(self, 'upload', None) is not None:
+            self.upload.close()
+            self.upload = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Тело заведомо больше MAX_FILES файлов — не читаем его вовсе
+        if content_length and content_length > MAX_FILES * self.max_size + 2**20:
+            self.errors.setdefault('non_field_errors', []).append('Слишком большой запрос.')
+            raise StopUpload(connection_reset=True)
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.upload = None
+        self.files_seen += 1
+        if self.files_seen > MAX_FILES:
+            self.reject(f'не больше {MAX_FILES} файлов в запросе.')
+        if content_length and content_length > self.max_size:
+            self.reject('файл слишком большой.')
+        self.upload = UploadedImage(file_name, content_type, charset, content_type_extra)
+        self.digest = hashlib.sha256()
+        self.header = bytearray()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.reject(f'файл больше {filesizeformat(self.max_size)}.')
+        if self.upload.image_format is None and self.header is not None:
+            self.header += raw_data
+            self._probe(io.BytesIO(self.header), final=False)
+            if self.header is not None and len(self.header) >= HEADER_PROBE_LIMIT:
+                # Заголовок не уместился (WebP разбирается только целиком) — проверим в file_complete
+                self.header = None
+        self.digest.update(raw_data)
+        self.upload.write(raw_data)
+        return None
+
+    def _probe(self, source, final):
+        try:
+            with Image.open(source) as image:
+                image_format, (width, height) = image.format, image.size
+        except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+            if final:
+                self.reject('файл не является изображением.')
+            return
+        if image_format not in ALLOWED_FORMATS:
+            self.reject(f'формат {image_format} не поддерживается.')
+        if width * height > self.max_pixels:
+            self.reject(f'слишком большое разрешение {width}×{height}.')
+        self.upload.image_format, self.upload.width, self.upload.height = image_format, width, height
+        self.header = None
+
+    def file_complete(self, file_size):
+        if self.upload is None:
+            return None
+        self.upload.file.flush()
+        if self.upload.image_format is None:
+            try:
+                self._probe(self.upload.temporary_file_path(), final=True)
+            except SkipFile:
+                # Отсюда SkipFile парсер не ловит — просто не отдаём файл
+                return None
+        upload, self.upload = self.upload, None
+        upload.file.seek(0)
+        upload.size = file_size
+        upload.sha256 = self.digest.hexdigest()
+        return upload
+
+    def upload_interrupted(self):
+        self._discard()
+
+
+class ImageMultiPartParser(MultiPartParser):
+    """MultiPartParser с ImageUploadHandler; ошибки приёма файлов — 400 по полям."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        if not settings.CAR_UPLOAD_STREAMING:
+            return super().parse(stream, media_type, parser_context)
+        handler = ImageUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        try:
+            result = super().parse(stream, media_type, parser_context)
+        except StopUpload:
+            # handle_raw_input вызывается до цикла разбора, и Django это исключение не ловит
+            raise serializers.ValidationError(handler.errors)
+        if handler.errors:
+            for files in result.files.lists():
+                for upload in files[1]:
+                    upload.close()
+            raise serializers.ValidationError(handler.errors)
+        return result
+
+
+class UploadedImageField(serializers.ImageField):
+    """ImageField, который не открывает Pillow повторно для файлов, проверенных при приёме."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedImage) and data.image_format:
+            return serializers.FileField.to_internal_value(self, data)
+        return super().to_internal_value(data)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import stream, views
 
 # ======= User endpoints =======
 user_router = DefaultRouter()
@@ -10,9 +10,12 @@ user_router.register(r'ads', views.AdViewSet, basename='ads')           # /api/v
 # ======= Admin endpoints =======
 admin_router = DefaultRouter()
 admin_router.register(r'cars', views.AdminCarViewSet, basename='admin-cars')  # /api/v1/admin/cars/
+admin_router.register(r'archive', views.AdminArchivedCarViewSet, basename='admin-archive')  # /api/v1/admin/archive/
+admin_router.register(r'installment-plans', views.AdminInstallmentPlanViewSet, basename='admin-installment-plans')
 
 urlpatterns = [
     # --- User block ---
+    path('stream/', stream.car_stream, name='cars-stream'),  # /api/v1/cars/stream/ (SSE, ASGI)
     path('', include(user_router.urls)),
 
     # --- Admin block ---
@@ -1,22 +1,35 @@
 # cars/views.py
-from django.db.models import Q, Count
+from django.db import transaction
+from django.http import Http404, HttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
-from rest_framework.parsers import MultiPartParser, FormParser
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.settings import api_settings
+from activity import events as activity
+from core.media import absolutize, public_base_url
+from core.openapi import no_body, openapi, swagger_auto_schema
+from core.renderers import ColumnarJSONRenderer
 
-from .models import Car, CarImage, Ad
-from .serializers import CarSerializer, CarCreateSerializer, CarImageSerializer, AdSerializer
+from . import ads, archive, autocomplete, bulk, detail, gallery, market, similar
+from . import changes as car_changes
+from .filters import CarFilter
+from .models import Ad, ArchivedCar, Car, CarImage, InstallmentPlan
+from .pagination import CarPagination
+from .serializers import (
+    MEDIA_URL_FIELDS, AdSerializer, ArchivedCarDetailSerializer, ArchivedCarSerializer, CarBulkSerializer, CarCardSerializer,
+    CarCreateSerializer, CarFormSchemaSerializer,
+    CarImageSerializer, CarSerializer, InstallmentPlanSerializer, PublicAdSerializer,
+)
+from .uploads import ImageMultiPartParser
 from favorites.models import Favorite
 
 
 class AdminCarViewSet(viewsets.ModelViewSet):
     queryset = Car.objects.all()
     permission_classes = [IsAdminUser]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [ImageMultiPartParser, FormParser]
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -26,34 +39,25 @@ class AdminCarViewSet(viewsets.ModelViewSet):
     @swagger_auto_schema(
         operation_summary="Список машин (админ)",
         manual_parameters=[
-            openapi.Parameter('search', openapi.IN_QUERY, type=openapi.TYPE_STRING),
             openapi.Parameter('is_active', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
-            openapi.Parameter('min_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
-            openapi.Parameter('max_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
-        ],
+        ] + CarFilter.openapi_parameters(),
         tags=['Админ Машины']
     )
     def list(self, request, *args, **kwargs):
         qs = self.get_queryset()
 
-        if search := request.query_params.get('search'):
-            qs = qs.filter(Q(brand__icontains=search) | Q(model__icontains=search))
-
         if (is_active := request.query_params.get('is_active')) is not None:
             is_active_bool = str(is_active).lower() in ('true', '1', 'yes', 'on')
             qs = qs.filter(is_active=is_active_bool)
 
-        if min_price := request.query_params.get('min_price'):
-            qs = qs.filter(price__gte=min_price)
-        if max_price := request.query_params.get('max_price'):
-            qs = qs.filter(price__lte=max_price)
+        qs = CarFilter(request.query_params).filter_queryset(qs)
 
         serializer = self.get_serializer(qs, many=True)
         return Response(serializer.data)
 
     @swagger_auto_schema(
         operation_summary="Создать машину",
-        request_body=CarCreateSerializer,
+        request_body=CarFormSchemaSerializer,
         consumes=['multipart/form-data'],
         manual_parameters=[
             openapi.Parameter('images', openapi.IN_FORM, type=openapi.TYPE_FILE, multiple=True),
@@ -64,16 +68,17 @@ class AdminCarViewSet(viewsets.ModelViewSet):
         images_data = request.FILES.getlist('images')
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        car = serializer.save()
-
-        for img in images_data[:10]:
-            CarImage.objects.create(car=car, image=img)
+        with transaction.atomic():
+            car = serializer.save()
+            for img in images_data[:10]:
+                CarImage.objects.create(car=car, image=img)
+            self._refresh_gallery(car)
 
         return Response(CarSerializer(car, context=self.get_serializer_context()).data, status=201)
 
     @swagger_auto_schema(
         operation_summary="Обновить машину",
-        request_body=CarCreateSerializer,
+        request_body=CarFormSchemaSerializer,
         consumes=['multipart/form-data'],
         manual_parameters=[
             openapi.Parameter('images', openapi.IN_FORM, type=openapi.TYPE_FILE, multiple=True),
@@ -85,7 +90,7 @@ class AdminCarViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         operation_summary="Частичное обновление машины",
-        request_body=CarCreateSerializer,
+        request_body=CarFormSchemaSerializer,
         consumes=['multipart/form-data'],
         manual_parameters=[
             openapi.Parameter('images', openapi.IN_FORM, type=openapi.TYPE_FILE, multiple=True),
@@ -101,30 +106,262 @@ class AdminCarViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(car, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        car = serializer.save()
-
-        if images_data:
-            car.images.all().delete()
-            for img in images_data[:10]:
-                CarImage.objects.create(car=car, image=img)
+        with transaction.atomic():
+            car = serializer.save()
+            if images_data:
+                car.images.all().delete()
+                for img in images_data[:10]:
+                    CarImage.objects.create(car=car, image=img)
+            # Главное фото тоже могло смениться — обложку пересчитываем всегда
+            self._refresh_gallery(car)
 
         return Response(CarSerializer(car, context=self.get_serializer_context()).data)
 
+    def _refresh_gallery(self, car):
+        gallery.refresh([car.id])
+        car.refresh_from_db(fields=['cover_thumbnail', 'images_count'])
+
+    @swagger_auto_schema(
+        operation_summary="Перенести неактивную машину в архив",
+        tags=['Админ Машины']
+    )
+    @action(detail=True, methods=['post'], url_path='archive')
+    def archive_car(self, request, pk=None):
+        car = self.get_object()
+        if car.is_active or not archive.archive_batch([car.id]):
+            return Response({'detail': 'В архив переносятся только неактивные машины.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(ArchivedCarSerializer(ArchivedCar.objects.get(id=car.id)).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_summary="Пачечное изменение машин",
+        operation_description="Включить/снять с продажи или изменить цену (set_price — новая цена, "
+                              "adjust_price — на percent процентов) у машин из ids или по фильтру query. "
+                              "Один UPDATE на пачку и один сброс кеша каталога на весь запрос.",
+        request_body=CarBulkSerializer,
+        responses={200: openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+            'action': openapi.Schema(type=openapi.TYPE_STRING),
+            'updated': openapi.Schema(type=openapi.TYPE_INTEGER),
+        })},
+        tags=['Админ Машины']
+    )
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser])
+    def bulk_update(self, request):
+        serializer = CarBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        queryset = serializer.get_queryset()
+        if data['action'] in ('activate', 'deactivate'):
+            updated = bulk.set_active(queryset, data['action'] == 'activate')
+        else:
+            updated = bulk.set_price(queryset, price=data.get('price'), percent=data.get('percent'))
+        return Response({'action': data['action'], 'updated': updated})
+
+
+class AdminArchivedCarViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ArchivedCar.objects.all()
+    permission_classes = [IsAdminUser]
+    pagination_class = CarPagination
+
+    def get_serializer_class(self):
+        return ArchivedCarDetailSerializer if self.action == 'retrieve' else ArchivedCarSerializer
+
+    def get_queryset(self):
+        qs = ArchivedCar.objects.all()
+        if getattr(self, 'swagger_fake_view', False):
+            return qs
+        params = self.request.query_params
+        if brand := params.get('brand'):
+            qs = qs.filter(brand=brand)
+        if model := params.get('model'):
+            qs = qs.filter(model=model)
+        if phone := params.get('phone'):
+            qs = qs.filter(phone=phone)
+        return qs
+
+    @swagger_auto_schema(
+        operation_summary="Архив объявлений",
+        manual_parameters=[
+            openapi.Parameter('brand', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('model', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('phone', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        ],
+        tags=['Админ Машины']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Объявление из архива",
+        tags=['Админ Машины']
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Восстановить машину из архива",
+        request_body=no_body,
+        responses={201: CarSerializer},
+        tags=['Админ Машины']
+    )
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        car = archive.restore(self.get_object())
+        return Response(CarSerializer(car, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
+
+
+class AdminInstallmentPlanViewSet(viewsets.ModelViewSet):
+    """Планы рассрочки. Изменения сразу попадают в installment_quotes карточек (cars/installments.py)."""
+    queryset = InstallmentPlan.objects.all()
+    serializer_class = InstallmentPlanSerializer
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Планы рассрочки",
+        tags=['Админ Машины']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Создать план рассрочки",
+        tags=['Админ Машины']
+    )
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
 
 class CarViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Car.objects.filter(is_active=True)
     serializer_class = CarSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CarPagination
+    throttle_scope = 'catalog'
+    # Accept: application/vnd.columnar+json — список полями-колонками (core/renderers.py)
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
 
     def get_queryset(self):
         qs = Car.objects.filter(is_active=True)
-        if search := self.request.query_params.get('search'):
-            qs = qs.filter(Q(brand__icontains=search) | Q(model__icontains=search))
-        if min_price := self.request.query_params.get('min_price'):
-            qs = qs.filter(price__gte=min_price)
-        if max_price := self.request.query_params.get('max_price'):
-            qs = qs.filter(price__lte=max_price)
-        return qs
+        if getattr(self, 'swagger_fake_view', False):
+            return qs
+        self.car_filter = CarFilter(self.request.query_params)
+        return self.car_filter.filter_queryset(qs)
+
+    def get_serializer_class(self):
+        # Списки карточек — без галереи: обложка и число фото лежат в самой машине (cars/gallery.py)
+        if self.action in ('list', 'featured', 'similar'):
+            return CarCardSerializer
+        return CarSerializer
+
+    def get_count_signature(self):
+        # Количество не зависит от сортировки — один кеш на все ordering
+        return f'public:{self.car_filter.signature()}'
+
+    @swagger_auto_schema(
+        operation_summary="Список машин",
+        manual_parameters=CarFilter.openapi_parameters(),
+        tags=['Пользователь Машины']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Машина",
+        tags=['Пользователь Машины']
+    )
+    def retrieve(self, request, *args, **kwargs):
+        # Карточка из двухуровневого кеша (cars/detail.py); is_favorite — свой у каждого пользователя
+        try:
+            car_id = int(kwargs['pk'])
+        except ValueError:
+            raise Http404
+        # Без запроса в контексте: ссылки относительные, хост добавляется ниже — не из ключа кеша
+        data = detail.cached_car(car_id, lambda car: CarSerializer(car).data)
+        if data is None:
+            raise Http404
+        activity.record_view(car_id, request.user.id if request.user.is_authenticated else None)
+        is_favorite = (request.user.is_authenticated
+                       and Favorite.objects.filter(user=request.user, car_id=car_id).exists())
+        data = absolutize(data, public_base_url(request), MEDIA_URL_FIELDS)
+        return Response(dict(data, is_favorite=is_favorite))
+
+    @swagger_auto_schema(
+        operation_summary="Изменения каталога с курсора (синхронизация)",
+        operation_description=(
+            "Без since — только текущий курсор: сохранить его, затем загрузить список целиком. "
+            "С since — карточки изменённых активных машин (upserts) и id удалённых/снятых (deletes). "
+            "410 — курсор устарел, нужна полная синхронизация."
+        ),
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=car_changes.DEFAULT_LIMIT),
+        ],
+        tags=['Пользователь Машины']
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        if 'since' not in request.query_params:
+            return Response({'cursor': car_changes.head(), 'has_more': False, 'upserts': [], 'deletes': []})
+        try:
+            since = int(request.query_params['since'])
+            limit = min(max(int(request.query_params.get('limit', car_changes.DEFAULT_LIMIT)), 1),
+                        car_changes.MAX_LIMIT)
+        except ValueError:
+            return Response({'since': 'Ожидается целое число.'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0:
+            return Response({'since': 'Курсор не может быть отрицательным.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            cursor, has_more, upsert_ids, delete_ids = car_changes.changes_since(since, limit)
+        except car_changes.CursorExpired:
+            return Response({'detail': 'Курсор устарел, нужна полная синхронизация.', 'cursor': car_changes.head()},
+                            status=status.HTTP_410_GONE)
+        cars = Car.objects.filter(id__in=upsert_ids).order_by('id').prefetch_related('images')
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'upserts': self.get_serializer(cars, many=True).data,
+            'deletes': delete_ids,
+        })
+
+    @swagger_auto_schema(
+        operation_summary="Статистика цен по марке/модели/годам",
+        operation_description=(
+            f"Распределение цен активных машин по группам марка/модель/{market.YEAR_BUCKET} года выпуска. "
+            "Считается заранее (refresh_market_stats), запрос не сканирует каталог."
+        ),
+        manual_parameters=[
+            openapi.Parameter('brand', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('model', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('year', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        tags=['Пользователь Машины']
+    )
+    @action(detail=False, methods=['get'])
+    def market_stats(self, request):
+        brand = request.query_params.get('brand', '').strip()
+        if not brand:
+            return Response({'brand': 'Обязательный параметр.'}, status=status.HTTP_400_BAD_REQUEST)
+        year = request.query_params.get('year')
+        try:
+            year = int(year) if year else None
+        except ValueError:
+            return Response({'year': 'Ожидается целое число.'}, status=status.HTTP_400_BAD_REQUEST)
+        model = request.query_params.get('model', '').strip() or None
+        for name, value in (('brand', brand), ('model', model)):
+            if value and len(value) > market.MAX_NAME_LENGTH:
+                return Response({name: f'Не длиннее {market.MAX_NAME_LENGTH} символов.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return Response(market.market_stats(brand, model, year))
+
+    @swagger_auto_schema(
+        operation_summary="История цены машины",
+        tags=['Пользователь Машины']
+    )
+    @action(detail=True, methods=['get'])
+    def price_history(self, request, pk=None):
+        car = self.get_object()
+        history = car.price_history.order_by('changed_at', 'id').values('price', 'changed_at')
+        return Response([{'price': str(row['price']), 'changed_at': row['changed_at']} for row in history])
 
     @swagger_auto_schema(
         operation_summary="Популярные машины",
@@ -132,7 +369,7 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
     )
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        qs = self.get_queryset().order_by('-views')[:10]
+        qs = self.get_queryset().order_by('-views', '-id')[:10]
         serializer = self.get_serializer(qs, many=True)
         return Response(serializer.data)
 
@@ -142,18 +379,67 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
     )
     @action(detail=False, methods=['get'])
     def brands(self, request):
-        brands = self.get_queryset().values_list('brand', flat=True).distinct()
+        brands = self.get_queryset().order_by('brand').values_list('brand', flat=True).distinct()
         return Response(list(brands))
 
+    @swagger_auto_schema(
+        operation_summary="Подсказки марок и моделей",
+        operation_description=(
+            "Префиксный поиск по маркам и моделям активных машин с числом объявлений. "
+            "Понимает кириллицу («камри»), разные транслитерации и одну опечатку; отвечает из памяти, без запроса к БД."
+        ),
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=autocomplete.DEFAULT_LIMIT),
+        ],
+        tags=['Пользователь Машины']
+    )
+    @action(detail=False, methods=['get'], throttle_scope='autocomplete')
+    def autocomplete(self, request):
+        query = request.query_params.get('q', '')[:100]
+        try:
+            limit = min(max(int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT)), 1),
+                        autocomplete.MAX_LIMIT)
+        except ValueError:
+            return Response({'limit': 'Ожидается целое число.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'query': query, 'results': autocomplete.suggest(query, limit)})
+
     @swagger_auto_schema(
         operation_summary="Список типов",
         tags=['Пользователь Машины']
     )
     @action(detail=False, methods=['get'])
     def car_types(self, request):
-        types = self.get_queryset().values_list('car_type', flat=True).distinct()
+        types = self.get_queryset().order_by('car_type').values_list('car_type', flat=True).distinct()
         return Response(list(types))
 
+    @swagger_auto_schema(
+        operation_summary="Похожие машины",
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=10),
+        ],
+        tags=['Пользователь Машины']
+    )
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        car = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), similar.DEFAULT_K)
+        except ValueError:
+            return Response({'limit': 'Ожидается целое число.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        index = similar.get_index()
+        if index is None:
+            return Response([])
+        ids = index.neighbours_for(car.id, limit)
+        if ids is None:
+            ids = index.neighbours_for_car(car, limit)
+
+        cars = Car.objects.filter(id__in=ids, is_active=True)
+        by_id = {c.id: c for c in cars}
+        serializer = self.get_serializer([by_id[i] for i in ids if i in by_id], many=True)
+        return Response(serializer.data)
+
     @swagger_auto_schema(
         operation_summary="Фото машины",
         tags=['Пользователь Машины']
@@ -170,4 +456,25 @@ class AdViewSet(viewsets.ModelViewSet):
     queryset = Ad.objects.all()
     serializer_class = AdSerializer
     permission_classes = [IsAdminUser]
-    parser_classes = [MultiPartParser, FormParser]
\ No newline at end of file
+    parser_classes = [MultiPartParser, FormParser]
+
+    @swagger_auto_schema(
+        operation_summary="Активные баннеры (ротация по весу)",
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=5),
+        ],
+        responses={200: PublicAdSerializer(many=True)},
+        tags=['Пользователь Машины']
+    )
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def active(self, request):
+        # Из снимка в памяти процесса (cars/ads.py): готовые JSON-байты, без БД и рендерера DRF
+        try:
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), 20)
+        except ValueError:
+            return Response({'limit': 'Ожидается целое число.'}, status=status.HTTP_400_BAD_REQUEST)
+        payload = ads.delivery.serve(limit, public_base_url(request))
+        response = HttpResponse(payload, content_type='application/json')
+        # Порядок случайный по весам — кешировать ответ нельзя
+        response['Cache-Control'] = 'no-store'
+        return response
\ No newline at end of file
@@ -0,0 +1,104 @@
+# core/admission.py
+"""
+Сброс нагрузки: перегруженный воркер сразу отвечает 503 + Retry-After, а не ставит запрос в очередь,
+растягивая задержку всем остальным.
+
+Перегрузка определяется двумя признаками:
+- запросов в обработке в этом процессе больше ADMISSION_MAX_INFLIGHT (потоки WSGI или корутины ASGI);
+  запросы с Authorization отсекаются позже — при ADMISSION_MAX_INFLIGHT * AUTHENTICATED_FACTOR,
+  анонимный трафик (в том числе скраперы) сбрасывается первым;
+- запрос простоял в очереди перед воркером дольше ADMISSION_MAX_QUEUE_MS — по заголовку
+  X-Request-Start от балансировщика (nginx: proxy_set_header X-Request-Start "t=${msec}").
+None в настройке выключает соответствующую проверку. Админка, статика и медиа не сбрасываются,
+долгие SSE-потоки (cars/stream.py) ещё и не считаются в обработке.
+"""
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+AUTHENTICATED_FACTOR = 1.5
+RETRY_AFTER = 2
+DEFAULT_EXEMPT_PREFIXES = ('/admin/', '/static/', '/media/', '/api/v1/cars/stream/')
+
+
+def queue_wait_ms(request, now=None):
+    """Сколько запрос ждал до воркера по X-Request-Start (секунды, мс или мкс с эпохи)."""
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        started = float(header.removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    now = time.time() if now is None else now
+    return max(0.0, (now - started) * 1000)
+
+
+class AdmissionMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        self.inflight = 0
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self._exempt(request):
+            return self.get_response(request)
+        rejected = self._admit(request)
+        if rejected is not None:
+            return rejected
+        try:
+            return self.get_response(request)
+        finally:
+            self._release()
+
+    async def __acall__(self, request):
+        if self._exempt(request):
+            return await self.get_response(request)
+        rejected = self._admit(request)
+        if rejected is not None:
+            return rejected
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release()
+
+    def _exempt(self, request):
+        prefixes = getattr(settings, 'ADMISSION_EXEMPT_PREFIXES', DEFAULT_EXEMPT_PREFIXES)
+        return request.path.startswith(tuple(prefixes))
+
+    def _admit(self, request):
+        max_queue_ms = getattr(settings, 'ADMISSION_MAX_QUEUE_MS', None)
+        if max_queue_ms is not None:
+            waited = queue_wait_ms(request)
+            if waited is not None and waited > max_queue_ms:
+                return self._overloaded('queue')
+        max_inflight = getattr(settings, 'ADMISSION_MAX_INFLIGHT', None)
+        with self._lock:
+            if max_inflight is not None:
+                limit = max_inflight * AUTHENTICATED_FACTOR if 'Authorization' in request.headers else max_inflight
+                if self.inflight >= limit:
+                    return self._overloaded('inflight')
+            self.inflight += 1
+        return None
+
+    def _release(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def _overloaded(self, reason):
+        response = JsonResponse({'detail': 'Сервер перегружен, повторите запрос позже.', 'reason': reason},
+                                status=503)
+        response['Retry-After'] = str(RETRY_AFTER)
+        return response
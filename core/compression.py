@@ -0,0 +1,79 @@
+# core/compression.py
+"""
+Сжатие ответов API на лету: Brotli, если клиент его принимает, иначе gzip.
+
+Сжимаются только ответы не меньше COMPRESSION_MIN_SIZE байт (короткие не окупают заголовок
+и CPU) и только текстовые/структурные типы — JSON, MessagePack (core/renderers.py), текст.
+Уровни — для «на лету», а не максимальные: brotli quality 5 и gzip 6 дают почти тот же размер
+за долю времени (максимальное сжатие статики — core/media.py и whitenoise).
+
+Не сжимаются: потоковые ответы (SSE cars/stream.py, файлы медиа — у них свои .gz/.br), ответы
+с Content-Encoding, пути из COMPRESSION_EXEMPT_PREFIXES. По умолчанию там авторизация и
+админка: ответы с токенами и отражённым вводом под сжатием уязвимы к BREACH.
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него только gzip
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_EXEMPT_PREFIXES = ('/api/v1/auth/', '/admin/')
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'application/vnd.columnar+json',
+                      'application/javascript', 'application/xml', 'text/')
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с q > 0: 'br;q=1.0, gzip' -> {'br', 'gzip'}."""
+    encodings = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if request.path.startswith(tuple(getattr(settings, 'COMPRESSION_EXEMPT_PREFIXES', DEFAULT_EXEMPT_PREFIXES))):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in encodings:
+            encoding, compressed = 'br', brotli.compress(response.content, quality=BROTLI_QUALITY)
+        elif 'gzip' in encodings:
+            encoding, compressed = 'gzip', compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # Сильный ETag относится к несжатому телу
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
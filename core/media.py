@@ -0,0 +1,292 @@
+# core/media.py
+"""
+Хранение и раздача медиа (фото машин, баннеры).
+
+ContentHashStorage называет файлы по sha256 содержимого: cars/gallery/ab/ab12…ef.jpg. Имя меняется
+только вместе с содержимым, поэтому такие файлы отдаются с Cache-Control: immutable на год,
+а одинаковые загрузки ложатся в один файл. Для текстовых форматов рядом пишутся .gz/.br.
+
+Превью (renditions) лежат по детерминированному пути renditions/<ширина>/<путь оригинала> и
+создаются при первом запросе.
+
+serve_media поддерживает ETag/304, Range (206), предсжатые версии и отдачу через nginx
+(X-Accel-Redirect) или X-Sendfile — см. MEDIA_OFFLOAD в settings.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него пишем только .gz
+    brotli = None
+
+HASH_LENGTH = 40
+HASHED_NAME_RE = re.compile(rf'(^|/)[0-9a-f]{{2}}/[0-9a-f]{{{HASH_LENGTH}}}\.[a-z0-9]+$')
+COMPRESSIBLE_EXTENSIONS = {'.json', '.svg', '.txt', '.csv', '.xml', '.js', '.css', '.html'}
+MIN_COMPRESS_SIZE = 512
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+RENDITIONS_DIR = 'renditions'
+RENDITION_WIDTHS = (320, 800)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_digest(content):
+    """sha256 содержимого по чанкам — файл целиком в память не читается."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def precompress(path):
+    """Пишет path.gz (и path.br, если есть brotli) для текстовых файлов."""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    variants = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda d: brotli.compress(d, quality=11)))
+    for suffix, compress in variants:
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class ContentHashStorage(FileSystemStorage):
+    """FileSystemStorage, который кладёт файл по хешу содержимого и не пишет дубликаты."""
+
+    def hashed_name(self, name, digest):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        ext = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[:HASH_LENGTH] + ext)
+
+    def _save(self, name, content):
+        # sha256 мог посчитать обработчик загрузки (cars/uploads.py) — тогда файл не перечитываем
+        digest = getattr(content, 'sha256', None) or file_digest(content)
+        name = self.hashed_name(name, digest)
+        if self.exists(name):
+            return name
+        name = super()._save(name, content)
+        precompress(self.path(name))
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменит хеш в _save — уникальность по исходному имени не нужна
+        return name
+
+
+# === Превью ===
+
+def rendition_name(name, width):
+    return posixpath.join(RENDITIONS_DIR, str(width), name)
+
+
+def make_rendition(name, width, storage=None):
+    """Превью шириной width в формате оригинала. Возвращает имя; оригинал не найден — None."""
+    storage = storage or default_storage
+    target = rendition_name(name, width)
+    if storage.exists(target):
+        return target
+    if not storage.exists(name):
+        return None
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image_format = image.format or 'JPEG'
+        # draft: JPEG декодируется сразу в уменьшенном масштабе — в разы быстрее полного decode
+        image.draft('RGB', (width, width * 4))
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.width > width:
+            image.thumbnail((width, width * 4), Image.LANCZOS)
+        path = storage.path(target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Своё имя временного файла у каждого вызова: параллельные запросы превью (потоки одного
+        # процесса тоже) не пишут в один файл. NamedTemporaryFile не подходит — он создаёт файл с правами
+        # 0600, и после переименования превью не прочитал бы nginx.
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            image.save(tmp, image_format, quality=82, optimize=True)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    return target
+
+
+def rendition_url(field_file, width):
+    """URL превью без обращения к диску — файл создастся при первом запросе."""
+    if not field_file:
+        return None
+    return settings.MEDIA_URL + rendition_name(field_file.name, width)
+
+
+# === Абсолютные ссылки ===
+
+def public_base_url(request):
+    """Схема и хост для ссылок: PUBLIC_BASE_URL из settings, без него — из запроса."""
+    return (getattr(settings, 'PUBLIC_BASE_URL', '') or request.build_absolute_uri('/')).rstrip('/')
+
+
+def absolutize(data, base_url, fields):
+    """
+    Копия data (dict/list, в том числе вложенных), где относительные ссылки в полях fields дополнены
+    base_url. Для ответов, собранных без запроса и закешированных один раз на все хосты.
+    """
+    if isinstance(data, list):
+        return [absolutize(item, base_url, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for key, value in data.items():
+        if key in fields and isinstance(value, str) and value.startswith('/'):
+            value = base_url + value
+        elif isinstance(value, (dict, list)):
+            value = absolutize(value, base_url, fields)
+        result[key] = value
+    return result
+
+
+# === Раздача ===
+
+def _etag(path, name, stat):
+    if is_hashed_name(name):
+        return '"%s"' % posixpath.basename(name).split('.')[0]
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def _cache_headers(response, name, etag, stat):
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if is_hashed_name(name) else DEFAULT_CACHE_CONTROL
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _parse_range(header, size):
+    match = RANGE_RE.match(header.strip())
+    if not match or not size:
+        return None
+    start, end = match.groups()
+    if start == '':
+        if end == '':
+            return None
+        length = min(int(end), size)
+        return size - length, size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def _resolve(name):
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if os.path.isfile(path):
+        return path
+    parts = name.split('/', 2)
+    if len(parts) == 3 and parts[0] == RENDITIONS_DIR and parts[1].isdigit() and int(parts[1]) in RENDITION_WIDTHS:
+        try:
+            if make_rendition(parts[2], int(parts[1])):
+                return path
+        except (OSError, SuspiciousFileOperation, Image.DecompressionBombError):
+            pass
+    raise Http404
+
+
+def _offload(response_path, name):
+    mode = getattr(settings, 'MEDIA_OFFLOAD', None)
+    if mode == 'nginx':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + name
+    elif mode == 'sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = response_path
+    else:
+        return None
+    # Тип ставит nginx по расширению; Django не должен навязывать text/html
+    del response['Content-Type']
+    return response
+
+
+def _precompressed(request, name, full_path):
+    """Путь и Content-Encoding лучшей предсжатой версии, которую принимает клиент."""
+    if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return full_path, None
+    accept = request.headers.get('Accept-Encoding', '')
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accept and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+
+@require_safe
+def serve_media(request, path):
+    name = posixpath.normpath(path).lstrip('/')
+    full_path = _resolve(name)
+    stat = os.stat(full_path)
+    etag = _etag(full_path, name, stat)
+    range_header = request.headers.get('Range')
+    serve_path, encoding = (full_path, None) if range_header else _precompressed(request, name, full_path)
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    if request.headers.get('If-None-Match') == etag:
+        return _cache_headers(HttpResponseNotModified(), name, etag, stat)
+
+    offloaded = _offload(full_path, name)
+    if offloaded is not None:
+        return _cache_headers(offloaded, name, etag, stat)
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return _cache_headers(response, name, etag, stat)
+        start, end = byte_range
+        with open(full_path, 'rb') as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        response = HttpResponse(body, status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        return _cache_headers(response, name, etag, stat)
+
+    response = FileResponse(open(serve_path, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+        response['Vary'] = 'Accept-Encoding'
+    return _cache_headers(response, name, etag, stat)
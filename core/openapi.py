@@ -0,0 +1,142 @@
+# core/openapi.py
+"""
+Описание API для Swagger без загрузки drf_yasg при старте воркера.
+
+swagger_auto_schema, openapi и no_body здесь — ленивые заменители одноимённых объектов drf_yasg:
+декоратор только запоминает аргументы, а openapi.Parameter(...) и т.п. — отложенные вызовы.
+Настоящие описания навешиваются (apply_schemas) перед первой генерацией схемы.
+
+settings.API_DOCS:
+    'dynamic' — drf_yasg строит схему на первом запросе /swagger/ (по умолчанию, для разработки);
+    'static'  — /swagger.json отдаётся из файла OPENAPI_SCHEMA_FILE (manage.py build_openapi при сборке),
+                drf_yasg в процессе не импортируется;
+    'off'     — без документации.
+"""
+import functools
+import importlib
+import threading
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.urls import path, re_path
+
+API_INFO = {
+    'title': 'AUTO API',
+    'default_version': 'v1',
+    'description': 'API для автомобильной платформы AUTO',
+}
+
+
+class Deferred:
+    """Атрибут или вызов из модуля drf_yasg, который выполнится только при resolve()."""
+
+    def __init__(self, module, names=(), call=None):
+        self._module = module
+        self._names = names
+        self._call = call
+
+    def __getattr__(self, name):
+        if name.startswith('_') or self._call is not None:
+            raise AttributeError(name)
+        return Deferred(self._module, self._names + (name,))
+
+    def __call__(self, *args, **kwargs):
+        return Deferred(self._module, self._names, (args, kwargs))
+
+    def __repr__(self):
+        return f'<Deferred {self._module}.{".".join(self._names)}{"(...)" if self._call else ""}>'
+
+    def resolve(self):
+        value = importlib.import_module(self._module)
+        for name in self._names:
+            value = getattr(value, name)
+        if self._call is not None:
+            args, kwargs = self._call
+            value = value(*resolve(args), **resolve(kwargs))
+        return value
+
+
+def resolve(value):
+    if isinstance(value, Deferred):
+        return value.resolve()
+    if isinstance(value, dict):
+        return {key: resolve(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(resolve(item) for item in value)
+    return value
+
+
+openapi = Deferred('drf_yasg.openapi')
+no_body = Deferred('drf_yasg.utils', ('no_body',))
+
+_pending = []
+_lock = threading.Lock()
+
+
+def swagger_auto_schema(**kwargs):
+    """Как drf_yasg.utils.swagger_auto_schema, но применяется при генерации схемы, а не при импорте."""
+    def decorator(view_method):
+        with _lock:
+            _pending.append((view_method, kwargs))
+        return view_method
+    return decorator
+
+
+def apply_schemas():
+    from drf_yasg.utils import swagger_auto_schema as decorate
+
+    with _lock:
+        while _pending:
+            view_method, kwargs = _pending.pop(0)
+            decorate(**resolve(kwargs))(view_method)
+
+
+def schema_generator(url=None):
+    apply_schemas()
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    return OpenAPISchemaGenerator(openapi.Info(**API_INFO).resolve(), url=url)
+
+
+@functools.cache
+def _schema_view():
+    apply_schemas()
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    return get_schema_view(openapi.Info(**API_INFO).resolve(), public=True,
+                           permission_classes=[permissions.AllowAny])
+
+
+@functools.cache
+def _ui_view(ui):
+    if ui is None:
+        return _schema_view().without_ui(cache_timeout=0)
+    return _schema_view().with_ui(ui, cache_timeout=0)
+
+
+def _lazy_view(ui):
+    def view(request, *args, **kwargs):
+        return _ui_view(ui)(request, *args, **kwargs)
+    return view
+
+
+def static_schema(request):
+    """Схема, собранная build_openapi: файл с диска, без drf_yasg."""
+    try:
+        return FileResponse(open(settings.OPENAPI_SCHEMA_FILE, 'rb'), content_type='application/json')
+    except FileNotFoundError:
+        raise Http404('Схема не собрана: manage.py build_openapi')
+
+
+def docs_urlpatterns():
+    mode = getattr(settings, 'API_DOCS', 'dynamic')
+    if mode == 'dynamic':
+        return [
+            re_path(r'^swagger(?P<format>\.json|\.yaml)$', _lazy_view(None), name='schema-json'),
+            path('swagger/', _lazy_view('swagger'), name='schema-swagger-ui'),
+            path('redoc/', _lazy_view('redoc'), name='schema-redoc'),
+        ]
+    if mode == 'static':
+        return [path('swagger.json', static_schema, name='schema-json')]
+    return []
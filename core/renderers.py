@@ -0,0 +1,63 @@
+# core/renderers.py
+"""
+Компактные форматы ответов API — выбираются заголовком Accept (или ?format=).
+
+MessagePackRenderer — application/msgpack: та же структура, что в JSON, в бинарном виде; числа
+и короткие строки занимают меньше, клиент разбирает быстрее.
+
+ColumnarJSONRenderer — application/vnd.columnar+json, для списков: имена полей один раз,
+затем строки значений. Список объектов [{'id': 1, 'brand': 'BMW'}, ...] становится
+{'columns': ['id', 'brand'], 'rows': [[1, 'BMW'], ...]} — и на верхнем уровне, и в results
+страницы; остальное (карточка, ошибки) отдаётся как обычный JSON. Вложенные объекты (фото
+машины) остаются объектами.
+"""
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Decimal, даты, ленивые строки — как JSONRenderer (DRF JSONEncoder)
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
+
+
+def to_columns(items):
+    """Список словарей -> {'columns': [...], 'rows': [[...], ...]}; None, если это не список объектов."""
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None
+    columns = list(items[0]) if items else []
+    known = set(columns)
+    for item in items:
+        for key in item:
+            if key not in known:
+                known.add(key)
+                columns.append(key)
+    return {'columns': columns, 'rows': [[item.get(column) for column in columns] for item in items]}
+
+
+def from_columns(table):
+    """Обратное преобразование — для тестов и клиентов на Python."""
+    return [dict(zip(table['columns'], row)) for row in table['rows']]
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        table = to_columns(data)
+        if table is not None:
+            data = table
+        elif isinstance(data, dict) and 'results' in data:
+            table = to_columns(data['results'])
+            if table is not None:
+                data = dict(data, results=table)
+        return super().render(data, accepted_media_type, renderer_context)
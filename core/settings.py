@@ -43,12 +43,22 @@ INSTALLED_APPS = [
     'api',
     'cars',
     'favorites',
-    'drf_yasg',
+    'activity',
 ]
 
+# Документация API (core/openapi.py): dynamic — drf_yasg на лету, static — готовый файл
+# из manage.py build_openapi (drf_yasg не грузится в воркерах), off — выключена
+API_DOCS = os.getenv('API_DOCS', 'dynamic')
+OPENAPI_SCHEMA_FILE = os.getenv('OPENAPI_SCHEMA_FILE', os.path.join(BASE_DIR, 'var', 'openapi.json'))
+if API_DOCS == 'dynamic':
+    INSTALLED_APPS.append('drf_yasg')  # шаблоны и статика Swagger UI
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.admission.AdmissionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Ниже WhiteNoise: статику он отдаёт сам, уже предсжатой
+    'core.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -93,13 +103,48 @@ AUTH_PASSWORD_VALIDATORS = [
 
 # Media / Static
 MEDIA_URL = '/media/'
+# Схема и хост для абсолютных ссылок в закешированных ответах (карточка машины, баннеры); пусто — из запроса
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Cache: в проде — общий Redis (нужен пакет redis), локально — память процесса
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# STATICFILES_STORAGE в Django 5.1+ не читается — хранилища задаются через STORAGES.
+# Manifest-хранилище whitenoise требует collectstatic, поэтому включается через env на проде:
+# STATICFILES_BACKEND=whitenoise.storage.CompressedManifestStaticFilesStorage
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.media.ContentHashStorage',
+    },
+    'staticfiles': {
+        'BACKEND': os.getenv('STATICFILES_BACKEND', 'django.contrib.staticfiles.storage.StaticFilesStorage'),
+    },
+}
+
+# Отдача медиа: None — сам Django, 'nginx' — X-Accel-Redirect, 'sendfile' — X-Sendfile
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Индексы, которые строят batch-команды (похожие машины и т.п.)
+SIMILAR_INDEX_DIR = os.getenv('SIMILAR_INDEX_DIR', os.path.join(BASE_DIR, 'var', 'similar'))
 
 # Email
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -115,7 +160,37 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Accept: application/msgpack — бинарный ответ (core/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.MessagePackRenderer',
+    ),
+    # Счётчики в общем кеше (core/throttling.py); лимит эндпоинта — throttle_scope у view
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.AnonBucketThrottle',
+        'core.throttling.UserBucketThrottle',
+        'core.throttling.ScopedBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON', '600/min'),
+        'user': os.getenv('THROTTLE_USER', '1200/min'),
+        'catalog': os.getenv('THROTTLE_CATALOG', '300/min'),
+        # Подсказки поиска — запрос на каждое нажатие клавиши
+        'autocomplete': os.getenv('THROTTLE_AUTOCOMPLETE', '1200/min'),
+        'auth': os.getenv('THROTTLE_AUTH', '30/min'),
+    },
+    # Прокси перед приложением: IP клиента берётся из X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.getenv('NUM_PROXIES') else None,
 }
+THROTTLING = os.getenv('THROTTLING', 'True') == 'True'
+
+# Сброс нагрузки (core/admission.py): пусто — проверка выключена
+ADMISSION_MAX_INFLIGHT = int(os.environ['ADMISSION_MAX_INFLIGHT']) if os.getenv('ADMISSION_MAX_INFLIGHT') else None
+ADMISSION_MAX_QUEUE_MS = int(os.getenv('ADMISSION_MAX_QUEUE_MS', 2000))
+
+# Сжатие ответов на лету (core/compression.py): меньше — отдаётся как есть
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
 
 
 SWAGGER_SETTINGS = {
@@ -133,3 +208,12 @@ AUTHENTICATION_BACKENDS = [
     'api.backends.EmailBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
+
+# Приём фото машин (cars/uploads.py): потоковая проверка и лимиты
+CAR_UPLOAD_STREAMING = os.getenv('CAR_UPLOAD_STREAMING', 'True') == 'True'
+CAR_IMAGE_MAX_SIZE = int(os.getenv('CAR_IMAGE_MAX_SIZE', 15 * 2**20))
+CAR_IMAGE_MAX_PIXELS = int(os.getenv('CAR_IMAGE_MAX_PIXELS', 60_000_000))
+
+# SSE-поток машин (cars/stream.py, только ASGI): открытых подписок на процесс и на один IP
+CAR_STREAM_MAX_SUBSCRIBERS = int(os.getenv('CAR_STREAM_MAX_SUBSCRIBERS', 1000))
+CAR_STREAM_MAX_PER_CLIENT = int(os.getenv('CAR_STREAM_MAX_PER_CLIENT', 4))
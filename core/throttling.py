@@ -0,0 +1,180 @@
+# core/throttling.py
+"""
+Ограничение частоты запросов (DRF throttling) со счётчиками в общем кеше.
+
+Лимиты — строки DRF вида '300/min' в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']:
+    anon    — все запросы анонима с одного IP (AnonBucketThrottle);
+    user    — все запросы пользователя (UserBucketThrottle);
+    <scope> — лимит эндпоинта (throttle_scope у view), ключ — пользователь или IP (ScopedBucketThrottle).
+
+Кеш Django умеет атомарно только add/incr, поэтому уровень корзины не хранится (это было бы
+чтение-изменение-запись с гонками между воркерами). Лимит считается скользящим окном: счётчик
+текущего окна плюс счётчик предыдущего с весом ещё не прошедшей доли окна — долгосрочный темп тот же,
+что у корзины токенов на period, всплеск не больше limit.
+
+Предфильтр в памяти процесса: попадания копятся локально и уходят в кеш одним incr(delta) раз в
+limit / FLUSH_DIVISOR запросов. Пока оценка (последний ответ кеша + локальные попадания) ниже
+LOCAL_HEADROOM лимита, запрос пропускается без обращения к кешу — обычный посетитель почти не стоит
+round trip. Недосчёт между воркерами ограничен limit / FLUSH_DIVISOR на воркер.
+Локальных окон не больше LOCAL_KEYS: когда таблица полна и истёкших окон нет, новые ключи (например,
+поток запросов с разных IP) считаются сразу в кеше, без предфильтра, и память процесса не растёт.
+
+settings.THROTTLING = False выключает проверки (нагрузочные прогоны через HTTP).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+FLUSH_DIVISOR = 20
+LOCAL_HEADROOM = 0.5
+LOCAL_KEYS = 100_000
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'300/min' -> (300, 60)."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class _Window:
+    __slots__ = ('index', 'pending', 'current', 'previous', 'expires')
+
+    def __init__(self, index, period, previous=None):
+        self.index = index
+        self.pending = 0       # попадания процесса, ещё не отправленные в кеш
+        self.current = 0       # счётчик текущего окна по последнему ответу кеша
+        self.previous = previous
+        self.expires = (index + 2) * period
+
+
+class SlidingWindowLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._prune_at = 0     # раньше этого времени ни одно окно не истечёт — чистить бесполезно
+
+    def hit(self, key, limit, period, now=None):
+        """Учитывает запрос. Возвращает (разрешён, через сколько секунд повторить)."""
+        now = time.time() if now is None else now
+        index = int(now // period)
+        weight = 1 - (now % period) / period
+        stale = None
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or window.index != index:
+                if window is not None and window.pending:
+                    stale = (window.index, window.pending)
+                tracked = window is not None or len(self._windows) < LOCAL_KEYS or self._prune(now)
+                previous = window.current + window.pending if window and window.index == index - 1 else None
+                window = _Window(index, period, previous)
+                # Без места в таблице окно живёт один запрос: previous=None отправляет его в кеш
+                if tracked:
+                    self._windows[key] = window
+                    self._prune_at = min(self._prune_at, window.expires)
+            window.pending += 1
+            estimate = window.current + window.pending + (window.previous or 0) * weight
+            if (window.previous is not None and estimate < limit * LOCAL_HEADROOM
+                    and window.pending < max(1, limit // FLUSH_DIVISOR)):
+                local = True
+            else:
+                local, delta, window.pending = False, window.pending, 0
+        if stale:
+            self._incr(f'{key}:{stale[0]}', stale[1], period)
+        if local:
+            return True, 0
+
+        current = self._incr(f'{key}:{index}', delta, period)
+        previous = window.previous
+        if previous is None:
+            previous = cache.get(f'{key}:{index - 1}', 0)
+        with self._lock:
+            window.current, window.previous = current, previous
+        if current + previous * weight <= limit:
+            return True, 0
+        return False, period - now % period
+
+    def _incr(self, key, delta, period):
+        cache.add(key, 0, period * 2)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # Ключ успел истечь между add и incr
+            cache.add(key, delta, period * 2)
+            return delta
+
+    def _prune(self, now):
+        """Выбрасывает истёкшие окна. True — в таблице появилось место для нового ключа."""
+        if now < self._prune_at:
+            return False
+        self._windows = {key: window for key, window in self._windows.items() if window.expires > now}
+        self._prune_at = min((window.expires for window in self._windows.values()), default=0)
+        return len(self._windows) < LOCAL_KEYS
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+            self._prune_at = 0
+
+
+limiter = SlidingWindowLimiter()
+
+
+class BucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self._wait = None
+        if not getattr(settings, 'THROTTLING', True):
+            return True
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        key = self.get_cache_key(request, view) if rate else None
+        if key is None:
+            return True
+        limit, period = parse_rate(rate)
+        allowed, self._wait = limiter.hit(f'throttle:{scope}:{key}', limit, period)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AnonBucketThrottle(BucketThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserBucketThrottle(BucketThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class ScopedBucketThrottle(BucketThrottle):
+    """Лимит эндпоинта: view.throttle_scope, отдельно для каждого пользователя или IP."""
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scope', None)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'u{request.user.pk}'
+        return self.get_ident(request)
@@ -1,24 +1,16 @@
 from django.contrib import admin
-from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from django.urls import path, include, re_path
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="AUTO API",
-        default_version='v1',
-        description="API для автомобильной платформы AUTO",
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from core.media import serve_media
+from core.openapi import docs_urlpatterns
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/auth/', include('api.urls')),
     path('api/v1/cars/', include('cars.urls')),
     path('api/v1/favorites/', include('favorites.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('api/v1/activity/', include('activity.urls')),
+    re_path(r'^media/(?P<path>.+)$', serve_media, name='media'),
+    # swagger/, redoc/, swagger.json — по settings.API_DOCS (core/openapi.py)
+    *docs_urlpatterns(),
 ]
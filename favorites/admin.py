@@ -1,3 +1,34 @@
+# favorites/admin.py
 from django.contrib import admin
 
-# Register your models here.
+from cars.pagination import EstimatedCountAdminMixin
+
+from .models import Favorite, SavedSearch, SearchMatch
+
+
+# raw_id_fields: выпадающий список на миллион машин/пользователей не рендерится
+@admin.register(Favorite)
+class FavoriteAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'user', 'car', 'created_at']
+    list_select_related = ['user', 'car']
+    raw_id_fields = ['user', 'car']
+    search_fields = ['=user__email', '=car__id']
+    ordering = ['-id']
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'user', 'name', 'notify', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['notify']
+    raw_id_fields = ['user']
+    search_fields = ['=user__email']
+    ordering = ['-id']
+
+
+@admin.register(SearchMatch)
+class SearchMatchAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'search', 'car', 'created_at', 'notified_at']
+    list_select_related = ['search', 'car']
+    raw_id_fields = ['search', 'car']
+    ordering = ['-id']
@@ -0,0 +1,26 @@
+# favorites/management/commands/notify_saved_searches.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import outbox
+from favorites import searches
+
+
+class Command(BaseCommand):
+    help = 'Сопоставляет новые машины с сохранёнными поисками и ставит письма в очередь (запускать по cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=searches.changes.DEFAULT_LIMIT,
+                            help='Записей журнала изменений за шаг')
+        parser.add_argument('--send', action='store_true', help='Сразу отправить очередь писем (send_outbox)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        cars, matched = searches.run_alerts(batch_size=options['batch_size'])
+        emails = searches.queue_notifications()
+        summary = f'машин: {cars}, совпадений: {matched}, писем в очереди: {emails}'
+        if options['send']:
+            sent, failed = outbox.flush()
+            summary += f', отправлено: {sent}, ошибок: {failed}'
+        self.stdout.write(self.style.SUCCESS(f'Готово: {summary} за {time.perf_counter() - started:.1f} с'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0006_car_updated_at'),
+        ('favorites', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarRecommendation',
+            fields=[
+                ('car', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='cars.car')),
+                ('related', models.JSONField(default=list)),
+                ('built_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
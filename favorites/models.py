@@ -9,4 +9,46 @@ class Favorite(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ['user', 'car']
\ No newline at end of file
+        unique_together = ['user', 'car']
+
+
+class CarRecommendation(models.Model):
+    """Top-K машин, которые чаще всего добавляют в избранное вместе с данной (build_recommendations)."""
+    car = models.OneToOneField(Car, primary_key=True, on_delete=models.CASCADE, related_name='recommendation')
+    # [[car_id, score], ...] по убыванию score
+    related = models.JSONField(default=list)
+    built_at = models.DateTimeField(db_index=True)
+
+
+class SavedSearch(models.Model):
+    """Сохранённый поиск: нормализованная спецификация CarFilter (dump) и её подпись."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100, blank=True)
+    spec = models.JSONField(default=dict)
+    signature = models.CharField(max_length=40)
+    notify = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'signature']
+
+
+class SearchMatch(models.Model):
+    """Машина, подошедшая под сохранённый поиск; notified_at — когда ушла в письмо."""
+    search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='search_matches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['search', 'car']
+        indexes = [
+            models.Index(fields=['id'], name='searchmatch_pending_idx', condition=models.Q(notified_at__isnull=True)),
+        ]
+
+
+class AlertCursor(models.Model):
+    """Позиция обработчика в журнале изменений каталога (cars.changes)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,131 @@
+# favorites/recommendations.py
+"""
+Рекомендации «вам может понравиться» по совместному добавлению в избранное (item-item).
+
+Batch (build_recommendations): матрица пользователь × машина из Favorite -> C = Aᵀ·A по блокам
+машин (scipy.sparse, память ограничена размером блока) -> косинусная нормировка
+c_ij / sqrt(n_i·n_j), чтобы популярные машины не забивали всё -> top-K на машину в CarRecommendation.
+
+Запрос: берём строки CarRecommendation для избранного пользователя, суммируем score по кандидатам,
+убираем уже добавленные и неактивные.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from cars.models import Car
+from .models import CarRecommendation, Favorite
+
+DEFAULT_TOP_K = 50
+READ_BATCH = 500_000
+CAR_BLOCK = 20_000
+WRITE_BATCH = 2_000
+MAX_USER_FAVORITES = 200
+
+
+def load_interactions(batch_size=READ_BATCH):
+    """(user_ids, car_ids) избранного активных машин; читаем keyset-пачками по id."""
+    users, cars = [], []
+    last_id = 0
+    qs = Favorite.objects.filter(car__is_active=True).order_by('id')
+    while True:
+        chunk = list(qs.filter(id__gt=last_id).values_list('id', 'user_id', 'car_id')[:batch_size])
+        if not chunk:
+            break
+        block = np.array(chunk, dtype=np.int64)
+        users.append(block[:, 1])
+        cars.append(block[:, 2])
+        last_id = int(block[-1, 0])
+    if not users:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(users), np.concatenate(cars)
+
+
+def cooccurrence_top_k(user_ids, car_ids, top_k=DEFAULT_TOP_K, min_support=1, block=CAR_BLOCK):
+    """Итератор (car_id, [(related_id, score), ...]) по всем машинам, у которых есть соседи."""
+    # scipy нужен только batch-расчёту — воркеры API его не импортируют
+    from scipy import sparse
+
+    if not len(user_ids):
+        return
+    car_index, car_codes = np.unique(car_ids, return_inverse=True)
+    _, user_codes = np.unique(user_ids, return_inverse=True)
+    n_users, n_cars = user_codes.max() + 1, len(car_index)
+
+    data = np.ones(len(car_codes), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, (user_codes, car_codes)), shape=(n_users, n_cars))
+    matrix.data[:] = 1  # дубли (если были) -> бинарная матрица
+    transposed = matrix.T.tocsr()
+    popularity = np.asarray(matrix.sum(axis=0)).ravel()
+    inv_norm = 1.0 / np.sqrt(np.maximum(popularity, 1))
+
+    for start in range(0, n_cars, block):
+        stop = min(start + block, n_cars)
+        co = (transposed[start:stop] @ matrix).tocsr()  # (block × n_cars) совместные добавления
+        for row in range(stop - start):
+            lo, hi = co.indptr[row], co.indptr[row + 1]
+            if lo == hi:
+                continue
+            columns = co.indices[lo:hi]
+            counts = co.data[lo:hi]
+            keep = (columns != start + row) & (counts >= min_support)
+            columns, counts = columns[keep], counts[keep]
+            if not len(columns):
+                continue
+            scores = counts * inv_norm[start + row] * inv_norm[columns]
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                columns, scores = columns[best], scores[best]
+            order = np.argsort(-scores, kind='stable')
+            yield int(car_index[start + row]), [
+                (int(car_index[c]), round(float(s), 4)) for c, s in zip(columns[order], scores[order])
+            ]
+
+
+def build_recommendations(top_k=DEFAULT_TOP_K, min_support=1, block=CAR_BLOCK):
+    started = timezone.now()
+    user_ids, car_ids = load_interactions()
+
+    written = 0
+    batch = []
+
+    def flush():
+        CarRecommendation.objects.bulk_create(
+            batch, update_conflicts=True, unique_fields=['car'], update_fields=['related', 'built_at'],
+        )
+
+    for car_id, related in cooccurrence_top_k(user_ids, car_ids, top_k, min_support, block):
+        batch.append(CarRecommendation(car_id=car_id, related=related, built_at=started))
+        if len(batch) >= WRITE_BATCH:
+            flush()
+            written += len(batch)
+            batch = []
+    if batch:
+        flush()
+        written += len(batch)
+
+    # Машины, у которых соседей больше нет, — старые строки не трогали в этом прогоне
+    with transaction.atomic():
+        stale = CarRecommendation.objects.filter(built_at__lt=started).delete()[0]
+    return {'favorites': len(user_ids), 'cars': written, 'stale_removed': stale}
+
+
+def recommend_for_user(user, limit=20):
+    """id машин, отсортированные по сумме co-occurrence score с избранным пользователя."""
+    favorite_ids = list(
+        Favorite.objects.filter(user=user).order_by('-created_at')
+        .values_list('car_id', flat=True)[:MAX_USER_FAVORITES]
+    )
+    if not favorite_ids:
+        return []
+    scores = defaultdict(float)
+    for related in CarRecommendation.objects.filter(car_id__in=favorite_ids).values_list('related', flat=True):
+        for car_id, score in related:
+            scores[car_id] += score
+
+    seen = set(favorite_ids)
+    candidates = sorted((c for c in scores if c not in seen), key=lambda c: -scores[c])[:limit * 2]
+    active = set(Car.objects.filter(id__in=candidates, is_active=True).values_list('id', flat=True))
+    return [c for c in candidates if c in active][:limit]
@@ -0,0 +1,144 @@
+# favorites/searches.py
+"""
+Сохранённые поиски и уведомления о новых подходящих машинах.
+
+Сопоставление идёт не перебором всех поисков, а через инвертированный индекс (SearchIndex):
+каждый поиск кладётся в списки по ключам (марка, тип кузова, ценовая корзина); измерение, которое
+поиск не ограничивает, — None. Для машины проверяется 8 ключей (значение или None по каждому
+измерению) — кандидаты уже совпали по марке, типу и корзине цены, полный CarFilter.matches
+досчитывает остальное (точные границы цены, год, пробег и т.д.).
+
+Поток: run_alerts (команда notify_saved_searches по cron) читает журнал cars.changes с сохранённого
+курсора, пишет SearchMatch (unique search+car — правка машины повторно не уведомляет), затем
+queue_notifications собирает несработавшие совпадения в одно письмо на пользователя в OutboxEmail.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+from itertools import product
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api import outbox
+from cars import changes
+from cars.filters import CarFilter
+from cars.models import Car
+from .models import AlertCursor, SavedSearch, SearchMatch
+
+# Границы ценовых корзин: геометрическая сетка, шаг ×1.5
+PRICE_EDGES = [Decimal(500 * 1.5 ** i).quantize(Decimal('1')) for i in range(26)]
+# Поиск с диапазоном шире стольких корзин по цене не индексируется (ключ None)
+MAX_PRICE_BUCKETS = 6
+ALERT_CURSOR = 'saved-searches'
+MAX_CARS_PER_EMAIL = 10
+MAX_SAVED_SEARCHES = 20
+
+
+def price_bucket(price):
+    return bisect_right(PRICE_EDGES, price)
+
+
+def _price_buckets(spec):
+    bounds = spec.get('price')
+    if not bounds:
+        return [None]
+    low = price_bucket(Decimal(bounds['min'])) if 'min' in bounds else 0
+    high = price_bucket(Decimal(bounds['max'])) if 'max' in bounds else len(PRICE_EDGES)
+    if high - low + 1 > MAX_PRICE_BUCKETS:
+        return [None]
+    return list(range(low, high + 1))
+
+
+def search_keys(spec):
+    """Ключи индекса для спецификации поиска (CarFilter.dump)."""
+    return product(spec.get('brand') or [None], spec.get('car_type') or [None], _price_buckets(spec))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = defaultdict(list)  # (brand, car_type, bucket) -> [search_id]
+        self.filters = {}                  # search_id -> CarFilter
+        self.users = {}
+
+    @classmethod
+    def build(cls, searches=None):
+        index = cls()
+        if searches is None:
+            searches = SavedSearch.objects.filter(notify=True).values_list('id', 'user_id', 'spec').iterator()
+        for search_id, user_id, spec in searches:
+            index.add(search_id, user_id, spec)
+        return index
+
+    def __len__(self):
+        return len(self.filters)
+
+    def add(self, search_id, user_id, spec):
+        self.filters[search_id] = CarFilter.from_spec(spec)
+        self.users[search_id] = user_id
+        for key in search_keys(spec):
+            self.postings[key].append(search_id)
+
+    def candidates(self, car):
+        bucket = price_bucket(car.price)
+        for key in product((car.brand, None), (car.car_type, None), (bucket, None)):
+            yield from self.postings.get(key, ())
+
+    def match(self, car):
+        """id поисков, под которые подходит машина."""
+        return [search_id for search_id in self.candidates(car) if self.filters[search_id].matches(car)]
+
+
+def run_alerts(batch_size=changes.DEFAULT_LIMIT, index=None):
+    """Сопоставляет машины из журнала изменений с сохранёнными поисками. Возвращает (машин, совпадений)."""
+    # Первый запуск начинает с текущего курсора: по старым объявлениям не уведомляем
+    cursor, _ = AlertCursor.objects.get_or_create(name=ALERT_CURSOR, defaults={'position': changes.head()})
+    seen = matched = 0
+    while True:
+        try:
+            position, has_more, upserts, _ = changes.changes_since(cursor.position, batch_size)
+        except changes.CursorExpired:
+            position, has_more, upserts = changes.head(), False, []
+        if upserts:
+            if index is None:
+                index = SearchIndex.build()
+            cars = list(Car.objects.filter(id__in=upserts, is_active=True))
+            rows = [SearchMatch(search_id=search_id, car_id=car.id) for car in cars for search_id in index.match(car)]
+            SearchMatch.objects.bulk_create(rows, ignore_conflicts=True, batch_size=1000)
+            seen += len(cars)
+            matched += len(rows)
+        cursor.position = position
+        cursor.save(update_fields=['position', 'updated_at'])
+        if not has_more:
+            return seen, matched
+
+
+def _email(user, searches):
+    lines = []
+    for search, cars in searches:
+        lines.append(f'{search.name or "Сохранённый поиск"}:')
+        for car in cars[:MAX_CARS_PER_EMAIL]:
+            lines.append(f'  {car.brand} {car.model}, {car.year} — {car.price} (id {car.id})')
+        if len(cars) > MAX_CARS_PER_EMAIL:
+            lines.append(f'  и ещё {len(cars) - MAX_CARS_PER_EMAIL}')
+    total = sum(len(cars) for _, cars in searches)
+    return user.email, f'Новые машины по вашим поискам: {total}', '\n'.join(lines)
+
+
+def queue_notifications():
+    """Одно письмо на пользователя со всеми новыми совпадениями. Возвращает число писем."""
+    with transaction.atomic():
+        last_id = SearchMatch.objects.filter(notified_at__isnull=True).aggregate(last=Max('id'))['last']
+        if last_id is None:
+            return 0
+        pending = (SearchMatch.objects.filter(notified_at__isnull=True, id__lte=last_id, car__is_active=True,
+                                              search__notify=True)
+                   .select_related('search__user', 'car').order_by('search__user_id', 'search_id', 'id'))
+        by_user = defaultdict(dict)
+        for match in pending:
+            by_user[match.search.user].setdefault(match.search, []).append(match.car)
+        outbox.enqueue_many([_email(user, list(searches.items())) for user, searches in by_user.items()])
+        # Совпадения по снятым с продажи машинам и выключенным поискам тоже закрываем
+        SearchMatch.objects.filter(notified_at__isnull=True, id__lte=last_id).update(notified_at=timezone.now())
+    return len(by_user)
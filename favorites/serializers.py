@@ -1,9 +1,12 @@
 from rest_framework import serializers
-from .models import Favorite
+from .models import Favorite, SavedSearch
+from cars.filters import CarFilterField
+from cars.models import Car
 from cars.serializers import CarSerializer
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    # Полная карточка с галереей images — контракт API избранного; фото подгружает prefetch во view
     car = CarSerializer(read_only=True)
     car_id = serializers.IntegerField(write_only=True)
 
@@ -15,4 +18,22 @@ class FavoriteSerializer(serializers.ModelSerializer):
         car_id = validated_data.pop('car_id')
         user = validated_data.pop('user')
         car = Car.objects.get(id=car_id)
-        return Favorite.objects.create(user=user, car=car, **validated_data)
\ No newline at end of file
+        return Favorite.objects.create(user=user, car=car, **validated_data)
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    query = CarFilterField(write_only=True)
+
+    class Meta:
+        model = SavedSearch
+        fields = ['id', 'name', 'query', 'spec', 'notify', 'created_at']
+        read_only_fields = ['spec']
+
+    def validate(self, attrs):
+        car_filter = attrs.pop('query')
+        attrs['spec'] = car_filter.dump()
+        attrs['signature'] = car_filter.signature()
+        user = self.context['request'].user
+        if SavedSearch.objects.filter(user=user, signature=attrs['signature']).exists():
+            raise serializers.ValidationError({'query': 'Такой поиск уже сохранён.'})
+        return attrs
@@ -1,3 +1,140 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api import outbox
+from api.models import OutboxEmail, User
+from cars.models import Car
+from .models import Favorite
+from .recommendations import build_recommendations
+from .searches import SearchIndex, queue_notifications, run_alerts
+
+
+def make_car(**kwargs):
+    data = {
+        'brand': 'Toyota', 'model': 'Camry', 'year': 2018, 'price': Decimal('20000'),
+        'car_type': 'sedan', 'fuel_type': 'petrol', 'transmission': 'automatic', 'phone': '+996555000000',
+    }
+    data.update(kwargs)
+    return Car.objects.create(**data)
+
+
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d = (make_car(views=i) for i in range(4))
+        users = [User.objects.create_user(email=f'u{i}@example.com', password='x') for i in range(3)]
+        # a и b часто вместе, a и c — один раз
+        for user, cars in zip(users, [(self.a, self.b), (self.a, self.b, self.c), (self.b,)]):
+            for car in cars:
+                Favorite.objects.create(user=user, car=car)
+        self.user = User.objects.create_user(email='me@example.com', password='x')
+        Favorite.objects.create(user=self.user, car=self.a)
+        self.client.force_authenticate(self.user)
+
+    def test_recommended_ranks_cooccurring_cars_first(self):
+        build_recommendations()
+        response = self.client.get('/api/v1/favorites/recommended/', {'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        ids = [car['id'] for car in response.json()]
+        self.assertEqual(ids[:2], [self.b.id, self.c.id])
+        self.assertNotIn(self.a.id, ids)  # уже в избранном
+
+    def test_inactive_cars_are_skipped(self):
+        build_recommendations()
+        self.b.is_active = False
+        self.b.save()
+        ids = [car['id'] for car in self.client.get('/api/v1/favorites/recommended/').json()]
+        self.assertNotIn(self.b.id, ids)
+        self.assertEqual(ids[0], self.c.id)
+
+
+class FavoriteListTests(APITestCase):
+    def test_favorites_keep_car_gallery(self):
+        from cars.models import CarImage
+        user = User.objects.create_user(email='me@example.com', password='x')
+        self.client.force_authenticate(user)
+        for n in range(3):
+            car = make_car()
+            CarImage.objects.create(car=car, image=f'cars/gallery/{n}.jpg')
+            Favorite.objects.create(user=user, car=car)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/favorites/')
+        # Галерея — одним prefetch-запросом на страницу, а не на каждую машину
+        self.assertEqual(sum('cars_carimage' in query['sql'] for query in queries.captured_queries), 1)
+        cars = [row['car'] for row in response.json()]
+        self.assertEqual([len(car['images']) for car in cars], [1, 1, 1])
+        self.assertIn('images_count', cars[0])
+
+
+@mock.patch('cars.changes.SETTLE', timedelta(0))
+class SavedSearchTests(APITestCase):
+    url = '/api/v1/favorites/searches/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='me@example.com', password='x')
+        self.client.force_authenticate(self.user)
+
+    def save_search(self, query, name=''):
+        return self.client.post(self.url, {'name': name, 'query': query}, format='json')
+
+    def publish(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_car(**kwargs)
+
+    def test_create_validates_and_normalizes_filter(self):
+        response = self.save_search({'brand': ['BMW', 'Audi'], 'max_price': 30000})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['spec'], {'brand': ['Audi', 'BMW'], 'price': {'max': '30000'}})
+        self.assertEqual(self.save_search({'brand': 'Audi,BMW', 'max_price': '30000'}).status_code, 400)
+        self.assertIn('min_year', self.save_search({'min_year': 'abc'}).json()['query'])
+        self.assertEqual(self.save_search({}).status_code, 400)
+        self.assertEqual(self.save_search({'ordering': 'price'}).json(), {'query': ['Нужен хотя бы один фильтр.']})
+
+    def test_index_returns_only_matching_searches(self):
+        specs = {
+            1: {'brand': ['BMW']},
+            2: {'brand': ['BMW'], 'price': {'max': '15000'}},
+            3: {'car_type': ['suv']},
+            4: {'price': {'min': '25000', 'max': '35000'}},
+            5: {'year': {'min': 2015}},  # без ключевых полей — общий список
+            6: {'brand': ['Audi']},
+        }
+        index = SearchIndex.build((search_id, 1, spec) for search_id, spec in specs.items())
+        car = Car(brand='BMW', car_type='sedan', price=Decimal('30000'), year=2018)
+        self.assertNotIn(6, list(index.candidates(car)))
+        self.assertEqual(sorted(index.match(car)), [1, 4, 5])
+
+    def test_new_matching_cars_are_emailed_once_per_user(self):
+        self.save_search({'brand': 'BMW'}, name='BMW')
+        self.save_search({'max_price': 10000}, name='Дёшево')
+        self.publish(brand='BMW', price=Decimal('40000'))  # до первого запуска — не уведомляем
+        run_alerts()
+
+        bmw = self.publish(brand='BMW', model='X5', price=Decimal('9000'))
+        self.publish(brand='Audi', price=Decimal('50000'))
+        self.assertEqual(run_alerts(), (2, 2))
+        self.assertEqual(queue_notifications(), 1)
+        self.assertEqual(outbox.flush(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['me@example.com'])
+        self.assertEqual(mail.outbox[0].body.count('BMW X5'), 2)
+
+        # Правка машины не даёт повторного письма
+        with self.captureOnCommitCallbacks(execute=True):
+            bmw.price = Decimal('8500')
+            bmw.save()
+        self.assertEqual(run_alerts(), (1, 2))
+        self.assertEqual(queue_notifications(), 0)
+        self.assertEqual(OutboxEmail.objects.filter(sent_at__isnull=True).count(), 0)
+
+    def test_saved_search_cars(self):
+        search_id = self.save_search({'brand': 'BMW'}).json()['id']
+        bmw = make_car(brand='BMW')
+        make_car(brand='Audi')
+        response = self.client.get(f'{self.url}{search_id}/cars/')
+        self.assertEqual([car['id'] for car in response.json()], [bmw.id])
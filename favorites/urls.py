@@ -3,6 +3,8 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
+# searches/ раньше пустого префикса — иначе его перехватит маршрут детали избранного
+router.register(r'searches', views.SavedSearchViewSet, basename='saved-search')
 router.register(r'', views.FavoriteViewSet, basename='favorite')
 
 urlpatterns = [
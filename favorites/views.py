@@ -1,16 +1,26 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-from .models import Favorite
-from .serializers import FavoriteSerializer
+from rest_framework.settings import api_settings
+from core.openapi import openapi, swagger_auto_schema
+from core.renderers import ColumnarJSONRenderer
+from .models import Favorite, SavedSearch
+from .recommendations import recommend_for_user
+from .searches import MAX_SAVED_SEARCHES
+from .serializers import FavoriteSerializer, SavedSearchSerializer
+from activity import events
+from activity.models import ActivityEvent
+from cars.filters import CarFilter
 from cars.models import Car
+from cars.serializers import CarCardSerializer
 
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
+    # Accept: application/vnd.columnar+json — список полями-колонками (core/renderers.py)
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
 
     # УБЕРИ queryset отсюда - не определяй его как атрибут класса
     # queryset = Favorite.objects.all()  # ❌ УДАЛИ ЭТУ СТРОКУ
@@ -26,7 +36,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         if not self.request.user.is_authenticated:
             return Favorite.objects.none()
 
-        return Favorite.objects.filter(user=self.request.user)
+        return Favorite.objects.filter(user=self.request.user).select_related('car').prefetch_related('car__images')
 
     @swagger_auto_schema(
         operation_summary="Get Favorites",
@@ -76,6 +86,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         favorite = Favorite.objects.create(user=request.user, car=car)
+        events.record(ActivityEvent.FAVORITE, user_id=request.user.id, car_id=car.id)
         serializer = self.get_serializer(favorite)
         return Response({
             'message': 'Car added to favorites',
@@ -90,4 +101,80 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         if getattr(self, 'swagger_fake_view', False):
             return Response({'message': 'Favorite removed'})
-        return super().destroy(request, *args, **kwargs)
\ No newline at end of file
+        return super().destroy(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Recommended For You",
+        operation_description="Cars often favorited together with the user's favorites",
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=20),
+        ],
+        responses={200: CarCardSerializer(many=True)},
+        tags=['Favorites']
+    )
+    @action(detail=False, methods=['get'])
+    def recommended(self, request):
+        if getattr(self, 'swagger_fake_view', False):
+            return Response([])
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = recommend_for_user(request.user, limit)
+        if len(ids) < limit:
+            # Мало сигнала (нет избранного или соседей) — добиваем популярными
+            exclude = set(ids) | set(self.get_queryset().values_list('car_id', flat=True))
+            ids += list(
+                Car.objects.filter(is_active=True).exclude(id__in=exclude)
+                .order_by('-views', '-id').values_list('id', flat=True)[:limit - len(ids)]
+            )
+        cars = {car.id: car for car in Car.objects.filter(id__in=ids)}
+        serializer = CarCardSerializer([cars[i] for i in ids if i in cars], many=True,
+                                       context=self.get_serializer_context())
+        return Response(serializer.data)
+
+
+class SavedSearchViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                         mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Сохранённые поиски: о новых подходящих машинах приходит письмо (notify_saved_searches)."""
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return SavedSearch.objects.none()
+        return SavedSearch.objects.filter(user=self.request.user).order_by('-id')
+
+    @swagger_auto_schema(
+        operation_summary="Save Search",
+        operation_description="Save catalog filter params; new matching cars are sent by email",
+        tags=['Favorites']
+    )
+    def create(self, request, *args, **kwargs):
+        if self.get_queryset().count() >= MAX_SAVED_SEARCHES:
+            return Response({
+                'error': f'No more than {MAX_SAVED_SEARCHES} saved searches'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @swagger_auto_schema(
+        operation_summary="Saved Search Cars",
+        operation_description="Active cars matching the saved search, newest first",
+        responses={200: CarCardSerializer(many=True)},
+        tags=['Favorites']
+    )
+    @action(detail=True, methods=['get'])
+    def cars(self, request, pk=None):
+        search = self.get_object()
+        queryset = CarFilter.from_spec(search.spec).filter_queryset(Car.objects.filter(is_active=True))
+        page = self.paginate_queryset(queryset)
+        serializer = CarCardSerializer(page if page is not None else queryset[:50], many=True,
+                                       context=self.get_serializer_context())
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)